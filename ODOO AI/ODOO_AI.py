@@ -1,66 +1,173 @@
 import os
 import time
-import base64
+STARTUP_T0 = time.perf_counter()
 import json
-from io import BytesIO
+import hashlib
 from PIL import Image, ImageTk, ImageDraw
-import mss
 import tkinter as tk
 import threading
-from openai import OpenAI
-import win32api
-import win32con
+import queue
+from screen_change import FrameChangeDetector
+from observation_scheduler import ObservationScheduler
+from observation_cadence import AdaptiveCadence, InputIdleMonitor
+from chat_queue import ChatQueue
+from tracing import Tracer
+from animation import Animator, CpuMeter, bump
+# openai (~1 s to import), numpy, mss and win32api are imported on first use, see get_engine() and friends
 
 # ---------------- CONFIG ---------------- #
 ASSISTANT_NAME = "ODOO AI"
-UPDATE_INTERVAL = 30  # seconds
+UPDATE_INTERVAL = 30  # base seconds between observations, adapted by AdaptiveCadence (see below)
+IDLE_AFTER = 15  # seconds without chat input before observations go to the chat box
+OBSERVE_MIN_INTERVAL = 10  # fastest cadence, during active editing
+OBSERVE_MAX_INTERVAL = 600  # slowest cadence, when idle / unchanged / API degraded
+INPUT_IDLE_AFTER = 120  # seconds without keyboard/mouse input per doubling of the interval
+OBSERVE_SLOW_LATENCY = 8.0  # model latency (s) above which observations slow down proportionally
+SEAT_CALLS_PER_HOUR = 120  # observation model calls per rolling hour for this seat (None = unlimited)
+SEAT_TOKENS_PER_HOUR = None  # observation tokens per rolling hour for this seat (None = unlimited)
 ICON_PATH = r"C:\Users\Alexa\Desktop\Finance Matters Bestanden\ODOO AI\ODOO_AI_LOGO.png"
 PADDING_X = 20
 PADDING_Y = 50
 DEBUG_MODEL_IO = False  # Set to True to log model input/output for debugging
 PRIMARY_MODEL = "gpt-5-mini"
 FALLBACK_MODEL = "gpt-4.1-mini"
+FRAME_CHANGE_THRESHOLD = 0.001  # fraction of the frame fingerprint that must change before re-analyzing
+STREAM_CHAT = True  # stream chat replies into the output box as they are generated
+STREAM_FLUSH_MS = 33  # batch streamed text into one Tk update per ~frame
+CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache", "observations.sqlite3")
+CACHE_TTL = 24 * 3600  # seconds a cached observation/reply stays valid
+CACHE_MAX_ENTRIES = 256  # in-memory LRU size (disk keeps more)
+CHAT_ANSWER_CACHE = True  # answer near-identical questions about an unchanged screen from memory
+CHAT_CACHE_EMBEDDINGS = "hashing"  # "hashing" (no model) or "model" (knowledge-base embedding model)
+CHAT_CACHE_SIMILARITY = None  # cosine similarity for a hit; None = the embedder's default (0.8 hashing, 0.9 model)
+CHAT_CACHE_MAX_ENTRIES = 256
+CHAT_CACHE_TTL = 900  # seconds a cached chat answer stays valid (a screen change invalidates it sooner)
+KB_ROUTING = True  # route chat questions through the knowledge base before the vision model
+KB_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "knowledge_base")
+KB_BACKEND = "lexical"  # "lexical", "chroma" or "hybrid" (see knowledge_manager.create_retriever)
+KB_TOP_K = 3  # knowledge-base chunks considered per question
+KB_CONTEXT_BUDGET = 600  # tokens of knowledge-base chunks injected into a prompt
+KB_DIRECT_THRESHOLD = 0.8  # share of question words one KB line must cover to answer locally
+ASSET_CACHE_DIR = os.path.join(os.path.dirname(CACHE_PATH), "assets")  # prebuilt overlay PNGs
+ASSET_VERSION = 1  # bump when the gradient/icon rendering changes to invalidate old assets
+GATEWAY_MODE = "hedged"  # "sequential", "hedged" or "parallel" primary/fallback (see model_gateway.py)
+HEDGE_DELAY = 6.0  # seconds without text from PRIMARY_MODEL before FALLBACK_MODEL is asked too
+OBSERVATION_DEADLINE = 20  # seconds before a screen observation is abandoned
+CHAT_DEADLINE = 60  # seconds before a chat reply is abandoned
+HTTP_MAX_CONNECTIONS = 8  # keep-alive pool shared by every model call and upload
+HTTP_MAX_KEEPALIVE = 4
+HTTP_CONNECT_TIMEOUT = 5.0  # seconds to open a connection
+HTTP_READ_TIMEOUT = 30.0  # seconds without a byte from the server
+HTTP_RETRIES = 2  # retries per request (jittered exponential backoff), within the retry budget
+RETRY_BUDGET_RATIO = 0.2  # retries may add at most this share of recent requests
+BREAKER_FAILURES = 5  # failures that open the circuit breaker
+BREAKER_OPEN_SECONDS = 30  # first pause while open (doubles while the API stays down)
+CAPTURE_RING_SIZE = 8  # recent frames kept by the capture service
+CAPTURE_MAX_WIDTH = 1024  # frames are downscaled to this width straight from the raw buffer
+CAPTURE_MODE = "window"  # "central", "window" (foreground window), "changed" (changed pixels), "pinned",
+                        # "monitors" (busiest/focused of all monitors) or "composite" (all monitors, one thumbnail)
+CAPTURE_MONITOR = 1  # mss monitor index used by the central and changed modes
+PINNED_REGION = None  # e.g. {"left": 0, "top": 0, "width": 1280, "height": 800} for CAPTURE_MODE = "pinned"
+UPLOAD_MAX_BYTES = 120_000  # byte budget per uploaded screenshot (quality, then resolution is lowered to fit)
+UPLOAD_MAX_TOKENS = None  # optional image-token budget (OpenAI tile accounting), e.g. 500
+UPLOAD_DETAIL = "auto"  # "low", "high" or "auto" (low when the encoded frame is <= 512 px anyway)
+IMAGE_STORE_MAX_ENTRIES = 32  # encoded frames kept for reuse by observation and chat requests
+IMAGE_FILE_UPLOADS = True  # upload reused frames once (Files API) and send only the file ID afterwards
+IMAGE_UPLOAD_AFTER_USES = 2  # uses of a frame before it is uploaded in the background (first use is inline)
+IMAGE_FILE_TTL = 1800  # seconds an uploaded frame is reused; the provider deletes it after twice that
+ANIMATION_FRAME_MS = 16  # frame interval while the overlay animates (no timers at all when it does not)
+ANIMATION_FRAME_BUDGET_MS = 4  # per-frame time for animation writes; the rest waits for the next frame
+OVERLAY_FADE_SECONDS = 28.0  # the overlay fades to OVERLAY_MIN_ALPHA this long after a message or hover
+OVERLAY_MIN_ALPHA = 0.18
+SHOW_PERF_HUD = False  # show live p50/p95 stage timings in the overlay (toggle with F2)
+HUD_STAGES = ("capture", "encode", "send", "ttfb", "model", "render")  # stages shown in the HUD
+TRACE_PATH = None  # e.g. os.path.join(os.path.dirname(CACHE_PATH), "trace.jsonl") to log every span
+METRICS_PATH = os.path.join(os.path.dirname(CACHE_PATH), "metrics.prom")  # Prometheus text export (None = off)
+METRICS_EXPORT_INTERVAL = 30  # seconds between metrics exports
+FIRST_OBSERVATION_DELAY = 1.0  # seconds after the overlay is shown before the first screen observation
+CHAT_SESSIONS = True  # chain chat turns server-side (previous_response_id) instead of resending everything
+CHAT_CONTEXT_BUDGET = 6000  # tokens a chain may bill per turn before it is compacted into a summary
+CHAT_SUMMARY_BUDGET = 400  # tokens of earlier turns carried into a new chain
+CHAT_SCREEN_CHANGE = 0.02  # fraction of the screen fingerprint that must change to attach a new screenshot
+CHAT_SESSION_IDLE_RESET = 600  # seconds without a question before the next one starts a new chain
+ENGINE_ADDRESS = None  # e.g. "unix:/run/odoo-ai/engine.sock" or "http://127.0.0.1:8765": use a shared
+                       # engine_daemon.py instead of an in-process engine (no API key needed here;
+                       # over HTTP, set ODOO_AI_ENGINE_TOKEN to this user's daemon token)
 # ---------------------------------------- #
 
 api_key = os.getenv("OPENAI_API_KEY")
-if not api_key:
+if not api_key and not ENGINE_ADDRESS:
     raise ValueError("⚠️ No OpenAI API key found. Use: setx OPENAI_API_KEY \"your-key\"")
 
-client = OpenAI(api_key=api_key)
-
-# ---------- Smoke test and warm-up ---------- #
-def debug_test_text_only():
-    """Quick smoke test to verify model/key works without images."""
+frame_detector = FrameChangeDetector(threshold=FRAME_CHANGE_THRESHOLD)
+tracer = Tracer(jsonl_path=TRACE_PATH)
+cadence = AdaptiveCadence(base_interval=UPDATE_INTERVAL, min_interval=OBSERVE_MIN_INTERVAL,
+                          max_interval=OBSERVE_MAX_INTERVAL, idle_seconds=InputIdleMonitor().seconds,
+                          idle_after=INPUT_IDLE_AFTER, slow_latency=OBSERVE_SLOW_LATENCY,
+                          calls_per_hour=SEAT_CALLS_PER_HOUR, tokens_per_hour=SEAT_TOKENS_PER_HOUR)
+tracer.record("startup.imports", time.perf_counter() - STARTUP_T0)
+
+# ---------- Lazily created services ---------- #
+engine = None
+capture_service = None
+region_capture = None
+_lazy_lock = threading.RLock()
+
+def get_engine():
+    """
+    The model side (prompts, gateway, caches, knowledge base), built on first use:
+    a thin client for a shared engine_daemon when ENGINE_ADDRESS is set, else an
+    in-process engine.Engine configured from the CONFIG block above.
+    """
+    global engine
+    with _lazy_lock:
+        if engine is None:
+            if ENGINE_ADDRESS:
+                from engine_client import EngineClient
+                engine = EngineClient(ENGINE_ADDRESS)
+            else:
+                from engine import Engine, DEFAULT_SETTINGS
+                settings = {name: value for name, value in globals().items() if name in DEFAULT_SETTINGS}
+                engine = Engine(api_key, settings, tracer=tracer)
+        return engine
+
+def api_available():
+    """False while the circuit breaker is open (or the engine daemon is down): observations pause."""
+    return engine is None or engine.available()
+
+def get_region_capture():
+    """Screen capture (mss + numpy), built on first use."""
+    global capture_service, region_capture
+    with _lazy_lock:
+        if region_capture is None:
+            with tracer.span("startup.capture"):
+                from capture_service import CaptureService
+                from capture_regions import RegionCapture
+                capture_service = CaptureService(ring_size=CAPTURE_RING_SIZE)
+                region_capture = RegionCapture(capture_service, mode=CAPTURE_MODE, monitor_index=CAPTURE_MONITOR,
+                                               pinned=PINNED_REGION)
+        return region_capture
+
+# ---------- Warm-up ---------- #
+def warm_up():
+    """
+    Runs once in the background after the overlay is up: builds the capture and
+    the engine (encoder, caches, knowledge base and the OpenAI client's pooled
+    HTTPS connection, checked with a models lookup that spends no tokens), or
+    connects to the engine daemon. Returns an error message, or None when ready.
+    """
+    start = time.perf_counter()
     try:
-        resp = client.responses.create(
-            model=PRIMARY_MODEL,
-            input="What is 1+1?"
-        )
-        output = resp.output_text if hasattr(resp, 'output_text') else ""
-        print(f"[SMOKE TEST] Model: {PRIMARY_MODEL}, Output: {output}")
-        if not output:
-            # Try fallback
-            try:
-                resp = client.responses.create(
-                    model=FALLBACK_MODEL,
-                    input="What is 1+1?"
-                )
-                output = resp.output_text if hasattr(resp, 'output_text') else ""
-                print(f"[SMOKE TEST] Fallback model: {FALLBACK_MODEL}, Output: {output}")
-            except Exception as e:
-                print(f"[SMOKE TEST] Fallback model also failed: {e}")
+        get_region_capture()
+        get_engine().warm_up()
+        return None
     except Exception as e:
-        print(f"[SMOKE TEST] Failed: {e}")
-
-def warm_up_model():
-    try:
-        _ = client.responses.create(
-            model=PRIMARY_MODEL,
-            input="warmup",
-            max_output_tokens=1
-        )
-    except Exception:
-        pass
+        print(f"[STARTUP] warm-up failed: {e}")
+        return f"⚠️ {e}"
+    finally:
+        tracer.record("startup.warmup", time.perf_counter() - start)
+        print(f"[STARTUP] warm-up {time.perf_counter() - start:.2f}s, "
+              f"ready {time.perf_counter() - STARTUP_T0:.2f}s after launch")
 
 # ---------- Utility ---------- #
 def extract_text_from_content(content) -> str:
@@ -112,154 +219,86 @@ def extract_text_from_content(content) -> str:
     except Exception:
         return ""
 
-def prepare_image_for_upload(img) -> bytes:
+def capture_screen(with_monitor=False):
     """
-    Optimize screenshot for upload by resizing and compressing.
-    - Resize width to <= 1024px while preserving aspect ratio
-    - Encode as JPEG quality ~70 instead of PNG
-    
-    Returns: bytes of the optimized image
+    Capture the region of interest (see CAPTURE_MODE), reduced in size for faster upload.
+    with_monitor=True returns (img, monitor index the frame came from, or None).
     """
-    # Resize if width > 1024
-    width, height = img.size
-    if width > 1024:
-        ratio = 1024 / width
-        new_width = 1024
-        new_height = int(height * ratio)
-        img = img.resize((new_width, new_height), Image.LANCZOS)
-    
-    # Convert to RGB if necessary (JPEG doesn't support transparency)
-    if img.mode in ("RGBA", "LA", "P"):
-        rgb_img = Image.new("RGB", img.size, (255, 255, 255))
-        if img.mode == "P":
-            img = img.convert("RGBA")
-        rgb_img.paste(img, mask=img.split()[-1] if img.mode in ("RGBA", "LA") else None)
-        img = rgb_img
-    elif img.mode != "RGB":
-        img = img.convert("RGB")
-    
-    # Save as JPEG with quality 70
-    buffered = BytesIO()
-    img.save(buffered, format="JPEG", quality=70, optimize=True)
-    return buffered.getvalue()
-
-def capture_screen():
-    """Capture a reduced-size central region of the screen (for faster upload)."""
-    with mss.mss() as sct:
-        monitor = sct.monitors[1]
-        width, height = monitor["width"], monitor["height"]
-        region = {
-            "top": height // 4,
-            "left": width // 4,
-            "width": width // 2,
-            "height": height // 2
-        }
-        shot = sct.grab(region)
-        return Image.frombytes("RGB", shot.size, shot.rgb)
+    with tracer.span("capture"):
+        frame = get_region_capture().capture()
+    with tracer.span("resize"):
+        img = frame.to_image(max_width=CAPTURE_MAX_WIDTH)
+    return (img, frame.monitor) if with_monitor else img
 
 def get_active_window_title():
-    try:
-        import win32gui
-        return win32gui.GetWindowText(win32gui.GetForegroundWindow())
-    except Exception:
-        return "Unknown window"
+    """Title of the foreground window, skipping the overlay itself (Win32 or X11)."""
+    return get_region_capture().window_title() or "Unknown window"
 
 def analyze_screen(img):
-    """Send screen image to GPT-5 for one concise, screen-based observation."""
-    img_bytes = prepare_image_for_upload(img)
-    img_b64 = base64.b64encode(img_bytes).decode("utf-8")
-
-    prompt = (
-        f"You are {ASSISTANT_NAME}, an accounting/Odoo assistant. You can SEE the screenshot. "
-        f"Write ONE short, concrete sentence about what is visible on the screen. "
-        f"It must be based on visible UI elements only (e.g. Odoo views, invoices, lists, code editors, filenames, buttons). "
-        f"Avoid generic advice or productivity tips. Be specific and refer to what you see. "
-        f"Active window title: '{get_active_window_title()}'."
-    )
-
-    try:
-        # Try primary model first
-        resp = client.responses.create(
-            model=PRIMARY_MODEL,
-            input=[{
-                "role": "user",
-                "content": [
-                    {"type": "input_text", "text": prompt},
-                    {"type": "input_image", "image_url": f"data:image/jpeg;base64,{img_b64}"}
-                ]
-            }],
-            max_output_tokens=50
-        )
-
-        text = resp.output_text if hasattr(resp, 'output_text') else ""
-        if text:
-            text = text.strip()
-        
-        # Debug logging
+    """One concise, screen-based observation from the engine; the call's health feeds the cadence."""
+    result = get_engine().observe(img, get_active_window_title(), detail=cadence.detail())
+    if result["latency"] is not None:
+        cadence.note_reply(result["latency"], result["ok"], result["tokens"])
+    return result["text"]
+
+def analyze_screen_if_changed(img, monitor=None):
+    """Run analyze_screen only if the frame differs from the last one analyzed on its monitor; else None."""
+    changed, fingerprint = frame_detector.check(img, key=monitor)
+    cadence.note_frame(changed)
+    if not changed:
         if DEBUG_MODEL_IO:
-            print(f"[DEBUG analyze_screen] output_text: {text[:300] if text else '(empty)'}")
-            if not text:
-                try:
-                    if hasattr(resp, 'model_dump'):
-                        resp_repr = json.dumps(resp.model_dump(), default=str, indent=2)[:500]
-                    else:
-                        resp_repr = json.dumps(resp.__dict__, default=str, indent=2)[:500]
-                    print(f"[DEBUG analyze_screen] full response structure: {resp_repr}")
-                except Exception:
-                    print(f"[DEBUG analyze_screen] full response structure: {repr(resp)[:500]}")
-
-        # If empty, try fallback model
-        if not text:
-            print("analyze_screen: empty content from model, trying fallback")
-            try:
-                resp = client.responses.create(
-                    model=FALLBACK_MODEL,
-                    input=[{
-                        "role": "user",
-                        "content": [
-                            {"type": "input_text", "text": prompt},
-                            {"type": "input_image", "image_url": f"data:image/jpeg;base64,{img_b64}"}
-                        ]
-                    }],
-                    max_output_tokens=50
-                )
-                text = resp.output_text if hasattr(resp, 'output_text') else ""
-                if text:
-                    text = text.strip()
-                    print(f"[FALLBACK] analyze_screen succeeded with {FALLBACK_MODEL}")
-            except Exception as e:
-                print(f"[FALLBACK] analyze_screen error: {e}")
-
-        # If still empty, return error
-        if not text:
-            print("analyze_screen: empty content from model (both primary and fallback)")
-            return "⚠️ Unable to analyze screen — model returned empty response"
+            print(f"[DEBUG analyze_screen] frame unchanged, upload skipped ({frame_detector.skipped} total)")
+        return None
+    obs = analyze_screen(img)
+    if obs and not obs.startswith("⚠️"):
+        frame_detector.mark_analyzed(fingerprint, key=monitor)
+    return obs
 
-        return text
 
-    except Exception as e:
-        # Log the error, but don't spam the UI
-        print(f"analyze_screen error: {e}")
-        return None
+# ---------- Overlay asset cache ---------- #
+def cached_asset(kind, params, build):
+    """
+    Content-addressed PNG cache for overlay artwork.
+    The file name is a hash of (kind, params, ASSET_VERSION), so any change in size,
+    radius or colors produces a new asset; later launches just load the PNG.
+    """
+    digest = hashlib.sha256(
+        json.dumps([kind, params, ASSET_VERSION], sort_keys=True).encode("utf-8")
+    ).hexdigest()[:32]
+    path = os.path.join(ASSET_CACHE_DIR, f"{kind}-{digest}.png")
+    if os.path.exists(path):
+        try:
+            img = Image.open(path)
+            img.load()
+            return img
+        except Exception as e:
+            print(f"[ASSETS] unreadable cached asset {path}: {e}")
 
+    img = build()
+    try:
+        os.makedirs(ASSET_CACHE_DIR, exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        img.save(tmp_path, format="PNG")
+        os.replace(tmp_path, path)
+    except Exception as e:
+        print(f"[ASSETS] could not store {path}: {e}")
+    return img
 
 # ---------- Gradient + Rounded ---------- #
-def make_diagonal_gradient(w, h, radius=25):
+def make_diagonal_gradient(w, h, radius=25, light=(60, 64, 75), dark=(30, 33, 41)):
+    import numpy as np  # only needed when the asset cache misses
     # Supersampled draw to avoid dark ridges and jagged corners
     scale = 2
     W, H = w * scale, h * scale
-    img2x = Image.new("RGBA", (W, H), (1, 2, 3, 0))  # fully transparent outside
-    draw = ImageDraw.Draw(img2x)
-    for x in range(W):
-        for y in range(H):
-            mix = (x * 0.8 + y * 0.2) / (W + H)
-            # Odoo-like dark gray gradient
-            r1, g1, b1 = (60, 64, 75)     # lighter gray
-            r2, g2, b2 = (30, 33, 41)     # darker gray
-            r = int(r1 + (r2 - r1) * mix)
-            g = int(g1 + (g2 - g1) * mix)
-            b = int(b1 + (b2 - b1) * mix)
-            draw.point((x, y), fill=(r, g, b, 255))
+    # Odoo-like dark gray gradient, light -> dark along a mostly horizontal diagonal
+    xs = np.arange(W, dtype=np.float64)[np.newaxis, :]
+    ys = np.arange(H, dtype=np.float64)[:, np.newaxis]
+    mix = (xs * 0.8 + ys * 0.2) / (W + H)
+    rgba = np.empty((H, W, 4), dtype=np.uint8)
+    for c in range(3):
+        rgba[:, :, c] = (light[c] + (dark[c] - light[c]) * mix).astype(np.uint8)
+    rgba[:, :, 3] = 255
+    img2x = Image.fromarray(rgba, "RGBA")
     mask2x = Image.new("L", (W, H), 0)
     ImageDraw.Draw(mask2x).rounded_rectangle([0, 0, W, H], radius * scale, fill=255)
     img2x.putalpha(mask2x)
@@ -267,6 +306,15 @@ def make_diagonal_gradient(w, h, radius=25):
     img = img2x.resize((w, h), Image.LANCZOS)
     return img
 
+def make_transparent_icon(path, size):
+    """Load the logo, resize it and turn its near-white background transparent."""
+    import numpy as np  # only needed when the asset cache misses
+    icon = Image.open(path).convert("RGBA").resize(size)
+    rgba = np.array(icon)
+    white = (rgba[:, :, 0] > 240) & (rgba[:, :, 1] > 240) & (rgba[:, :, 2] > 240)
+    rgba[white, 3] = 0
+    return Image.fromarray(rgba, "RGBA")
+
 # ---------- UI / Overlay ---------- #
 def start_overlay(get_message_func):
     root = tk.Tk()
@@ -279,6 +327,8 @@ def start_overlay(get_message_func):
 
     # --- Determine right-side initial position --- #
     def get_monitor_work_area_for_window(hwnd):
+        import win32api
+        import win32con
         monitor = win32api.MonitorFromWindow(hwnd, win32con.MONITOR_DEFAULTTONEAREST)
         info = win32api.GetMonitorInfo(monitor)
         work_left, work_top, work_right, work_bottom = info.get("Work")
@@ -292,7 +342,11 @@ def start_overlay(get_message_func):
     root.geometry(f"{WIDTH}x{HEIGHT}+{start_x}+{start_y}")
 
     # --- Gradient background with clean rounded corners --- #
-    bg_img = make_diagonal_gradient(WIDTH, HEIGHT)
+    bg_img = cached_asset(
+        "gradient",
+        {"size": [WIDTH, HEIGHT], "radius": 25, "light": [60, 64, 75], "dark": [30, 33, 41]},
+        lambda: make_diagonal_gradient(WIDTH, HEIGHT, 25, (60, 64, 75), (30, 33, 41))
+    )
     bg_photo = ImageTk.PhotoImage(bg_img)
 
     canvas = tk.Canvas(root, width=WIDTH, height=HEIGHT,
@@ -303,10 +357,14 @@ def start_overlay(get_message_func):
     # --- Icon and text --- #
     icon_photo = None
     if os.path.exists(ICON_PATH):
-        icon = Image.open(ICON_PATH).convert("RGBA").resize((int(64 * 1.2), int(64 * 1.2)))
-        datas = icon.getdata()
-        icon.putdata([(r, g, b, 0) if r > 240 and g > 240 and b > 240 else (r, g, b, a)
-                      for (r, g, b, a) in datas])
+        icon_size = (int(64 * 1.2), int(64 * 1.2))
+        with open(ICON_PATH, "rb") as f:
+            icon_digest = hashlib.sha256(f.read()).hexdigest()
+        icon = cached_asset(
+            "icon",
+            {"source": icon_digest, "size": list(icon_size)},
+            lambda: make_transparent_icon(ICON_PATH, icon_size)
+        )
         icon_photo = ImageTk.PhotoImage(icon)
         canvas.create_image(45, HEIGHT // 2, anchor="w", image=icon_photo)
 
@@ -322,6 +380,56 @@ def start_overlay(get_message_func):
         width=WIDTH - 180
     )
 
+    # One scheduler for every overlay animation; it only wakes while something animates
+    animator = Animator(root, frame_ms=ANIMATION_FRAME_MS, frame_budget_ms=ANIMATION_FRAME_BUDGET_MS)
+    cpu_meter = CpuMeter()
+
+    # --- Performance HUD (F2) --- #
+    hud_text = canvas.create_text(
+        125,
+        148,
+        text="",
+        fill="#9aa0ad",
+        font=("Segoe UI", 8),
+        anchor="nw",
+        width=WIDTH - 180,
+        state="normal" if SHOW_PERF_HUD else "hidden"
+    )
+    hud_state = {"visible": SHOW_PERF_HUD, "after_id": None}  # after_id: the one pending refresh
+
+    def refresh_hud():
+        hud_state["after_id"] = None
+        if not hud_state["visible"]:
+            return
+        line = "p50/p95  " + tracer.summary_line(HUD_STAGES)
+        stats = engine.http_stats() if engine is not None else None
+        if stats:
+            line += (f"  ·  http {stats['pool']['in_flight']}/{stats['pool']['connections']} conn, "
+                     f"{stats['retries']} retries, breaker {stats['breaker']}")
+        line += f"  ·  ui {animator.wakeups_per_second():.1f} wakeups/s, cpu {cpu_meter.read():.1f}%"
+        canvas.itemconfig(hud_text, text=line)
+        if hud_state["after_id"] is None:
+            hud_state["after_id"] = root.after(1000, refresh_hud)
+
+    def toggle_hud(event=None):
+        hud_state["visible"] = not hud_state["visible"]
+        canvas.itemconfig(hud_text, state="normal" if hud_state["visible"] else "hidden")
+        if hud_state["after_id"] is not None:
+            root.after_cancel(hud_state["after_id"])  # a quick off/on must not start a second loop
+        refresh_hud()
+
+    root.bind_all("<F2>", toggle_hud)
+
+    def metrics_extra():
+        return animator.prometheus() + (engine.prometheus() if engine is not None else "")
+
+    def export_metrics():
+        try:
+            tracer.export_prometheus(METRICS_PATH, extra=metrics_extra())
+        except OSError as e:
+            print(f"[TRACE] metrics export failed: {e}")
+        root.after(METRICS_EXPORT_INTERVAL * 1000, export_metrics)
+
     # --- Output box (read-only) --- #
     output_box = tk.Text(
         root,
@@ -337,10 +445,57 @@ def start_overlay(get_message_func):
     output_box.configure(state=tk.DISABLED)
 
     def set_output_text(text: str):
-        output_box.configure(state=tk.NORMAL)
-        output_box.delete("1.0", "end")
-        output_box.insert("1.0", text)
-        output_box.configure(state=tk.DISABLED)
+        with tracer.span("render"):
+            output_box.configure(state=tk.NORMAL)
+            output_box.delete("1.0", "end")
+            output_box.insert("1.0", text)
+            output_box.configure(state=tk.DISABLED)
+            output_box.update_idletasks()
+
+    # --- Streaming output: deltas arrive on worker threads, Tk is updated at most once per frame --- #
+    stream_lock = threading.Lock()
+    stream_state = {"request_id": 0, "pending": [], "scheduled": False, "started": False}
+
+    def flush_stream():
+        with stream_lock:
+            chunk = "".join(stream_state["pending"])
+            stream_state["pending"].clear()
+            stream_state["scheduled"] = False
+            first = not stream_state["started"]
+            if chunk:
+                stream_state["started"] = True
+        if not chunk:
+            return
+        with tracer.span("render", request_id=f"chat-{stream_state['request_id']}"):
+            output_box.configure(state=tk.NORMAL)
+            if first:
+                output_box.delete("1.0", "end")  # replace the "thinking..." placeholder
+            output_box.insert("end", chunk)
+            output_box.see("end")
+            output_box.configure(state=tk.DISABLED)
+            output_box.update_idletasks()
+
+    def append_stream_delta(request_id: int, delta):
+        """delta None: the streaming model failed mid-reply; its text is replaced by the next one's."""
+        with stream_lock:
+            if request_id < stream_state["request_id"]:
+                return  # delta from a superseded question
+            if request_id > stream_state["request_id"] or delta is None:
+                stream_state.update(request_id=request_id, pending=[], started=False)
+            if delta is None:
+                return
+            stream_state["pending"].append(delta)
+            if stream_state["scheduled"]:
+                return
+            stream_state["scheduled"] = True
+            # First token is shown immediately; later ones are batched per frame
+            delay = STREAM_FLUSH_MS if stream_state["started"] else 0
+        root.after(delay, flush_stream)
+
+    def restart_stream(request_id: int):
+        with stream_lock:
+            if request_id > stream_state["request_id"]:
+                stream_state.update(request_id=request_id, pending=[], started=False)
 
     # --- Chat input textbox (bottom) --- #
     chat_box = tk.Text(
@@ -364,10 +519,52 @@ def start_overlay(get_message_func):
 
     # Idle timer variables
     last_user_input_time = time.time()
-    is_busy = False
+
+    reply_labels = {}  # chat request ID -> status line for replies that did not come from the model
+
+    def send_chat_message(request_id, user_input, cancel):
+        """Runs on the chat queue worker. Returns the reply, or None if a newer question superseded it."""
+        try:
+            img = capture_screen()
+            result = get_engine().chat(
+                user_input, img, get_active_window_title(),
+                on_delta=(lambda delta: append_stream_delta(request_id, delta)) if STREAM_CHAT else None,
+                cancel=cancel
+            )
+            if result["latency"] is not None:
+                cadence.note_reply(result["latency"], result["ok"], billable=False)
+            if result["reply"] is None:
+                return None
+            reply = result["reply"]
+            if result["label"]:
+                reply_labels[request_id] = result["label"]
+            print(f"💬 {ASSISTANT_NAME} replied: {reply}")
+        except Exception as e:
+            reply = f"⚠️ {e}"
+            print(f"Exception in send_message: {e}")
+        return reply
+
+    def show_chat_reply(request_id, reply):
+        if not chat_queue.is_current(request_id):
+            print(f"… discarded stale reply for chat request {request_id}")
+            reply_labels.pop(request_id, None)
+            return
+        set_output_text(reply)
+        set_message(reply_labels.pop(request_id, '💬 Chat active'))
+
+    def handle_chat(request_id, user_input, cancel):
+        with tracer.request("chat", request_id):
+            return send_chat_message(request_id, user_input, cancel)
+
+    # Newest question wins; queued background observations give way to chat
+    chat_queue = ChatQueue(
+        handle_chat,
+        deliver=lambda request_id, reply: root.after(0, lambda: show_chat_reply(request_id, reply)),
+        on_submit=lambda: scheduler.cancel_pending()
+    )
 
     def on_chat_enter(event=None):
-        nonlocal last_user_input_time, is_busy
+        nonlocal last_user_input_time
         if event.state & 0x0001:  # Shift pressed
             return
         text = chat_box.get("1.0", "end").strip()
@@ -375,202 +572,62 @@ def start_overlay(get_message_func):
             return "break"
         print(f"🟢 User input detected: {text}")
         last_user_input_time = time.time()
-        is_busy = True
         chat_box.delete("1.0", "end")
+        request_id = chat_queue.submit(text)
+        restart_stream(request_id)
         set_output_text(f"{ASSISTANT_NAME} is thinking...")
-
-        def send_chat_message(user_input):
-            nonlocal is_busy
-            try:
-                img = capture_screen()
-                img_bytes = prepare_image_for_upload(img)
-                img_b64 = base64.b64encode(img_bytes).decode("utf-8")
-
-                system_prompt = (
-                    f"You are {ASSISTANT_NAME}, an intelligent on-screen assistant. "
-                    f"You can SEE the user's current screen image; base your responses on what is visibly present "
-                    f"(Odoo windows, invoices, code editors, filenames, UI elements, etc.) plus the user's question. "
-                    f"Avoid generic coaching or vague advice like 'stay focused' or 'double-check everything' "
-                    f"unless the screen truly provides no useful cues. "
-                    f"Keep replies focused and concise: ideally 1–3 short sentences directly about what is on screen "
-                    f"and how it relates to the user's request."
-                )
-
-                # Try primary model first
-                resp = client.responses.create(
-                    model=PRIMARY_MODEL,
-                    input=[
-                        {
-                            "role": "system",
-                            "content": [{"type": "input_text", "text": system_prompt}]
-                        },
-                        {
-                            "role": "user",
-                            "content": [
-                                {"type": "input_text", "text": user_input},
-                                {"type": "input_image", "image_url": f"data:image/jpeg;base64,{img_b64}"}
-                            ]
-                        }
-                    ],
-                    max_output_tokens=250
-                )
-
-                reply = resp.output_text if hasattr(resp, 'output_text') else ""
-                if reply:
-                    reply = reply.strip()
-                
-                # Debug logging
-                if DEBUG_MODEL_IO:
-                    print(f"[DEBUG send_chat_message] output_text: {reply[:300] if reply else '(empty)'}")
-                    if not reply:
-                        try:
-                            if hasattr(resp, 'model_dump'):
-                                resp_repr = json.dumps(resp.model_dump(), default=str, indent=2)[:500]
-                            else:
-                                resp_repr = json.dumps(resp.__dict__, default=str, indent=2)[:500]
-                            print(f"[DEBUG send_chat_message] full response structure: {resp_repr}")
-                        except Exception:
-                            print(f"[DEBUG send_chat_message] full response structure: {repr(resp)[:500]}")
-
-                # If empty, try fallback model
-                if not reply:
-                    print("send_chat_message: empty content from model, trying fallback")
-                    try:
-                        resp = client.responses.create(
-                            model=FALLBACK_MODEL,
-                            input=[
-                                {
-                                    "role": "system",
-                                    "content": [{"type": "input_text", "text": system_prompt}]
-                                },
-                                {
-                                    "role": "user",
-                                    "content": [
-                                        {"type": "input_text", "text": user_input},
-                                        {"type": "input_image", "image_url": f"data:image/jpeg;base64,{img_b64}"}
-                                    ]
-                                }
-                            ],
-                            max_output_tokens=250
-                        )
-                        reply = resp.output_text if hasattr(resp, 'output_text') else ""
-                        if reply:
-                            reply = reply.strip()
-                            print(f"[FALLBACK] send_chat_message succeeded with {FALLBACK_MODEL}")
-                    except Exception as e:
-                        print(f"[FALLBACK] send_chat_message error: {e}")
-
-                # If still empty, return clear error message
-                if not reply:
-                    print("send_chat_message: empty content from model (both primary and fallback)")
-                    reply = "⚠️ Unable to process request — model returned empty response. Please try again."
-
-                print(f"💬 {ASSISTANT_NAME} replied: {reply}")
-            except Exception as e:
-                reply = f"⚠️ {e}"
-                print(f"Exception in send_message: {e}")
-
-            root.after(0, lambda: set_output_text(reply))
-            root.after(0, lambda: set_message('💬 Chat active'))
-            is_busy = False
-
-        threading.Thread(target=send_chat_message, args=(text,), daemon=True).start()
+        if DEBUG_MODEL_IO:
+            print(f"[CHAT QUEUE] {chat_queue.stats()}")
         return "break"
 
     chat_box.bind("<Return>", on_chat_enter)
     chat_box.bind("<KP_Enter>", on_chat_enter)
 
-    # Idle screen observation function
-    def check_idle_and_update():
-        nonlocal last_user_input_time, is_busy
-        if not is_busy and time.time() - last_user_input_time > 15:
-            try:
-                img = capture_screen()
-                obs = analyze_screen(img)
-                if obs:
-                    root.after(0, lambda: set_output_text(obs))
-                    root.after(0, lambda: set_message("💬 Screen observation"))
-            except Exception as e:
-                print(f"Idle update error: {e}")
-        
-        # Schedule next check
-        root.after(15000, check_idle_and_update)  # Check every 15 seconds
-
-    # --- Pop-out animation state ---
-    pop_running = {"active": False}
+    # Idle screen observations only run while the user is not chatting
+    def user_is_idle():
+        return not chat_queue.busy and time.time() - last_user_input_time > IDLE_AFTER
 
+    # --- Pop-out animation (geometry) ---
     def animate_pop():
-        if pop_running["active"]:
-            return
-        pop_running["active"] = True
-        # Capture current window geometry and center
+        # A pop requested while one is running is coalesced into it
         geom = root.geometry().split("+")
         win_w, win_h = WIDTH, HEIGHT
         win_x, win_y = int(geom[1]), int(geom[2])
         cx = win_x + win_w // 2
         cy = win_y + win_h // 2
-
-        frames = 6
-        duration_ms = 300
-        dt = max(1, duration_ms // frames)
         peak = 1.06  # ~6% scale up
-        scales = []
-        for i in range(frames):
-            t = (i + 1) / frames
-            if t <= 0.5:
-                s = 1.0 + (peak - 1.0) * (t / 0.5)
-            else:
-                s = peak - (peak - 1.0) * ((t - 0.5) / 0.5)
-            scales.append(s)
 
-        def step(i=0):
-            if i >= len(scales):
+        def apply(lift):
+            if lift <= 0:
                 root.geometry(f"{win_w}x{win_h}+{win_x}+{win_y}")
-                pop_running["active"] = False
                 return
-            s = scales[i]
+            s = 1.0 + (peak - 1.0) * lift
             new_w = int(win_w * s)
             new_h = int(win_h * s)
             new_x = int(cx - new_w / 2)
             new_y = int(cy - new_h / 2)
             root.geometry(f"{new_w}x{new_h}+{new_x}+{new_y}")
-            root.after(dt, lambda: step(i + 1))
 
-        step()
+        animator.animate("pop", apply, 0.0, 1.0, 0.30, ease=bump, quantum=0.1, restart=False)
 
     # --- Window fade (entire overlay) ---
-    overlay_fade_duration_s = 28.0
-    overlay_min_alpha = 0.18
-    last_overlay_reset_time = time.time()
-
-    def window_fade_tick():
-        elapsed = time.time() - last_overlay_reset_time
-        if elapsed <= 0:
-            alpha = 1.0
-        else:
-            t = min(1.0, elapsed / overlay_fade_duration_s)
-            alpha = max(overlay_min_alpha, 1.0 - t * (1.0 - overlay_min_alpha))
-        try:
-            root.attributes("-alpha", alpha)
-        except Exception:
-            pass
-        finally:
-            root.after(150, window_fade_tick)
+    def set_alpha(alpha):
+        root.attributes("-alpha", alpha)
+
+    def reset_overlay_alpha():
+        """Full opacity now, then one slow fade to OVERLAY_MIN_ALPHA; no timers once it has settled."""
+        animator.animate("alpha", set_alpha, 1.0, OVERLAY_MIN_ALPHA, OVERLAY_FADE_SECONDS, quantum=0.01)
 
     def set_message(text):
-        nonlocal last_overlay_reset_time
         canvas.itemconfig(message_text, text=text)
         # Reset window alpha to full and trigger pop
-        last_overlay_reset_time = time.time()
-        try:
-            root.attributes("-alpha", 1.0)
-        except Exception:
-            pass
+        reset_overlay_alpha()
         animate_pop()
 
     # --- Dragging --- #
     drag = {"offset_x": 0, "offset_y": 0, "moved": False}
     def on_press(e):
+        animator.finish("pop")  # drag from the rest position
         geom = root.geometry().split("+")
         win_x, win_y = int(geom[1]), int(geom[2])
         drag["offset_x"] = e.x_root - win_x
@@ -582,15 +639,10 @@ def start_overlay(get_message_func):
         root.geometry(f"{WIDTH}x{HEIGHT}+{new_x}+{new_y}")
         drag["moved"] = True
     def on_release(e):
-        nonlocal last_overlay_reset_time
         if not drag["moved"]:
             print("🟢 Click detected on overlay")
             # Reset window alpha fully on click
-            last_overlay_reset_time = time.time()
-            try:
-                root.attributes("-alpha", 1.0)
-            except Exception:
-                pass
+            reset_overlay_alpha()
             # Focus chat input instead of opening panel
             chat_box.focus_force()
     canvas.bind("<ButtonPress-1>", on_press)
@@ -599,63 +651,94 @@ def start_overlay(get_message_func):
 
     # Optional polish: reset to full on hover
     def on_enter(_):
-        nonlocal last_overlay_reset_time
-        last_overlay_reset_time = time.time()
-        try:
-            root.attributes("-alpha", 1.0)
-        except Exception:
-            pass
+        reset_overlay_alpha()
     canvas.bind("<Enter>", on_enter)
 
     # --- Fade-in animation (window alpha) ---
     def fade_in():
+        """Fade up to full opacity over 0.3 s without blocking the event loop, then fade out slowly."""
         try:
-            current = float(root.attributes("-alpha")) if root.attributes("-alpha") else 1.0
+            current = float(root.attributes("-alpha"))
         except Exception:
             current = 0.0
-        target = 1.0
-        steps = 12
-        duration = 0.30
-        dt = duration / steps
-        for i in range(steps + 1):
-            a = current + (target - current) * (i / steps)
-            root.attributes("-alpha", max(0.0, min(1.0, a)))
-            root.update_idletasks()
-            time.sleep(dt)
+        animator.animate("alpha", set_alpha, current, 1.0, 0.30, quantum=0.01, on_done=reset_overlay_alpha)
 
     root.attributes("-alpha", 1.0)
 
-    # --- Periodic update --- #
-    def update_loop(first_run=False):
-        if first_run:
-            set_message("Starting up... Preparing model.")
-            threading.Thread(target=debug_test_text_only, daemon=True).start()
-            threading.Thread(target=warm_up_model, daemon=True).start()
-            root.after(5000, lambda: fetch_and_reschedule())
-            return
-        fetch_and_reschedule()
-
-    def fetch_and_reschedule():
-        try:
-            msg = get_message_func()
-            if msg:
-                print(f"📝 New observation: {msg}")
-                set_message(msg)
-            else:
+    # --- Background observations (capture + model run on the scheduler thread) --- #
+    def show_observations():
+        """Drain scheduler results on the Tk thread."""
+        while True:
+            try:
+                reason, result = scheduler.results.get_nowait()
+            except queue.Empty:
+                return
+            if isinstance(result, Exception):
+                err = f"⚠️ {result}"
+                print(err)
+                set_message(err)
+            elif not result:
                 print("… no change")
-        except Exception as e:
-            err = f"⚠️ {e}"
-            print(err)
-            set_message(err)
-        finally:
-            root.after(UPDATE_INTERVAL * 1000, update_loop)
+            elif reason == "idle" and chat_queue.busy:
+                print(f"… observation dropped, chat in progress: {result}")
+            else:
+                print(f"📝 New observation: {result}")
+                if reason == "idle":
+                    set_output_text(result)
+                    set_message("💬 Screen observation")
+                else:
+                    set_message(result)
+
+    def run_observation(reason):
+        with tracer.request(reason):
+            result = get_message_func()
+        if DEBUG_MODEL_IO:
+            print(f"[CADENCE] next in {cadence.next_interval():.0f}s ({cadence.describe()})")
+        return result
+
+    scheduler = ObservationScheduler(
+        run_observation,
+        notify=lambda: root.after(0, show_observations)
+    )
+    # One adaptive cadence; the predicates decide where an observation is shown, and pause
+    # observations while the circuit breaker is open (the first tick after that is the probe)
+    scheduler.every("periodic", cadence.next_interval,
+                    predicate=lambda: api_available() and not chat_queue.busy and not user_is_idle(),
+                    first_delay=FIRST_OBSERVATION_DELAY)
+    scheduler.every("idle", cadence.next_interval, predicate=lambda: api_available() and user_is_idle(),
+                    first_delay=FIRST_OBSERVATION_DELAY)
 
     # Start loops
-    window_fade_tick()
-    update_loop(first_run=True)
-    check_idle_and_update()  # Start idle timer for screen observations
+    refresh_hud()
+    if METRICS_PATH:
+        root.after(METRICS_EXPORT_INTERVAL * 1000, export_metrics)
+    set_message("Starting up... Preparing model.")
+
+    def mark_interactive():
+        tracer.record("startup.interactive", time.perf_counter() - STARTUP_T0)
+        print(f"[STARTUP] overlay interactive {time.perf_counter() - STARTUP_T0:.2f}s after launch")
+
+    def run_warm_up():
+        error = warm_up()
+        root.after(0, lambda: set_message(error or f"{ASSISTANT_NAME} ready — watching your screen"))
 
-    root.mainloop()
+    root.after_idle(mark_interactive)
+    threading.Thread(target=run_warm_up, daemon=True).start()
+    scheduler.start()
+
+    try:
+        root.mainloop()
+    finally:
+        scheduler.stop()
+        chat_queue.stop()
+        if region_capture is not None:
+            region_capture.close()
+            capture_service.close()
+        if METRICS_PATH:
+            tracer.export_prometheus(METRICS_PATH, extra=metrics_extra())
+        if engine is not None:
+            engine.close()
+        tracer.close()
 
 # ---------- Main Loop ---------- #
 def main_loop():
@@ -663,8 +746,8 @@ def main_loop():
 
     def get_new_output():
         nonlocal last_text
-        img = capture_screen()
-        obs = analyze_screen(img)
+        img, monitor = capture_screen(with_monitor=True)
+        obs = analyze_screen_if_changed(img, monitor)
         if not obs:
             return None
         if obs != last_text:
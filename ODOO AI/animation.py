@@ -0,0 +1,200 @@
+import time
+from collections import deque
+
+
+def linear(t):
+    return t
+
+
+def bump(t):
+    """0 -> 1 -> 0 over the tween: a pop that returns to rest."""
+    return 1.0 - abs(2.0 * t - 1.0)
+
+
+class Tween:
+    __slots__ = ("key", "apply", "start", "end", "duration", "ease", "quantum", "interval", "on_done",
+                 "began", "due")
+
+    def __init__(self, key, apply, start, end, duration, ease, quantum, interval, on_done, began):
+        self.key = key
+        self.apply = apply
+        self.start = start
+        self.end = end
+        self.duration = duration
+        self.ease = ease
+        self.quantum = quantum
+        self.interval = interval
+        self.on_done = on_done
+        self.began = began
+        self.due = began
+
+    def value(self, now):
+        t = 1.0 if self.duration <= 0 else min(1.0, (now - self.began) / self.duration)
+        eased = self.ease(t)
+        if eased in (0.0, 1.0):  # exact endpoints, no float residue
+            return (self.start, self.end)[int(eased)], t >= 1.0
+        return self.start + (self.end - self.start) * eased, t >= 1.0
+
+
+class Animator:
+    """
+    Runs overlay animations from the Tk event loop, and only while one is running.
+
+    - One tween per key ("alpha", "pop"): a new request for a running key either
+      replaces it, continuing from the value on screen, or is coalesced into it
+      (`restart=False`)
+    - Tweens are time-based: a late frame skips ahead instead of slowing the
+      animation down. A tween with a `quantum` wakes at most once per quantum
+      step (a 28 s fade over 0.82 alpha in 0.01 steps: ~3 wakeups/s), others at
+      `frame_ms`
+    - Values are rounded to the quantum and unchanged values are not written
+    - A frame stops after `frame_budget_ms`; the tweens it did not reach go
+      first in the next frame
+    - With nothing animating there is no pending timer at all
+
+    Tk thread only. `stats` counts wakeups, writes and skipped writes;
+    `wakeups_per_second()` is measured over the last `window` seconds.
+    """
+
+    def __init__(self, root, frame_ms=16, frame_budget_ms=4.0, window=10.0):
+        self.root = root
+        self.frame_ms = frame_ms
+        self.frame_budget = frame_budget_ms / 1000.0
+        self.window = window
+        self.stats = {"wakeups": 0, "writes": 0, "skipped_writes": 0, "replaced": 0, "coalesced": 0,
+                      "over_budget": 0, "busy_ms": 0.0}
+        self._tweens = {}  # key -> Tween; dict order is service order
+        self._written = {}  # key -> last value written
+        self._after_id = None
+        self._wake_at = None
+        self._wakeups = deque()  # monotonic times of recent wakeups
+
+    @property
+    def active(self):
+        return bool(self._tweens)
+
+    def animate(self, key, apply, start, end, duration, ease=linear, quantum=None, on_done=None, restart=True):
+        """
+        Tween `key` from `start` to `end` over `duration` seconds, calling apply(value).
+        The start value is applied at once. Returns False when coalesced into a running tween.
+        """
+        running = self._tweens.pop(key, None)
+        if running is not None:
+            if not restart:
+                self._tweens[key] = running
+                self.stats["coalesced"] += 1
+                return False
+            self.stats["replaced"] += 1
+        interval = self.frame_ms / 1000.0
+        span = abs(end - start)
+        if quantum and span and duration > 0:
+            interval = max(interval, duration * quantum / span)
+        now = time.monotonic()
+        tween = Tween(key, apply, start, end, duration, ease, quantum, interval, on_done, now)
+        self._tweens[key] = tween
+        self._advance(tween, now)
+        self._schedule()
+        return True
+
+    def finish(self, key):
+        """Jump a running tween to its end value."""
+        tween = self._tweens.get(key)
+        if tween is not None:
+            tween.began = float("-inf")
+            self._advance(tween, time.monotonic())
+            self._schedule()
+
+    def cancel(self, key):
+        """Stop a tween where it is."""
+        if self._tweens.pop(key, None) is not None:
+            self._schedule()
+
+    def wakeups_per_second(self):
+        self._prune(time.monotonic())
+        return len(self._wakeups) / self.window
+
+    def describe(self):
+        return (f"{self.wakeups_per_second():.1f} wakeups/s, {self.stats['writes']} writes, "
+                f"{self.stats['skipped_writes']} skipped, {len(self._tweens)} active")
+
+    def prometheus(self, prefix="odoo_ai_animation"):
+        lines = [f"# TYPE {prefix}_events_total counter"]
+        for name in ("wakeups", "writes", "skipped_writes", "replaced", "coalesced", "over_budget"):
+            lines.append(f'{prefix}_events_total{{event="{name}"}} {self.stats[name]}')
+        lines.append(f"# TYPE {prefix}_busy_seconds_total counter")
+        lines.append(f"{prefix}_busy_seconds_total {self.stats['busy_ms'] / 1000:.6f}")
+        lines.append(f"# TYPE {prefix}_wakeups_per_second gauge")
+        lines.append(f"{prefix}_wakeups_per_second {self.wakeups_per_second():.3f}")
+        return "\n".join(lines) + "\n"
+
+    def _frame(self):
+        self._after_id = self._wake_at = None
+        start = time.monotonic()
+        self.stats["wakeups"] += 1
+        self._wakeups.append(start)
+        self._prune(start)
+        for key, tween in list(self._tweens.items()):
+            if time.monotonic() - start > self.frame_budget:
+                self.stats["over_budget"] += 1
+                break  # unreached tweens stay at the front for the next frame
+            if tween.due > start + 0.001:
+                continue
+            self._advance(tween, time.monotonic())
+            if self._tweens.get(key) is tween:
+                self._tweens[key] = self._tweens.pop(key)  # serviced: to the back of the line
+        self.stats["busy_ms"] += (time.monotonic() - start) * 1000
+        self._schedule()
+
+    def _advance(self, tween, now):
+        value, done = tween.value(now)
+        if tween.quantum and not done:
+            value = round(value / tween.quantum) * tween.quantum
+        if done:
+            del self._tweens[tween.key]
+        else:
+            tween.due = now + tween.interval
+        if self._written.get(tween.key) == value:
+            self.stats["skipped_writes"] += 1
+        else:
+            try:
+                tween.apply(value)
+            except Exception as e:
+                print(f"[ANIMATION] {tween.key} stopped: {e}")
+                self._tweens.pop(tween.key, None)
+                return
+            self._written[tween.key] = value
+            self.stats["writes"] += 1
+        if done and tween.on_done:
+            tween.on_done()
+
+    def _schedule(self):
+        if not self._tweens:
+            if self._after_id is not None:
+                self.root.after_cancel(self._after_id)
+                self._after_id = self._wake_at = None
+            return
+        wake_at = min(tween.due for tween in self._tweens.values())
+        if self._after_id is not None:
+            if self._wake_at <= wake_at + 0.001:
+                return
+            self.root.after_cancel(self._after_id)
+        self._wake_at = wake_at
+        delay_ms = max(1, int((wake_at - time.monotonic()) * 1000))
+        self._after_id = self.root.after(delay_ms, self._frame)
+
+    def _prune(self, now):
+        while self._wakeups and now - self._wakeups[0] > self.window:
+            self._wakeups.popleft()
+
+
+class CpuMeter:
+    """Process CPU use (percent of one core) since the previous read."""
+
+    def __init__(self):
+        self._last = (time.monotonic(), time.process_time())
+
+    def read(self):
+        wall, cpu = time.monotonic(), time.process_time()
+        last_wall, last_cpu = self._last
+        self._last = (wall, cpu)
+        return 100.0 * (cpu - last_cpu) / max(1e-6, wall - last_wall)
@@ -0,0 +1,184 @@
+import re
+import time
+import zlib
+import threading
+from collections import OrderedDict
+
+from image_store import frame_digest
+
+STOPWORDS = frozenset(
+    "a an the is are was were be been do does did of on in at to for from with by this that these those it its "
+    "here there what which who whom how me my i you your we our can could should would please tell show "
+    "de het een is van op in voor met dit dat wat welke hoe".split()
+)
+NUMBER_RE = re.compile(r"\d+(?:[.,]\d+)*")
+
+
+# ---------- Embedders ---------- #
+class HashingEmbedder:
+    """
+    Model-free question embedding: stemmed content words plus their character
+    trigrams, hashed into `dim` buckets. Catches rewordings that share the key
+    terms ("what VAT rate applies here?" / "which VAT rate is this?") in well
+    under a millisecond; it does not know synonyms.
+    """
+
+    threshold = 0.8  # cosine similarity that counts as the same question
+
+    def __init__(self, dim=1024):
+        self.dim = dim
+
+    def __call__(self, texts):
+        import numpy as np
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for term, weight in _terms(text):
+                vectors[row, zlib.crc32(term.encode("utf-8")) % self.dim] += weight
+        return _normalize(vectors)
+
+
+class ModelEmbedder:
+    """Sentence embeddings from the model behind knowledge_manager's vector index (chromadb default, ONNX)."""
+
+    threshold = 0.9
+
+    def __init__(self, function=None):
+        if function is None:
+            from knowledge_manager import default_embedding_function
+            function = default_embedding_function()
+        self.function = function
+
+    def __call__(self, texts):
+        import numpy as np
+        return _normalize(np.asarray(self.function(list(texts)), dtype=np.float32))
+
+
+def create_embedder(backend="hashing"):
+    """
+    backend:
+      "hashing" - HashingEmbedder (default; no model download)
+      "model"   - ModelEmbedder, falls back to hashing if the model cannot be loaded
+    """
+    if backend == "hashing":
+        return HashingEmbedder()
+    if backend == "model":
+        try:
+            embedder = ModelEmbedder()
+            embedder(["warm up"])  # loads (and on first use downloads) the model now, not on the first question
+            return embedder
+        except Exception as e:
+            print(f"[ANSWERS] embedding model unavailable ({e}); using hashing embeddings")
+            return HashingEmbedder()
+    raise ValueError(f"unknown embedder backend {backend!r}")
+
+
+def _terms(text):
+    for word in re.findall(r"\w+", text.lower()):
+        if word in STOPWORDS:
+            continue
+        word = _stem(word)
+        yield word, 1.0
+        padded = f"<{word}>"
+        for i in range(len(padded) - 2):
+            yield "#" + padded[i:i + 3], 0.25
+
+
+def _stem(word):
+    for suffix, replacement in (("ies", "y"), ("ing", ""), ("ed", ""), ("es", ""), ("s", "")):
+        if len(word) > len(suffix) + 2 and word.endswith(suffix):
+            return word[:-len(suffix)] + replacement
+    return word
+
+
+def _normalize(vectors):
+    import numpy as np
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-9)
+
+
+# ---------- Cache ---------- #
+class SemanticAnswerCache:
+    """
+    Chat answers keyed by (question embedding, screen), per `scope` (user).
+
+    - A lookup hits when a stored question on the *same screen* has cosine
+      similarity >= `threshold` and mentions the same numbers (line 3 is not line 4)
+    - Same screen = same window title and the same exact pixel digest (a
+      perceptual fingerprint cannot tell 1,234.00 from 1,284.00); answers are
+      never shared across scopes, so one user cannot read another's
+    - Each `client` (overlay seat) has a current screen; when a client's window
+      moves on to new content, the answers for the old content are dropped
+      unless another client is still looking at it
+    - Bounded LRU of `max_entries` answers, each valid for `ttl` seconds
+
+    Usage:
+        hit, probe = cache.lookup(question, img, window_title, client=seat, scope=user)
+        if hit is None:
+            answer = ask_model(...)
+            cache.put(probe, answer)
+    """
+
+    def __init__(self, embed, threshold=None, max_entries=256, ttl=900):
+        self.embed = embed
+        self.threshold = threshold if threshold is not None else getattr(embed, "threshold", 0.9)
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.stats = {"hits": 0, "misses": 0, "invalidated": 0, "evictions": 0}
+        self._entries = OrderedDict()  # entry ID -> [vector, question, numbers, answer, created, screen]
+        self._current = OrderedDict()  # client -> (scope, window title, frame digest) it looked up last
+        self._ids = 0
+        self._lock = threading.Lock()
+
+    def lookup(self, question, img, window_title, client="local", scope="local"):
+        """Returns (hit, probe); hit is {"answer", "question", "similarity"} or None."""
+        import numpy as np
+        vector = self.embed([question])[0]
+        screen = (scope, window_title, frame_digest(img))
+        numbers = frozenset(NUMBER_RE.findall(question))
+        now = time.time()
+        with self._lock:
+            self._see(client, screen)
+            probe = {"vector": vector, "question": question, "numbers": numbers, "screen": screen}
+            candidates = [(entry_id, entry) for entry_id, entry in self._entries.items()
+                          if entry[5] == screen and now - entry[4] <= self.ttl and entry[2] == numbers]
+            if not candidates:
+                self.stats["misses"] += 1
+                return None, probe
+            similarities = np.stack([entry[0] for _, entry in candidates]) @ vector
+            best = int(similarities.argmax())
+            if similarities[best] < self.threshold:
+                self.stats["misses"] += 1
+                return None, probe
+            entry_id, entry = candidates[best]
+            self._entries.move_to_end(entry_id)
+            self.stats["hits"] += 1
+            return {"answer": entry[3], "question": entry[1], "similarity": float(similarities[best])}, probe
+
+    def put(self, probe, answer):
+        with self._lock:
+            self._ids += 1
+            self._entries[self._ids] = [probe["vector"], probe["question"], probe["numbers"], answer, time.time(),
+                                        probe["screen"]]
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.stats["evictions"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._current.clear()
+
+    def _see(self, client, screen):
+        """Make `screen` the client's current one; drops its window's old answers. Caller holds the lock."""
+        previous = self._current.pop(client, None)
+        self._current[client] = screen
+        while len(self._current) > self.max_entries:
+            self._current.popitem(last=False)
+        if previous is None or previous == screen or previous[:2] != screen[:2]:
+            return
+        if previous in self._current.values():
+            return  # another client is still on it
+        stale = [entry_id for entry_id, entry in self._entries.items() if entry[5] == previous]
+        for entry_id in stale:
+            del self._entries[entry_id]
+        self.stats["invalidated"] += len(stale)
@@ -0,0 +1,217 @@
+"""
+Headless batch analysis: run a folder (or glob) of screenshots / scanned
+invoices through the same prompts as the overlay, without Tk or win32.
+
+- Bounded concurrency: --workers threads, at most 2 x workers files in flight,
+  so arbitrarily large backlogs stream through in constant memory
+- Rate limits: token buckets for requests/minute and (estimated) tokens/minute;
+  failed calls are retried with exponential backoff
+- Resumable: every finished file is appended to a checkpoint file; rerunning the
+  same command skips them (failures are not checkpointed and are retried)
+- Output: one JSON object per file, appended to --output as soon as it is done
+
+    python batch_analyze.py "D:/scans/2024-12" --output december.jsonl
+    python batch_analyze.py "recordings/*.png" --question "Which invoice number and total are shown?"
+"""
+import os
+import sys
+import json
+import glob
+import time
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+from PIL import Image
+from openai import OpenAI
+
+from model_gateway import ModelGateway, MODES
+from image_encoder import AdaptiveEncoder, estimate_image_tokens
+from prompts import observation_prompt, chat_system_prompt, image_request
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".webp", ".bmp", ".tif", ".tiff", ".gif")
+
+
+class TokenBucket:
+    """Blocking token bucket: `rate` tokens per second, bursts up to `capacity`."""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, amount=1):
+        amount = min(amount, self.capacity)  # a single oversized request must still pass eventually
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= amount:
+                    self._tokens -= amount
+                    return
+                wait_for = (amount - self._tokens) / self.rate
+            time.sleep(wait_for)
+
+
+def iter_images(inputs):
+    """Yield image paths from directories (recursively), globs and plain files, in a stable order."""
+    for pattern in inputs:
+        if os.path.isdir(pattern):
+            for folder, dirs, files in os.walk(pattern):
+                dirs.sort()
+                for name in sorted(files):
+                    if name.lower().endswith(IMAGE_EXTENSIONS):
+                        yield os.path.join(folder, name)
+        else:
+            for path in sorted(glob.iglob(pattern, recursive=True)):
+                if os.path.isfile(path) and path.lower().endswith(IMAGE_EXTENSIONS):
+                    yield path
+
+
+def load_checkpoint(path):
+    if not os.path.exists(path):
+        return set()
+    with open(path, "r", encoding="utf-8") as f:
+        return {line.rstrip("\n") for line in f if line.strip()}
+
+
+class BatchAnalyzer:
+    """Encodes and analyzes one file per call; thread-safe, throttled by the shared buckets."""
+
+    def __init__(self, gateway, encoder, question=None, assistant_name="ODOO AI", max_output_tokens=200,
+                 deadline=60, retries=3, requests_per_minute=60, tokens_per_minute=200_000):
+        self.gateway = gateway
+        self.encoder = encoder
+        self.question = question
+        self.assistant_name = assistant_name
+        self.max_output_tokens = max_output_tokens
+        self.deadline = deadline
+        self.retries = retries
+        self.request_bucket = TokenBucket(requests_per_minute / 60, max(1, requests_per_minute // 6))
+        self.token_bucket = TokenBucket(tokens_per_minute / 60, max(1, tokens_per_minute // 6))
+
+    def analyze(self, path):
+        start = time.perf_counter()
+        with Image.open(path) as img:
+            img.seek(0)  # first page of multi-page TIFF/GIF scans
+            img.load()
+            encoded = self.encoder.encode(img)
+
+        name = os.path.basename(path)
+        if self.question:
+            prompt, system_prompt = self.question, chat_system_prompt(self.assistant_name)
+            request = image_request(encoded, prompt, system_prompt)
+        else:
+            prompt, system_prompt = observation_prompt(self.assistant_name, name), ""
+            request = image_request(encoded, prompt)
+        # Rough token estimate: ~4 characters per text token, tile accounting for the image
+        tokens = estimate_image_tokens(encoded.size, encoded.detail) + (len(prompt) + len(system_prompt)) // 4 \
+            + self.max_output_tokens
+
+        record = {"file": path, "encode": repr(encoded), "bytes": len(encoded.data)}
+        for attempt in range(self.retries + 1):
+            self.request_bucket.acquire()
+            self.token_bucket.acquire(tokens)
+            reply = self.gateway.call(request, max_output_tokens=self.max_output_tokens, deadline=self.deadline)
+            if reply.text:
+                record.update(text=reply.text, model=reply.model, attempts=attempt + 1)
+                break
+            errors = "; ".join(f"{model}: {error}" for model, error in reply.errors.items())
+            record.update(error=errors or ("deadline exceeded" if reply.timed_out else "empty response"))
+            if attempt < self.retries:
+                time.sleep(min(30.0, 2 ** attempt))
+        record["seconds"] = round(time.perf_counter() - start, 3)
+        return record
+
+
+def run(paths, analyzer, output_path, checkpoint_path, workers):
+    done = load_checkpoint(checkpoint_path)
+    counts = {"ok": 0, "failed": 0, "skipped": 0}
+    start = time.perf_counter()
+    with open(output_path, "a", encoding="utf-8") as output, \
+            open(checkpoint_path, "a", encoding="utf-8") as checkpoint, \
+            ThreadPoolExecutor(max_workers=workers) as pool:
+        in_flight = {}  # future -> path
+
+        def collect(block):
+            if block:
+                finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            else:
+                finished = [future for future in in_flight if future.done()]
+            for future in finished:
+                path = in_flight.pop(future)
+                try:
+                    record = future.result()
+                except Exception as e:
+                    record = {"file": path, "error": f"{type(e).__name__}: {e}"}
+                output.write(json.dumps(record, ensure_ascii=False) + "\n")
+                output.flush()
+                if "text" in record:
+                    checkpoint.write(path + "\n")
+                    checkpoint.flush()
+                    counts["ok"] += 1
+                else:
+                    counts["failed"] += 1
+                    print(f"[BATCH] failed {path}: {record['error']}")
+                total = counts["ok"] + counts["failed"]
+                if total % 25 == 0:
+                    rate = total / (time.perf_counter() - start)
+                    print(f"[BATCH] {total} done ({counts['failed']} failed, {counts['skipped']} skipped) "
+                          f"{rate:.2f} files/s")
+
+        for path in paths:
+            if path in done:
+                counts["skipped"] += 1
+                continue
+            while len(in_flight) >= 2 * workers:
+                collect(block=True)
+            in_flight[pool.submit(analyzer.analyze, path)] = path
+            collect(block=False)
+        while in_flight:
+            collect(block=True)
+
+    counts["seconds"] = round(time.perf_counter() - start, 1)
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("inputs", nargs="+", help="directories, globs or image files")
+    parser.add_argument("--output", default="batch_results.jsonl")
+    parser.add_argument("--checkpoint", help="default: <output>.done")
+    parser.add_argument("--question", help="ask this about every image (chat prompt) instead of a one-line observation")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--rpm", type=int, default=60, help="requests per minute")
+    parser.add_argument("--tpm", type=int, default=200_000, help="estimated input+output tokens per minute")
+    parser.add_argument("--retries", type=int, default=3)
+    parser.add_argument("--max-output-tokens", type=int, default=200)
+    parser.add_argument("--max-bytes", type=int, default=250_000, help="upload budget per image")
+    parser.add_argument("--max-width", type=int, default=1600, help="scans need more pixels than screen frames")
+    parser.add_argument("--model", default="gpt-5-mini")
+    parser.add_argument("--fallback-model", default="gpt-4.1-mini")
+    parser.add_argument("--mode", default="hedged", choices=MODES)
+    parser.add_argument("--hedge-delay", type=float, default=6.0)
+    parser.add_argument("--deadline", type=float, default=60)
+    parser.add_argument("--base-url", help="OpenAI-compatible endpoint, e.g. a fake_responses_api server")
+    args = parser.parse_args()
+
+    api_key = os.getenv("OPENAI_API_KEY") or ("unused" if args.base_url else None)
+    if not api_key:
+        sys.exit("⚠️ No OpenAI API key found. Use: setx OPENAI_API_KEY \"your-key\"")
+    client = OpenAI(api_key=api_key, base_url=args.base_url, max_retries=0)  # --retries does the retrying
+    gateway = ModelGateway(client, args.model, args.fallback_model, mode=args.mode, hedge_delay=args.hedge_delay)
+    encoder = AdaptiveEncoder(max_bytes=args.max_bytes, max_width=args.max_width)
+    analyzer = BatchAnalyzer(gateway, encoder, question=args.question, max_output_tokens=args.max_output_tokens,
+                             deadline=args.deadline, retries=args.retries,
+                             requests_per_minute=args.rpm, tokens_per_minute=args.tpm)
+
+    counts = run(iter_images(args.inputs), analyzer, args.output, args.checkpoint or args.output + ".done",
+                 max(1, args.workers))
+    print(f"[BATCH] finished: {counts}")
+
+
+if __name__ == "__main__":
+    main()
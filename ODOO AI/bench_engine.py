@@ -0,0 +1,222 @@
+"""
+Offline load test of the shared engine daemon with simulated overlay clients.
+
+Starts fake_responses_api, an Engine behind EngineServer (Unix socket, or
+localhost HTTP with --tcp) and one thread per simulated seat, each with its
+own EngineClient. Until --duration runs out, every seat:
+
+    observe   sends a frame every --observe-interval seconds (jittered); frames come
+              from a few shared synthetic Odoo screens, so seats on the same screen
+              share cache entries, and --unique-rate of them are private to the seat
+    chat      with probability --chat-rate per cycle, asks a streamed question
+
+--greedy seats observe back-to-back without pausing, to show that the fair
+gate keeps the regular seats' latency in check.
+
+Reports client-side n / p50 / p95 / p99 per kind, throughput, model API
+requests vs client calls, per-seat completed calls with Jain's fairness index
+over the regular seats, fair-gate waits and engine cache stats, as one JSON document.
+
+    python bench_engine.py --clients 50 --duration 30
+    python bench_engine.py --clients 50 --greedy 5 --slots 8 --output engine.json
+"""
+import os
+import sys
+import json
+import time
+import random
+import tempfile
+import argparse
+import threading
+import contextlib
+
+from PIL import Image, ImageDraw
+
+from engine import Engine
+from engine_client import EngineClient
+from engine_daemon import EngineServer
+from fake_responses_api import FakeResponsesServer
+from tracing import percentile
+
+BENCH_TOKEN = "bench"  # --tcp: the daemon requires a token; all seats share one user
+
+QUESTIONS = (
+    "What is the total of this invoice?",
+    "Which customer is this invoice for?",
+    "What does the status of this record mean?",
+    "How do I register a payment here?",
+)
+
+
+def make_screen(seed, width=1024, height=576):
+    """Synthetic Odoo-like list view: header bar plus rows of text, varied by seed."""
+    rng = random.Random(seed)
+    img = Image.new("RGB", (width, height), (248, 249, 250))
+    draw = ImageDraw.Draw(img)
+    draw.rectangle([0, 0, width, 40], fill=(113, 75, 103))
+    draw.text((12, 12), f"Invoicing / Customer Invoices #{seed}", fill="white")
+    for row in range(16):
+        y = 60 + row * 30
+        draw.text((12, y), f"INV/2024/{rng.randint(1, 9999):04d}   Partner {rng.randint(1, 300)}   "
+                           f"{rng.randint(10, 99999)}.{rng.randint(0, 99):02d} EUR   "
+                           f"{rng.choice(['Draft', 'Posted', 'Paid'])}", fill=(33, 37, 41))
+    return img
+
+
+def mark_screen(img, marker):
+    """A private variant of a shared screen (cheap, so the load generator stays out of the measurement)."""
+    img = img.copy()
+    ImageDraw.Draw(img).text((img.width - 220, img.height - 24), marker, fill=(120, 120, 120))
+    return img
+
+
+def percentiles(values):
+    if not values:
+        return {"n": 0}
+    return {"n": len(values), "mean_ms": round(sum(values) / len(values) * 1000, 1),
+            **{f"p{p}_ms": round(percentile(values, p) * 1000, 1) for p in (50, 95, 99)}}
+
+
+def jain_index(values):
+    values = list(values)
+    total = sum(values)
+    squares = sum(value * value for value in values)
+    return round(total * total / (len(values) * squares), 3) if squares else 1.0
+
+
+class Seat(threading.Thread):
+    def __init__(self, index, address, screens, args, greedy=False):
+        super().__init__(daemon=True, name=f"seat-{index}")
+        self.client = EngineClient(address, client_id=f"{'greedy' if greedy else 'seat'}-{index}", token=BENCH_TOKEN)
+        self.screens = screens
+        self.args = args
+        self.greedy = greedy
+        self.random = random.Random(args.seed * 1000 + index)
+        self.latency = {"observe": [], "chat": [], "chat_first_delta": []}
+        self.errors = 0
+        self.index = index
+
+    def run(self):
+        args = self.args
+        stop_at = time.monotonic() + args.duration
+        time.sleep(self.random.uniform(0, 0 if self.greedy else args.observe_interval))  # staggered start
+        cycle = 0
+        while time.monotonic() < stop_at:
+            cycle += 1
+            img = self.screens[self.random.randrange(len(self.screens))]
+            if self.random.random() < args.unique_rate:
+                img = mark_screen(img, f"{self.client.client_id} {cycle}")
+            self._timed("observe", lambda: self.client.observe(img, "Odoo - Customer Invoices"))
+            if not self.greedy and self.random.random() < args.chat_rate:
+                first = []
+                start = time.perf_counter()
+
+                def on_delta(delta):
+                    if delta is not None and not first:
+                        first.append(time.perf_counter() - start)
+                self._timed("chat", lambda: self.client.chat(self.random.choice(QUESTIONS), img,
+                                                             "Odoo - Customer Invoices", on_delta=on_delta))
+                self.latency["chat_first_delta"].extend(first)
+            if not self.greedy:
+                time.sleep(self.random.uniform(0.5, 1.5) * args.observe_interval)
+
+    def _timed(self, kind, call):
+        start = time.perf_counter()
+        try:
+            call()
+        except Exception as e:
+            self.errors += 1
+            print(f"[BENCH] {self.client.client_id} {kind} failed: {e}", file=sys.stderr)
+            return
+        self.latency[kind].append(time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=20, help="regular simulated seats")
+    parser.add_argument("--greedy", type=int, default=0, help="seats that observe back-to-back")
+    parser.add_argument("--duration", type=float, default=20.0, help="seconds of load")
+    parser.add_argument("--observe-interval", type=float, default=2.0, help="mean seconds between observations")
+    parser.add_argument("--chat-rate", type=float, default=0.2, help="chat probability per observation")
+    parser.add_argument("--screens", type=int, default=5, help="shared synthetic screens")
+    parser.add_argument("--unique-rate", type=float, default=0.3, help="share of frames private to a seat")
+    parser.add_argument("--slots", type=int, default=8, help="ENGINE_MODEL_SLOTS")
+    parser.add_argument("--per-client", type=int, default=2, help="ENGINE_SLOTS_PER_CLIENT")
+    parser.add_argument("--pool", type=int, default=16, help="HTTP_MAX_CONNECTIONS")
+    parser.add_argument("--latency", type=float, default=0.4, help="fake model latency (s)")
+    parser.add_argument("--token-delay", type=float, default=0.01, help="fake delay between streamed words (s)")
+    parser.add_argument("--tcp", action="store_true", help="serve on localhost HTTP instead of a Unix socket")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="write the JSON result here (default: stdout)")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench-engine-")
+    fake = FakeResponsesServer(seed=args.seed, profiles={
+        "*": {"latency": args.latency, "token_delay": args.token_delay},
+    })
+    screens = [make_screen(args.seed + i) for i in range(args.screens)]
+    with contextlib.redirect_stdout(sys.stderr):  # engine logs; stdout is for the JSON result
+        engine = Engine("offline", {
+            "OPENAI_BASE_URL": fake.start(), "PRIMARY_MODEL": "primary", "FALLBACK_MODEL": "fallback",
+            "GATEWAY_MODE": "sequential", "CACHE_PATH": os.path.join(workdir, "observations.sqlite3"),
+            "ENGINE_MODEL_SLOTS": args.slots, "ENGINE_SLOTS_PER_CLIENT": args.per_client,
+            "HTTP_MAX_CONNECTIONS": args.pool, "HTTP_MAX_KEEPALIVE": args.pool,
+        })
+        engine.warm_up()
+        server = EngineServer(engine, "http://127.0.0.1:0" if args.tcp else f"unix:{workdir}/engine.sock",
+                              tokens={"bench": BENCH_TOKEN})
+        address = server.start()
+        seats = [Seat(i, address, screens, args) for i in range(args.clients)]
+        seats += [Seat(args.clients + i, address, screens, args, greedy=True) for i in range(args.greedy)]
+        cpu_start, wall_start = time.process_time(), time.perf_counter()
+        for seat in seats:
+            seat.start()
+        for seat in seats:
+            seat.join()
+        wall = time.perf_counter() - wall_start
+        cpu = time.process_time() - cpu_start
+        snapshot = engine.snapshot()
+        server.stop()
+        engine.close()
+        fake.stop()
+
+    regular = [seat for seat in seats if not seat.greedy]
+    greedy = [seat for seat in seats if seat.greedy]
+    calls = sum(len(seat.latency["observe"]) + len(seat.latency["chat"]) for seat in seats)
+    result = {
+        "meta": {"args": vars(args), "address": "tcp" if args.tcp else "unix"},
+        "seconds": round(wall, 2),
+        "process_cpu_seconds": round(cpu, 2),  # daemon + fake API + simulated clients
+        "client_calls": calls,
+        "calls_per_second": round(calls / wall, 1),
+        "model_requests": fake.requests,
+        "errors": sum(seat.errors for seat in seats),
+        "regular": {kind: percentiles([v for seat in regular for v in seat.latency[kind]])
+                    for kind in ("observe", "chat", "chat_first_delta")},
+        "greedy": {"observe": percentiles([v for seat in greedy for v in seat.latency["observe"]])},
+        "fairness": {
+            "jain_index_regular": jain_index(len(seat.latency["observe"]) for seat in regular) if regular else None,
+            "observes_per_regular_seat": sorted(len(seat.latency["observe"]) for seat in regular),
+            "observes_per_greedy_seat": sorted(len(seat.latency["observe"]) for seat in greedy),
+        },
+        "gate": snapshot["gate"],
+        "engine": {key: snapshot[key] for key in ("observations", "observations_cached", "observations_coalesced", "chats",
+                                                  "answers_cached", "answers_local", "busy", "sessions")},
+        "observation_cache": snapshot["observation_cache"],
+        "answer_cache": snapshot.get("answer_cache"),
+        "image_store": snapshot.get("image_store"),
+        "http_pool": snapshot["http"]["pool"] if snapshot["http"] else None,
+    }
+    print(f"[BENCH] {len(seats)} seats, {calls} calls in {wall:.1f}s -> {fake.requests} model requests; "
+          f"observe p95 {result['regular']['observe'].get('p95_ms')} ms", file=sys.stderr)
+
+    text = json.dumps(result, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Offline latency benchmark for model_gateway against fake_responses_api.
+
+The primary model is injected with slow and empty responses; every gateway mode
+runs the same workload and p50/p95/p99 are printed (use --json for machine-readable output).
+
+    python bench_gateway.py --calls 200 --concurrency 8
+"""
+import json
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+from openai import OpenAI
+
+from fake_responses_api import FakeResponsesServer
+from model_gateway import ModelGateway, MODES
+from tracing import percentile
+
+
+def run_mode(client, mode, calls, concurrency, hedge_delay, deadline):
+    gateway = ModelGateway(client, "primary", "fallback", mode=mode, hedge_delay=hedge_delay, deadline=deadline)
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        replies = list(pool.map(lambda _: gateway.call("What is on screen?", 50), range(calls)))
+    latencies = [r.latency * 1000 for r in replies]
+    return {
+        "mode": mode,
+        "calls": calls,
+        "p50_ms": round(percentile(latencies, 50), 1),
+        "p95_ms": round(percentile(latencies, 95), 1),
+        "p99_ms": round(percentile(latencies, 99), 1),
+        "empty": sum(1 for r in replies if not r.text),
+        "timeouts": sum(1 for r in replies if r.timed_out),
+        "stats": gateway.stats,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--primary-latency", type=float, default=0.20)
+    parser.add_argument("--primary-slow-rate", type=float, default=0.10)
+    parser.add_argument("--primary-slow-latency", type=float, default=2.0)
+    parser.add_argument("--primary-empty-rate", type=float, default=0.05)
+    parser.add_argument("--fallback-latency", type=float, default=0.30)
+    parser.add_argument("--hedge-delay", type=float, default=0.40)
+    parser.add_argument("--deadline", type=float, default=None)
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--json", action="store_true", help="print one JSON object per mode")
+    args = parser.parse_args()
+
+    server = FakeResponsesServer(seed=args.seed, profiles={
+        "primary": {
+            "latency": args.primary_latency,
+            "slow_rate": args.primary_slow_rate,
+            "slow_latency": args.primary_slow_latency,
+            "empty_rate": args.primary_empty_rate,
+        },
+        "fallback": {"latency": args.fallback_latency},
+    })
+    client = OpenAI(api_key="offline", base_url=server.start(), max_retries=0)
+    try:
+        for mode in MODES:
+            result = run_mode(client, mode, args.calls, args.concurrency, args.hedge_delay, args.deadline)
+            if args.json:
+                print(json.dumps(result))
+            else:
+                print(f"{mode:<11} p50={result['p50_ms']:>7.1f}ms  p95={result['p95_ms']:>7.1f}ms  "
+                      f"p99={result['p99_ms']:>7.1f}ms  empty={result['empty']}  stats={result['stats']}")
+    finally:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
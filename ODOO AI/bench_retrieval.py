@@ -0,0 +1,113 @@
+"""
+Compare knowledge-base retrieval backends on the knowledge_base/ corpus.
+
+Queries are generated from the corpus itself (known-item search): a few
+distinctive words are sampled from a chunk, and that chunk is the relevant
+answer. This measures recall@k and per-query latency for each backend, plus
+the cold-start cost of opening it. Known-item queries share vocabulary with
+their target, so they flatter lexical retrieval; use --queries-file with
+"question<TAB>chunk id" lines for real helpdesk questions.
+
+    python bench_retrieval.py --k 3 --queries 200
+    python bench_retrieval.py --backends lexical --json
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+
+import knowledge_manager
+from lexical_index import tokenize
+from tracing import percentile
+
+
+def corpus_chunks(folder_path):
+    chunks = {}
+    for filename in sorted(os.listdir(folder_path)):
+        if filename.endswith(".txt") or filename.endswith(".md"):
+            with open(os.path.join(folder_path, filename), "r", encoding="utf-8") as f:
+                for i, chunk in enumerate(knowledge_manager.chunk_text(f.read())):
+                    chunks[f"{filename}::{i}"] = chunk
+    return chunks
+
+
+def make_queries(chunks, count, words_per_query, seed):
+    rng = random.Random(seed)
+    ids = sorted(chunks)
+    queries = []
+    for _ in range(count):
+        chunk_id = rng.choice(ids)
+        words = sorted({w for w in tokenize(chunks[chunk_id]) if len(w) > 3})
+        if not words:
+            continue
+        queries.append((" ".join(rng.sample(words, min(words_per_query, len(words)))), chunk_id))
+    return queries
+
+
+def run_backend(name, folder_path, queries, k, work_dir):
+    start = time.perf_counter()
+    if name == "lexical":
+        retriever = knowledge_manager.load_lexical_index(
+            folder_path, index_path=os.path.join(work_dir, "lexical.idx"))
+    else:
+        retriever = knowledge_manager.create_retriever(
+            folder_path, backend=name, index_dir=os.path.join(work_dir, "chroma"))
+        if name == "hybrid" and not isinstance(retriever, knowledge_manager.HybridRetriever):
+            raise RuntimeError("chromadb unavailable")
+    cold_start = time.perf_counter() - start
+
+    latencies = []
+    found = 0
+    for query, relevant in queries:
+        t = time.perf_counter()
+        hits = retriever.search(query, k)
+        latencies.append((time.perf_counter() - t) * 1000)
+        found += any(hit["id"] == relevant for hit in hits)
+    return {
+        "backend": name,
+        "queries": len(queries),
+        f"recall@{k}": round(found / len(queries), 3) if queries else 0.0,
+        "p50_ms": round(percentile(latencies, 50), 3),
+        "p95_ms": round(percentile(latencies, 95), 3),
+        "cold_start_s": round(cold_start, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--folder", default=knowledge_manager.KB_FOLDER)
+    parser.add_argument("--backends", default="lexical,chroma,hybrid")
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--words", type=int, default=4, help="words sampled per generated query")
+    parser.add_argument("--queries-file", help="tab-separated 'question<TAB>relevant chunk id' lines")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    chunks = corpus_chunks(args.folder)
+    if not chunks:
+        sys.exit(f"No .txt/.md content found in {args.folder!r}; nothing to benchmark.")
+    if args.queries_file:
+        with open(args.queries_file, "r", encoding="utf-8") as f:
+            queries = [tuple(line.rstrip("\n").split("\t", 1)) for line in f if "\t" in line]
+    else:
+        queries = make_queries(chunks, args.queries, args.words, args.seed)
+
+    with tempfile.TemporaryDirectory(ignore_cleanup_errors=True) as work_dir:
+        for backend in args.backends.split(","):
+            try:
+                result = run_backend(backend.strip(), args.folder, queries, args.k, work_dir)
+            except Exception as e:
+                result = {"backend": backend, "skipped": str(e)}
+            if args.json:
+                print(json.dumps(result))
+            else:
+                print("  ".join(f"{key}={value}" for key, value in result.items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,295 @@
+"""
+Offline end-to-end benchmark of the screen pipeline, against fake_responses_api.
+
+Synthetic 1920x1080 fixtures (an Odoo-like invoice table, a code editor and a
+blank screen) go through the production engine.Engine - image store,
+observation and answer caches, resilient transport, gateway and knowledge-base
+routing - pointed at the fake server:
+
+    capture   raw BGRA buffer -> Frame -> to_image(max_width=1024)  (as capture_screen;
+              --real-capture grabs the actual screen with CaptureService instead)
+    prepare   Engine.prepare_image_for_upload                        (run by the image store per new frame)
+    base64    EncodedImage.data_url()
+    observe   Engine.observe                                         (analyze_screen)
+    chat      capture + streamed Engine.chat                         (send_chat_message);
+              chat_ttft is the time to the first streamed delta
+
+Each iteration stamps a counter into its frame: the overlay only sends frames
+that changed, so every observation and chat is about a new screen and the
+model path is measured, not cache hits. Engine counters are in the result.
+
+Every stage reports n, throughput and mean/p50/p95/p99 in ms as one JSON
+document. Fixtures and fake-server randomness are seeded, so runs are
+comparable; --compare an earlier result to see per-stage changes.
+
+    python bench_suite.py --iterations 50 --output bench.json
+    python bench_suite.py --iterations 50 --compare bench.json
+"""
+import os
+import sys
+import json
+import time
+import random
+import platform
+import argparse
+import tempfile
+import contextlib
+import subprocess
+
+import numpy as np
+import PIL
+from PIL import Image, ImageDraw
+
+from capture_service import Frame, CaptureService, central_region
+from engine import Engine
+from fake_responses_api import FakeResponsesServer
+from model_gateway import MODES
+from tracing import percentile
+
+STAGES = ("capture", "prepare", "base64", "observe", "chat", "chat_ttft")
+WINDOW_TITLE = "Odoo - Invoices"
+
+
+# ---------- Synthetic fixtures ---------- #
+def odoo_table(width, height, rng):
+    img = Image.new("RGB", (width, height), (255, 255, 255))
+    draw = ImageDraw.Draw(img)
+    draw.rectangle((0, 0, width, 46), fill=(113, 75, 103))  # Odoo top bar
+    draw.rectangle((0, 46, 220, height), fill=(245, 245, 247))  # sidebar
+    for i, item in enumerate(("Dashboard", "Customers", "Vendors", "Accounting", "Reporting", "Configuration")):
+        draw.text((20, 70 + i * 28), item, fill=(60, 60, 60))
+    headers = ("Number", "Partner", "Invoice Date", "Due Date", "Untaxed", "VAT", "Total", "Status")
+    column = (width - 260) // len(headers)
+    draw.rectangle((240, 80, width - 20, 108), fill=(238, 238, 238))
+    for c, header in enumerate(headers):
+        draw.text((250 + c * column, 88), header, fill=(30, 30, 30))
+    for r in range((height - 140) // 26):
+        y = 112 + r * 26
+        if r % 2:
+            draw.rectangle((240, y, width - 20, y + 25), fill=(250, 250, 250))
+        amount = rng.randint(100, 99999) / 100
+        row = (f"INV/2024/{r + 1:05d}", rng.choice(("Finance Matters BV", "Acme NV", "De Vries & Zn", "Jansen BV")),
+               f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}", "2025-01-31", f"{amount:,.2f}",
+               f"{amount * 0.21:,.2f}", f"{amount * 1.21:,.2f}", rng.choice(("Posted", "Draft", "Paid")))
+        for c, cell in enumerate(row):
+            draw.text((250 + c * column, y + 7), cell, fill=(40, 40, 40))
+        draw.line((240, y + 25, width - 20, y + 25), fill=(222, 222, 222))
+    return img
+
+
+def code_editor(width, height, rng):
+    img = Image.new("RGB", (width, height), (30, 30, 30))
+    draw = ImageDraw.Draw(img)
+    draw.rectangle((0, 0, 260, height), fill=(37, 37, 38))
+    palette = [(86, 156, 214), (206, 145, 120), (156, 220, 254), (220, 220, 170), (106, 153, 85), (212, 212, 212)]
+    words = ("def", "return", "self", "invoice", "amount_total", "partner_id", "for", "in", "if", "None", "tax")
+    for line in range((height - 20) // 18):
+        y = 10 + line * 18
+        draw.text((270, y), f"{line + 1:>4}", fill=(110, 110, 110))
+        x = 320 + 28 * rng.randint(0, 4)
+        for _ in range(rng.randint(0, 9)):
+            word = rng.choice(words)
+            draw.text((x, y), word, fill=rng.choice(palette))
+            x += 8 * len(word) + 8
+    return img
+
+
+def blank_screen(width, height, rng):
+    return Image.new("RGB", (width, height), (0, 120, 215))
+
+
+FIXTURES = {"odoo_table": odoo_table, "code_editor": code_editor, "blank": blank_screen}
+
+
+def make_fixture(name, width, height, seed):
+    """BGRA bytes, as mss hands them out."""
+    rgb = np.asarray(FIXTURES[name](width, height, random.Random(seed)))
+    bgra = np.empty((height, width, 4), dtype=np.uint8)
+    bgra[..., :3] = rgb[..., ::-1]
+    bgra[..., 3] = 255
+    return bgra.tobytes()
+
+
+# ---------- Stages ---------- #
+class Pipeline:
+    def __init__(self, engine, real_capture=False):
+        self.engine = engine
+        self.service = CaptureService() if real_capture else None
+
+    def capture(self, raw, size, stamp):
+        if self.service is not None:
+            return self.service.grab(central_region).to_image(max_width=1024)
+        width, height = size
+        buffer = bytearray(raw)  # mss allocates a fresh buffer per grab
+        pixels = np.frombuffer(buffer, dtype=np.uint8).reshape(height, width, 4)
+        pixels[:32, :32, 0], pixels[:32, :32, 1] = stamp % 256, stamp // 256 % 256  # a new screen per iteration
+        return Frame(pixels, 0, 0, time.time(), 0).to_image(max_width=1024)
+
+    def observe(self, img):
+        return self.engine.observe(img, WINDOW_TITLE)
+
+    def chat(self, raw, size, stamp, timings):
+        start = time.perf_counter()
+        first = []
+
+        def on_delta(delta):
+            if delta is not None and not first:
+                first.append(time.perf_counter())
+        result = self.engine.chat("Which invoices are still in draft?", self.capture(raw, size, stamp),
+                                  WINDOW_TITLE, on_delta=on_delta)
+        if first:
+            timings["chat_ttft"].append((first[0] - start) * 1000)
+        timings["chat"].append((time.perf_counter() - start) * 1000)
+        return result
+
+
+def timed(timings, stage, func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    timings[stage].append((time.perf_counter() - start) * 1000)
+    return result
+
+
+def summarize(timings, wall):
+    stages = {}
+    for stage in STAGES:
+        values = timings[stage]
+        if not values:
+            continue
+        stages[stage] = {
+            "n": len(values),
+            "per_second": round(len(values) / (sum(values) / 1000), 2) if sum(values) else 0.0,
+            "mean_ms": round(sum(values) / len(values), 3),
+            "p50_ms": round(percentile(values, 50), 3),
+            "p95_ms": round(percentile(values, 95), 3),
+            "p99_ms": round(percentile(values, 99), 3),
+        }
+    return {"stages": stages, "wall_s": round(wall, 3)}
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              timeout=5).stdout.strip() or None
+    except Exception:
+        return None
+
+
+def compare(result, baseline, tolerance, min_delta_ms=2.0):
+    """
+    Print per-stage p50/p95 changes against a previous result; returns the regressed
+    stages (p95 slower by more than `tolerance` and by at least `min_delta_ms`).
+    """
+    regressions = []
+    for fixture, current in result["fixtures"].items():
+        previous = baseline.get("fixtures", {}).get(fixture)
+        if not previous:
+            continue
+        for stage, stats in current["stages"].items():
+            old = previous["stages"].get(stage)
+            if not old:
+                continue
+            changes = []
+            for key in ("p50_ms", "p95_ms"):
+                delta = (stats[key] - old[key]) / old[key] if old[key] else 0.0
+                changes.append(f"{key} {old[key]:.1f} -> {stats[key]:.1f} ({delta:+.0%})")
+                if key == "p95_ms" and delta > tolerance and stats[key] - old[key] >= min_delta_ms:
+                    regressions.append(f"{fixture}/{stage}")
+            flag = "  REGRESSION" if f"{fixture}/{stage}" in regressions else ""
+            print(f"{fixture:<12} {stage:<10} " + "  ".join(changes) + flag, file=sys.stderr)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=30, help="iterations per fixture")
+    parser.add_argument("--fixtures", default=",".join(FIXTURES))
+    parser.add_argument("--width", type=int, default=1920)
+    parser.add_argument("--height", type=int, default=1080)
+    parser.add_argument("--latency", type=float, default=0.15, help="fake primary model latency (s)")
+    parser.add_argument("--token-delay", type=float, default=0.01, help="fake delay between streamed words (s)")
+    parser.add_argument("--empty-rate", type=float, default=0.05)
+    parser.add_argument("--error-rate", type=float, default=0.02)
+    parser.add_argument("--fallback-latency", type=float, default=0.25)
+    parser.add_argument("--mode", default="hedged", choices=MODES)
+    parser.add_argument("--hedge-delay", type=float, default=0.5)
+    parser.add_argument("--max-bytes", type=int, default=120_000)
+    parser.add_argument("--real-capture", action="store_true", help="grab the real screen instead of fixtures")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="write the JSON result here (default: stdout)")
+    parser.add_argument("--compare", help="earlier JSON result to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="p95 slowdown that counts as a regression")
+    args = parser.parse_args()
+
+    server = FakeResponsesServer(seed=args.seed, profiles={
+        "primary": {"latency": args.latency, "token_delay": args.token_delay,
+                    "empty_rate": args.empty_rate, "error_rate": args.error_rate},
+        "fallback": {"latency": args.fallback_latency, "token_delay": args.token_delay},
+    })
+    workdir = tempfile.mkdtemp(prefix="bench-suite-")
+    with contextlib.redirect_stdout(sys.stderr):  # engine logs; stdout is for the JSON result
+        engine = Engine("offline", {
+            "OPENAI_BASE_URL": server.start(), "PRIMARY_MODEL": "primary", "FALLBACK_MODEL": "fallback",
+            "GATEWAY_MODE": args.mode, "HEDGE_DELAY": args.hedge_delay, "UPLOAD_MAX_BYTES": args.max_bytes,
+            "CACHE_PATH": os.path.join(workdir, "observations.sqlite3"),
+        })
+        engine.warm_up()
+    pipeline = Pipeline(engine, real_capture=args.real_capture)
+    size = (args.width, args.height)
+
+    result = {
+        "meta": {
+            "revision": git_revision(),
+            "python": platform.python_version(),
+            "pillow": PIL.__version__,
+            "numpy": np.__version__,
+            "machine": platform.machine(),
+            "args": vars(args),
+        },
+        "fixtures": {},
+    }
+    stamps = iter(range(1, 1 << 62))
+    try:
+        for index, name in enumerate(args.fixtures.split(",")):
+            raw = make_fixture(name, args.width, args.height, args.seed + index)
+            timings = {stage: [] for stage in STAGES}
+            failures = 0
+            start = time.perf_counter()
+            for _ in range(args.iterations):
+                with contextlib.redirect_stdout(sys.stderr):
+                    img = timed(timings, "capture", pipeline.capture, raw, size, next(stamps))
+                    encoded = timed(timings, "prepare", engine.prepare_image_for_upload, img)
+                    timed(timings, "base64", encoded.data_url)
+                    failures += not timed(timings, "observe", pipeline.observe, img)["text"]
+                    reply = pipeline.chat(raw, size, next(stamps), timings)["reply"]
+                    failures += not reply or reply.startswith("⚠️")
+            summary = summarize(timings, time.perf_counter() - start)
+            summary["upload"] = {"bytes": len(encoded.data), "format": encoded.format, "quality": encoded.quality,
+                                 "size": list(encoded.size), "detail": encoded.detail}
+            summary["failed_calls"] = failures
+            result["fixtures"][name] = summary
+            print(f"[BENCH] {name}: " + "  ".join(
+                f"{stage} p50={stats['p50_ms']:.1f}ms" for stage, stats in summary["stages"].items()), file=sys.stderr)
+        result["gateway"] = dict(engine.get_gateway().stats)
+        result["engine"] = engine.snapshot()
+    finally:
+        with contextlib.redirect_stdout(sys.stderr):
+            engine.close()
+        server.stop()
+
+    text = json.dumps(result, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            regressions = compare(result, json.load(f), args.tolerance)
+        if regressions:
+            sys.exit(f"p95 regressions over {args.tolerance:.0%}: {', '.join(regressions)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,344 @@
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from capture_service import Frame, central_region
+
+CAPTURE_MODES = ("central", "window", "changed", "pinned", "monitors", "composite")
+
+
+# ---------- Window backends ---------- #
+class WindowBackend:
+    """
+    Platform access to the foreground window.
+    foreground_window() returns {"title": str, "rect": {left, top, width, height} or None, "pid": int or None}
+    """
+
+    def foreground_window(self):
+        return {"title": "Unknown window", "rect": None, "pid": None}
+
+
+class Win32WindowBackend(WindowBackend):
+    def __init__(self):
+        import ctypes
+        import win32gui
+        import win32process
+        self._ctypes = ctypes
+        self._win32gui = win32gui
+        self._win32process = win32process
+
+    def foreground_window(self):
+        gui = self._win32gui
+        hwnd = gui.GetForegroundWindow()
+        if not hwnd:
+            return WindowBackend.foreground_window(self)
+        _, pid = self._win32process.GetWindowThreadProcessId(hwnd)
+        rect = None
+        if not gui.IsIconic(hwnd):
+            left, top, right, bottom = self._frame_bounds(hwnd)
+            rect = {"left": left, "top": top, "width": right - left, "height": bottom - top}
+        return {"title": gui.GetWindowText(hwnd), "rect": rect, "pid": pid}
+
+    def _frame_bounds(self, hwnd):
+        """Visible frame (DWM extended bounds); GetWindowRect includes the invisible resize border."""
+        ctypes = self._ctypes
+        try:
+            from ctypes import wintypes
+            rect = wintypes.RECT()
+            DWMWA_EXTENDED_FRAME_BOUNDS = 9
+            if ctypes.windll.dwmapi.DwmGetWindowAttribute(
+                    wintypes.HWND(hwnd), DWMWA_EXTENDED_FRAME_BOUNDS, ctypes.byref(rect), ctypes.sizeof(rect)) == 0:
+                return rect.left, rect.top, rect.right, rect.bottom
+        except Exception:
+            pass
+        return self._win32gui.GetWindowRect(hwnd)
+
+
+class X11WindowBackend(WindowBackend):
+    """EWMH (_NET_ACTIVE_WINDOW) lookup through python-xlib."""
+
+    def __init__(self):
+        from Xlib import X, display
+        self._X = X
+        self._display = display.Display()
+        self._root = self._display.screen().root
+        self._atoms = {name: self._display.intern_atom(name) for name in
+                       ("_NET_ACTIVE_WINDOW", "_NET_WM_NAME", "_NET_WM_PID", "UTF8_STRING")}
+
+    def foreground_window(self):
+        X = self._X
+        active = self._root.get_full_property(self._atoms["_NET_ACTIVE_WINDOW"], X.AnyPropertyType)
+        if not active or not active.value or not active.value[0]:
+            return WindowBackend.foreground_window(self)
+        window = self._display.create_resource_object("window", active.value[0])
+        try:
+            name = window.get_full_property(self._atoms["_NET_WM_NAME"], self._atoms["UTF8_STRING"])
+            title = name.value.decode("utf-8", "replace") if name else (window.get_wm_name() or "")
+            pid = window.get_full_property(self._atoms["_NET_WM_PID"], X.AnyPropertyType)
+            geometry = window.get_geometry()
+            origin = window.translate_coords(self._root, 0, 0)
+            rect = {"left": -origin.x, "top": -origin.y, "width": geometry.width, "height": geometry.height}
+        except Exception:
+            # The window closed between the lookup and the queries
+            return WindowBackend.foreground_window(self)
+        return {"title": title, "rect": rect, "pid": pid.value[0] if pid else None}
+
+
+def create_window_backend():
+    """Win32 on Windows, X11 elsewhere when python-xlib and a display are available, else a no-op backend."""
+    try:
+        if sys.platform == "win32":
+            return Win32WindowBackend()
+        if os.environ.get("DISPLAY"):
+            return X11WindowBackend()
+    except Exception as e:
+        print(f"[CAPTURE] window backend unavailable ({e}); window mode falls back to the central crop")
+    return WindowBackend()
+
+
+# ---------- Region of interest ---------- #
+def clip_region(region, bounds):
+    """Intersection of two {left, top, width, height} rects, or None if it is empty."""
+    left = max(region["left"], bounds["left"])
+    top = max(region["top"], bounds["top"])
+    right = min(region["left"] + region["width"], bounds["left"] + bounds["width"])
+    bottom = min(region["top"] + region["height"], bounds["top"] + bounds["height"])
+    if right - left < 2 or bottom - top < 2:
+        return None
+    return {"left": left, "top": top, "width": right - left, "height": bottom - top}
+
+
+def changed_bbox(previous, current, stride=4):
+    """
+    Bounding box (left, top, right, bottom) of pixels that differ between two
+    equally sized BGRA arrays, sampled every `stride` pixels; None if nothing changed.
+    """
+    if previous is None or previous.shape != current.shape:
+        return None
+    diff = np.any(previous[::stride, ::stride, :3] != current[::stride, ::stride, :3], axis=2)
+    rows = np.flatnonzero(diff.any(axis=1))
+    if not rows.size:
+        return None
+    cols = np.flatnonzero(diff.any(axis=0))
+    return cols[0] * stride, rows[0] * stride, (cols[-1] + 1) * stride, (rows[-1] + 1) * stride
+
+
+class RegionCapture:
+    """
+    Grabs only the part of the screen that matters, per `mode`:
+      "central" - middle 50% x 50% of the monitor (the original behavior)
+      "window"  - the foreground window's rectangle; our own overlay is skipped,
+                  so while the user types in the chat box the last other window is used
+      "changed" - bounding box of pixels that changed since the previous grab
+                  (plus `margin`, at least `min_size`); the whole monitor is grabbed and
+                  cropped as a view, so nothing extra is copied
+      "pinned"  - a user-pinned rectangle (see pin())
+      "monitors"  - only the focused window's monitor is grabbed; without a known
+                    focused window every monitor is grabbed in parallel and the
+                    selection moves only on a substantial change (see MultiMonitorCapture)
+      "composite" - one thumbnail of all monitors laid out like the desktop; only
+                    changed monitors are re-rendered
+    The first four modes fall back to the central crop when their region is unavailable.
+    """
+
+    def __init__(self, service, mode="window", monitor_index=1, backend=None, pinned=None,
+                 margin=24, min_size=(480, 270)):
+        if mode not in CAPTURE_MODES:
+            raise ValueError(f"unknown capture mode {mode!r}; expected one of {CAPTURE_MODES}")
+        self.service = service
+        self.mode = mode
+        self.monitor_index = monitor_index
+        self.backend = backend or create_window_backend()
+        self.pinned = pinned
+        self.margin = margin
+        self.min_size = min_size
+        self._last_window = None
+        self._previous = None
+        self._last_bbox = None
+        self._multi = None
+
+    def pin(self, region):
+        """Follow `region` ({left, top, width, height}, screen coordinates) from now on."""
+        self.pinned = dict(region)
+        self.mode = "pinned"
+
+    def unpin(self, mode="window"):
+        self.pinned = None
+        self.mode = mode
+
+    def foreground_window(self):
+        """Foreground window, ignoring this process's own windows (the overlay)."""
+        try:
+            window = self.backend.foreground_window()
+        except Exception:
+            window = WindowBackend.foreground_window(self.backend)
+        if window["pid"] is not None and window["pid"] == os.getpid():
+            return self._last_window or window
+        if window["rect"] is not None:
+            self._last_window = window
+        return window
+
+    def window_title(self):
+        return self.foreground_window()["title"]
+
+    def capture(self):
+        """Grab the current region of interest; returns a capture_service.Frame."""
+        if self.mode == "changed":
+            return self._capture_changed()
+        if self.mode in ("monitors", "composite"):
+            if self._multi is None:
+                self._multi = MultiMonitorCapture(self.service)
+            if self.mode == "composite":
+                return self._multi.composite()
+            return self._multi.capture(self.foreground_window()["rect"])
+
+        monitor = self.service.monitors[self.monitor_index]
+        region = None
+        if self.mode == "window":
+            rect = self.foreground_window()["rect"]
+            region = clip_region(rect, self.service.monitors[0]) if rect else None
+        elif self.mode == "pinned" and self.pinned:
+            region = clip_region(self.pinned, self.service.monitors[0])
+        return self.service.grab(region or central_region(monitor), self.monitor_index)
+
+    def close(self):
+        if self._multi is not None:
+            self._multi.close()
+
+    def _capture_changed(self):
+        frame = self.service.grab(None, self.monitor_index)
+        bbox = changed_bbox(self._previous, frame.pixels)
+        self._previous = frame.pixels
+        if bbox is None:
+            bbox = self._last_bbox
+        if bbox is None:
+            region = central_region({"left": 0, "top": 0, "width": frame.size[0], "height": frame.size[1]})
+            return frame.crop(region["left"], region["top"], region["width"], region["height"])
+        self._last_bbox = bbox
+
+        width, height = frame.size
+        left, right = _span(bbox[0], bbox[2], self.margin, self.min_size[0], width)
+        top, bottom = _span(bbox[1], bbox[3], self.margin, self.min_size[1], height)
+        return frame.crop(left, top, right - left, bottom - top)
+
+
+def _span(lo, hi, margin, minimum, limit):
+    """Pad [lo, hi) by margin and grow it around its center to at least `minimum`, within [0, limit)."""
+    size = min(limit, max(hi - lo + 2 * margin, minimum))
+    lo = min(max(0, (lo + hi - size) // 2), limit - size)
+    return lo, lo + size
+
+
+# ---------- Multiple monitors ---------- #
+def monitor_at(monitors, rect):
+    """Index (into mss monitors, 1-based) of the monitor containing the center of `rect`, or None."""
+    if not rect:
+        return None
+    x = rect["left"] + rect["width"] // 2
+    y = rect["top"] + rect["height"] // 2
+    for index, monitor in enumerate(monitors[1:], start=1):
+        if monitor["left"] <= x < monitor["left"] + monitor["width"] and \
+                monitor["top"] <= y < monitor["top"] + monitor["height"]:
+            return index
+    return None
+
+
+class MultiMonitorCapture:
+    """
+    Grabs physical monitors (in parallel, one mss handle per pool thread, when
+    several are needed) and tracks changes per monitor on a strided sample of the
+    raw pixels, so a cycle only converts/renders the monitors that changed.
+    `switch_fraction` is the share of a monitor's samples that must change before
+    the selection moves to it.
+    """
+
+    def __init__(self, service, stride=8, thumbnail_width=1024, switch_fraction=0.02):
+        self.service = service
+        self.stride = stride
+        self.thumbnail_width = thumbnail_width
+        self.switch_fraction = switch_fraction
+        self.monitors = service.monitors
+        self._pool = ThreadPoolExecutor(max_workers=max(1, len(self.monitors) - 1), thread_name_prefix="capture")
+        self._samples = {}  # monitor index -> strided RGB sample of its last frame
+        self._frames = {}  # monitor index -> last Frame
+        self._tiles = {}  # monitor index -> BGRA thumbnail tile
+        self._selected = None
+        self.stats = {"cycles": 0, "grabbed": 0, "changed": 0, "tiles_rendered": 0}
+
+    def grab_all(self):
+        """Grab every monitor in parallel; returns {index: changed fraction} for monitors that changed."""
+        return self.grab(range(1, len(self.monitors)))
+
+    def grab(self, indices):
+        """Grab the monitors in `indices`; returns {index: changed fraction of its samples} for those that changed."""
+        indices = list(indices)
+        if len(indices) == 1:
+            frames = [self.service.grab(None, indices[0])]
+        else:
+            frames = self._pool.map(lambda index: self.service.grab(None, index), indices)
+        changed = {}
+        for index, frame in zip(indices, frames):
+            sample = frame.pixels[::self.stride, ::self.stride, :3]
+            previous = self._samples.get(index)
+            if previous is None or previous.shape != sample.shape:
+                changed[index] = 1.0
+            else:
+                count = int(np.count_nonzero(np.any(previous != sample, axis=2)))
+                if count:
+                    changed[index] = count / (sample.shape[0] * sample.shape[1])
+            self._samples[index] = sample
+            self._frames[index] = frame
+        self.stats["cycles"] += 1
+        self.stats["grabbed"] += len(indices)
+        self.stats["changed"] += len(changed)
+        return changed
+
+    def capture(self, focused_rect=None):
+        """
+        The frame worth sending. With a known focused window only its monitor is
+        grabbed. Otherwise every monitor is, and the selection moves to the busiest
+        one only if at least `switch_fraction` of it changed, so an incidental change
+        elsewhere (a clock ticking) does not take over.
+        """
+        focused = monitor_at(self.monitors, focused_rect)
+        if focused is not None:
+            self.grab([focused])
+            self._selected = focused
+            return self._frames[focused]
+        changed = self.grab_all()
+        busiest = max(changed, key=changed.get, default=None)
+        if self._selected is None:
+            self._selected = busiest or 1
+        elif busiest not in (None, self._selected) and changed[busiest] >= self.switch_fraction:
+            self._selected = busiest
+        return self._frames[self._selected]
+
+    def composite(self):
+        """All monitors scaled into one thumbnail_width-wide frame, placed as on the desktop."""
+        changed = self.grab_all()
+        desktop = self.monitors[0]
+        scale = self.thumbnail_width / desktop["width"]
+        canvas = np.zeros((max(1, int(desktop["height"] * scale)), self.thumbnail_width, 4), dtype=np.uint8)
+        for index, frame in self._frames.items():
+            monitor = self.monitors[index]
+            left = int((monitor["left"] - desktop["left"]) * scale)
+            top = int((monitor["top"] - desktop["top"]) * scale)
+            tile = self._tiles.get(index)
+            if tile is None or index in changed:
+                width = max(1, min(int(monitor["width"] * scale), canvas.shape[1] - left))
+                rgb = np.asarray(frame.to_image(max_width=width).resize(
+                    (width, max(1, int(monitor["height"] * scale)))))
+                tile = np.empty(rgb.shape[:2] + (4,), dtype=np.uint8)
+                tile[..., :3] = rgb[..., ::-1]
+                tile[..., 3] = 255
+                self._tiles[index] = tile
+                self.stats["tiles_rendered"] += 1
+            height = min(tile.shape[0], canvas.shape[0] - top)
+            canvas[top:top + height, left:left + tile.shape[1]] = tile[:height]
+        latest = max(self._frames.values(), key=lambda frame: frame.seq)
+        return Frame(canvas, desktop["left"], desktop["top"], latest.timestamp, latest.seq)
+
+    def close(self):
+        self._pool.shutdown(wait=False)
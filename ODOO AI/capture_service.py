@@ -0,0 +1,136 @@
+import time
+import threading
+from collections import deque
+
+import mss
+import numpy as np
+from PIL import Image
+
+
+def central_region(monitor):
+    """Middle 50% x 50% of a monitor (the historical capture_screen crop)."""
+    return {
+        "top": monitor["top"] + monitor["height"] // 4,
+        "left": monitor["left"] + monitor["width"] // 4,
+        "width": monitor["width"] // 2,
+        "height": monitor["height"] // 2
+    }
+
+
+class Frame:
+    """
+    One captured frame.
+    `pixels` is a (height, width, 4) uint8 BGRA NumPy view over the grabber's raw
+    buffer - no copy is made until an image is actually needed. `monitor` is the
+    mss monitor index it was grabbed from (None for composites).
+    """
+
+    __slots__ = ("pixels", "left", "top", "timestamp", "seq", "monitor")
+
+    def __init__(self, pixels, left, top, timestamp, seq, monitor=None):
+        self.pixels = pixels
+        self.left = left
+        self.top = top
+        self.timestamp = timestamp
+        self.seq = seq
+        self.monitor = monitor
+
+    @property
+    def size(self):
+        return self.pixels.shape[1], self.pixels.shape[0]
+
+    def crop(self, left, top, width, height):
+        """View of a sub-rectangle (coordinates relative to this frame); still no copy."""
+        return Frame(self.pixels[top:top + height, left:left + width], self.left + left, self.top + top,
+                     self.timestamp, self.seq, self.monitor)
+
+    def to_image(self, max_width=None):
+        """
+        RGB PIL image of the frame, optionally downscaled to <= max_width.
+        BGRA -> RGB happens inside PIL's decoder (one pass), and downscaling uses
+        Image.reduce (integer box filter) before a small final resize.
+        """
+        pixels = self.pixels if self.pixels.flags["C_CONTIGUOUS"] else np.ascontiguousarray(self.pixels)
+        width, height = self.size
+        img = Image.frombuffer("RGB", (width, height), pixels, "raw", "BGRX", 0, 1)
+        if max_width and width > max_width:
+            factor = width // max_width
+            if factor >= 2:
+                img = img.reduce(factor)
+            if img.width > max_width:
+                img = img.resize((max_width, int(img.height * max_width / img.width)), Image.BILINEAR)
+        return img
+
+
+class CaptureService:
+    """
+    Long-lived screen grabber.
+    - One mss handle per capturing thread, created once and reused (mss handles
+      are not shareable across threads)
+    - A ring buffer of the last `ring_size` frames with timestamps
+    """
+
+    def __init__(self, ring_size=8):
+        self.ring = deque(maxlen=ring_size)
+        self.stats = {"grabs": 0, "grab_ms_total": 0.0}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._handles = []
+        self._seq = 0
+
+    def _grabber(self):
+        sct = getattr(self._local, "sct", None)
+        if sct is None:
+            sct = mss.mss()
+            self._local.sct = sct
+            with self._lock:
+                self._handles.append(sct)
+        return sct
+
+    @property
+    def monitors(self):
+        """mss monitor list: [0] is the virtual desktop, [1:] are the physical monitors."""
+        return self._grabber().monitors
+
+    def grab(self, region=None, monitor_index=1) -> Frame:
+        """
+        Grab `region` ({left, top, width, height}), a callable(monitor) -> region,
+        or the whole monitor when region is None.
+        """
+        start = time.perf_counter()
+        sct = self._grabber()
+        monitor = sct.monitors[monitor_index]
+        if callable(region):
+            region = region(monitor)
+        shot = sct.grab(region or monitor)
+        width, height = shot.size
+        pixels = np.frombuffer(shot.raw, dtype=np.uint8).reshape(height, width, 4)
+        with self._lock:
+            self._seq += 1
+            frame = Frame(pixels, shot.left, shot.top, time.time(), self._seq, monitor_index)
+            self.ring.append(frame)
+            self.stats["grabs"] += 1
+            self.stats["grab_ms_total"] += (time.perf_counter() - start) * 1000
+        return frame
+
+    def latest(self):
+        with self._lock:
+            return self.ring[-1] if self.ring else None
+
+    def recent(self, seconds=None):
+        """Frames in the ring buffer, oldest first (only the last `seconds` if given)."""
+        with self._lock:
+            frames = list(self.ring)
+        if seconds is None:
+            return frames
+        cutoff = time.time() - seconds
+        return [f for f in frames if f.timestamp >= cutoff]
+
+    def close(self):
+        with self._lock:
+            handles, self._handles = self._handles, []
+        for sct in handles:
+            try:
+                sct.close()
+            except Exception:
+                pass
@@ -0,0 +1,108 @@
+import time
+import itertools
+import threading
+
+from model_gateway import CancelToken
+
+
+class ChatQueue:
+    """
+    Latest-wins queue for chat questions, served by one worker thread.
+
+    - A new question supersedes a question that is still waiting, and cancels the
+      one in flight (its CancelToken is cancelled, so the model call is abandoned)
+    - Every question gets a request ID; `is_current(request_id)` tells the UI
+      whether a result still belongs to the newest question, so stale replies
+      can be discarded instead of overwriting a newer answer
+    - `stats()` exposes queue depth and wait times (submit -> start of work)
+
+    handler(request_id, text, cancel_token) -> reply runs on the worker thread;
+    deliver(request_id, reply) is called afterwards (also on the worker thread)
+    unless the request was cancelled.
+    """
+
+    def __init__(self, handler, deliver, on_submit=None):
+        self.handler = handler
+        self.deliver = deliver
+        self.on_submit = on_submit  # e.g. drop queued background observations
+        self._ids = itertools.count(1)
+        self._cond = threading.Condition()
+        self._pending = None  # (request_id, text, submitted_at)
+        self._in_flight = None  # (request_id, CancelToken)
+        self._latest_id = 0
+        self._stopped = False
+        self._waits = []
+        self._counts = {"submitted": 0, "completed": 0, "superseded": 0, "cancelled": 0}
+        self._thread = threading.Thread(target=self._loop, name="chat-queue", daemon=True)
+        self._thread.start()
+
+    def submit(self, text) -> int:
+        with self._cond:
+            request_id = next(self._ids)
+            self._latest_id = request_id
+            self._counts["submitted"] += 1
+            if self._pending is not None:
+                self._counts["superseded"] += 1
+            self._pending = (request_id, text, time.monotonic())
+            if self._in_flight is not None:
+                self._in_flight[1].cancel()
+            self._cond.notify_all()
+        if self.on_submit:
+            self.on_submit()
+        return request_id
+
+    def is_current(self, request_id) -> bool:
+        with self._cond:
+            return request_id == self._latest_id
+
+    @property
+    def busy(self) -> bool:
+        with self._cond:
+            return self._pending is not None or self._in_flight is not None
+
+    def stats(self) -> dict:
+        with self._cond:
+            waits = self._waits
+            return dict(
+                self._counts,
+                depth=(self._pending is not None) + (self._in_flight is not None),
+                last_wait_ms=round(waits[-1] * 1000, 1) if waits else 0.0,
+                avg_wait_ms=round(sum(waits) / len(waits) * 1000, 1) if waits else 0.0,
+                max_wait_ms=round(max(waits) * 1000, 1) if waits else 0.0,
+            )
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            if self._in_flight is not None:
+                self._in_flight[1].cancel()
+            self._cond.notify_all()
+
+    def _loop(self):
+        while True:
+            with self._cond:
+                while self._pending is None and not self._stopped:
+                    self._cond.wait()
+                if self._stopped:
+                    return
+                request_id, text, submitted_at = self._pending
+                self._pending = None
+                token = CancelToken()
+                self._in_flight = (request_id, token)
+                self._waits.append(time.monotonic() - submitted_at)
+                del self._waits[:-100]  # rolling window
+
+            try:
+                reply = self.handler(request_id, text, token)
+            except Exception as e:
+                reply = f"⚠️ {e}"
+                print(f"Exception in chat request {request_id}: {e}")
+
+            with self._cond:
+                self._in_flight = None
+                if token.cancelled:
+                    self._counts["cancelled"] += 1
+                else:
+                    self._counts["completed"] += 1
+            if not token.cancelled:
+                self.deliver(request_id, reply)
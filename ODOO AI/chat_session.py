@@ -0,0 +1,131 @@
+import time
+import threading
+
+from screen_change import frame_fingerprint, changed_fraction
+
+
+def estimate_tokens(text):
+    """Rough token count (~4 characters per token)."""
+    return len(text) // 4 + 1
+
+
+class ChatSession:
+    """
+    Multi-turn chat chained on the server with previous_response_id.
+
+    - Follow-up turns send only the new question, plus a screenshot when the
+      screen changed by more than `screen_change` (fraction of fingerprint cells)
+      since the last screenshot sent in this chain
+    - The chain is restarted when its billed input passes `context_budget` tokens,
+      after `idle_reset` seconds without a turn, or after an error; the new chain
+      opens with a rolling summary of earlier turns that fits in `summary_budget`
+    - The summary is built locally from the last turns (no extra model call)
+
+    Usage (one chat worker thread):
+        plan = session.plan(img)
+        ... send with plan["previous_response_id"], attach the image if plan["attach_image"]
+        session.record(plan, question, reply)
+    """
+
+    def __init__(self, context_budget=6000, summary_budget=400, screen_change=0.02, idle_reset=600,
+                 max_turns=20):
+        self.context_budget = context_budget
+        self.summary_budget = summary_budget
+        self.screen_change = screen_change
+        self.idle_reset = idle_reset
+        self.turns = []  # [(question, answer)], oldest first
+        self.max_turns = max_turns
+        self.previous_response_id = None
+        self.chain_tokens = 0
+        self.last_fingerprint = None
+        self.last_turn_at = 0.0
+        self.stats = {"turns": 0, "chained": 0, "images_sent": 0, "images_skipped": 0, "compactions": 0}
+        self._lock = threading.Lock()
+
+    def plan(self, img):
+        """Decide how to send the next turn for the current screen image."""
+        fingerprint = frame_fingerprint(img)
+        with self._lock:
+            fresh = self.previous_response_id is None
+            if not fresh and (self.chain_tokens > self.context_budget
+                              or time.time() - self.last_turn_at > self.idle_reset):
+                fresh = True
+                self.stats["compactions"] += 1
+            attach = fresh or self.last_fingerprint is None \
+                or changed_fraction(self.last_fingerprint, fingerprint) > self.screen_change
+            return {
+                "previous_response_id": None if fresh else self.previous_response_id,
+                "attach_image": attach,
+                "summary": self._summary() if fresh else "",
+                "fingerprint": fingerprint,
+            }
+
+    def system_prompt(self, base_prompt, plan):
+        """System prompt for a fresh chain: the base prompt plus the rolling summary, if any."""
+        if not plan["summary"]:
+            return base_prompt
+        return f"{base_prompt}\n\nEarlier in this conversation (summary):\n{plan['summary']}"
+
+    def record(self, plan, question, reply):
+        """Store a finished turn; `reply` is a model_gateway.ModelReply."""
+        with self._lock:
+            if not reply.text or not reply.response_id:
+                self.previous_response_id = None  # start over next time rather than chain onto a gap
+                return
+            if plan["previous_response_id"] is None:
+                self.chain_tokens = 0
+                self.last_fingerprint = None
+            usage = reply.usage
+            if usage.get("input_tokens"):
+                # The server bills the whole chain as input on every turn
+                self.chain_tokens = usage["input_tokens"] + usage.get("output_tokens", 0)
+            else:
+                self.chain_tokens += estimate_tokens(question) + estimate_tokens(reply.text) \
+                    + (765 if plan["attach_image"] else 0)
+            self.previous_response_id = reply.response_id
+            if plan["attach_image"]:
+                self.last_fingerprint = plan["fingerprint"]
+                self.stats["images_sent"] += 1
+            else:
+                self.stats["images_skipped"] += 1
+            self.stats["turns"] += 1
+            self.stats["chained"] += plan["previous_response_id"] is not None
+            self.turns.append((question, reply.text))
+            del self.turns[:-self.max_turns]
+            self.last_turn_at = time.time()
+
+    def record_local(self, question, answer):
+        """A turn answered without the model (e.g. from the cache): kept for the summary only."""
+        with self._lock:
+            self.turns.append((question, answer))
+            del self.turns[:-self.max_turns]
+
+    def break_chain(self):
+        """Forget the server-side chain (e.g. the previous response expired); turns stay for the summary."""
+        with self._lock:
+            self.previous_response_id = None
+
+    def reset(self):
+        with self._lock:
+            self.previous_response_id = None
+            self.turns = []
+            self.chain_tokens = 0
+            self.last_fingerprint = None
+
+    def _summary(self):
+        """Most recent turns that fit in summary_budget tokens, oldest first; long turns are clipped."""
+        lines = []
+        budget = self.summary_budget
+        for question, answer in reversed(self.turns):
+            line = f"- User: {_clip(question, 200)}\n  Assistant: {_clip(answer, 300)}"
+            cost = estimate_tokens(line)
+            if cost > budget:
+                break
+            lines.append(line)
+            budget -= cost
+        return "\n".join(reversed(lines))
+
+
+def _clip(text, limit):
+    text = " ".join(text.split())
+    return text if len(text) <= limit else text[:limit - 1] + "…"
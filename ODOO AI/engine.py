@@ -0,0 +1,638 @@
+"""
+Capture-independent engine behind the overlay: prompt building, the model
+gateway, the observation/answer caches and knowledge-base routing.
+
+It needs no screen, window system or win32api; callers pass in the frame and
+the window title. ODOO_AI.py runs one in-process, or talks to a shared one in
+engine_daemon.py through engine_client.EngineClient (same methods).
+
+    engine = Engine(api_key, {"PRIMARY_MODEL": "gpt-5-mini"})
+    result = engine.observe(img, window_title)                  # {"text", "latency", "ok", "tokens", ...}
+    result = engine.chat(question, img, window_title, on_delta=print, cancel=token)   # {"reply", "label", ...}
+
+observe() and chat() take a `client_id`: each client gets its own chat
+session, and model calls are admitted through a FairGate so one busy client
+cannot starve the others. The HTTP pool, caches and knowledge index are
+shared, and concurrent observations of the same frame share one model call.
+"""
+import os
+import time
+import threading
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+
+from model_gateway import ModelGateway
+from observation_cache import ObservationCache, make_cache_key
+from prompts import observation_prompt, chat_system_prompt, knowledge_system_prompt, image_request, text_request
+from chat_session import ChatSession
+from tracing import Tracer
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# Names and defaults match the CONFIG block in ODOO_AI.py, which passes its own values
+DEFAULT_SETTINGS = {
+    "ASSISTANT_NAME": "ODOO AI",
+    "DEBUG_MODEL_IO": False,
+    "PRIMARY_MODEL": "gpt-5-mini",
+    "FALLBACK_MODEL": "gpt-4.1-mini",
+    "OPENAI_BASE_URL": None,  # e.g. fake_responses_api for load tests
+    "GATEWAY_MODE": "hedged",
+    "HEDGE_DELAY": 6.0,
+    "OBSERVATION_DEADLINE": 20,
+    "CHAT_DEADLINE": 60,
+    "HTTP_MAX_CONNECTIONS": 8,
+    "HTTP_MAX_KEEPALIVE": 4,
+    "HTTP_CONNECT_TIMEOUT": 5.0,
+    "HTTP_READ_TIMEOUT": 30.0,
+    "HTTP_RETRIES": 2,
+    "RETRY_BUDGET_RATIO": 0.2,
+    "BREAKER_FAILURES": 5,
+    "BREAKER_OPEN_SECONDS": 30,
+    "CACHE_PATH": os.path.join(HERE, "cache", "observations.sqlite3"),
+    "CACHE_TTL": 24 * 3600,
+    "CACHE_MAX_ENTRIES": 256,
+    "CHAT_ANSWER_CACHE": True,
+    "CHAT_CACHE_EMBEDDINGS": "hashing",
+    "CHAT_CACHE_SIMILARITY": None,
+    "CHAT_CACHE_MAX_ENTRIES": 256,
+    "CHAT_CACHE_TTL": 900,
+    "KB_ROUTING": True,
+    "KB_FOLDER": os.path.join(HERE, "knowledge_base"),
+    "KB_BACKEND": "lexical",
+    "KB_TOP_K": 3,
+    "KB_CONTEXT_BUDGET": 600,
+    "KB_DIRECT_THRESHOLD": 0.8,
+    "UPLOAD_MAX_BYTES": 120_000,
+    "UPLOAD_MAX_TOKENS": None,
+    "UPLOAD_DETAIL": "auto",
+    "IMAGE_STORE_MAX_ENTRIES": 32,
+    "IMAGE_FILE_UPLOADS": True,
+    "IMAGE_UPLOAD_AFTER_USES": 2,
+    "IMAGE_FILE_TTL": 1800,
+    "CHAT_SESSIONS": True,
+    "CHAT_CONTEXT_BUDGET": 6000,
+    "CHAT_SUMMARY_BUDGET": 400,
+    "CHAT_SCREEN_CHANGE": 0.02,
+    "CHAT_SESSION_IDLE_RESET": 600,
+    "ENGINE_MODEL_SLOTS": 8,  # model calls in flight across all clients
+    "ENGINE_SLOTS_PER_CLIENT": 2,  # model calls in flight for any one client
+    "ENGINE_OBSERVE_WAIT": 10.0,  # seconds an observation may wait for a slot before it is skipped
+    "ENGINE_MAX_SESSIONS": 500,  # chat sessions kept (least recently used are dropped)
+}
+
+
+# ---------- Fair admission of model calls ---------- #
+class EngineBusy(Exception):
+    """No model-call slot became free in time (or the caller gave up waiting)."""
+
+
+class _Ticket:
+    __slots__ = ("event", "granted")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.granted = False
+
+
+class FairGate:
+    """
+    At most `slots` model calls in flight, and at most `per_client` for any one
+    client. Free slots go to waiting chat calls before observations, and within
+    each kind round-robin across clients (one grant per client per turn), so a
+    client with many queued calls waits behind everyone else's next call.
+    """
+
+    KINDS = ("chat", "observe")  # priority order
+
+    def __init__(self, slots=8, per_client=2):
+        self.slots = slots
+        self.per_client = per_client
+        self.stats = {"granted": 0, "waited": 0, "timeouts": 0, "cancelled": 0, "max_waiting": 0}
+        self._free = slots
+        self._running = {}  # client ID -> calls in flight
+        self._waiting = {kind: OrderedDict() for kind in self.KINDS}  # kind -> client ID -> deque of tickets
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def slot(self, client_id, kind="chat", timeout=None, cancel=None):
+        """Holds one slot for the block; yields the seconds waited. Raises EngineBusy on timeout or cancel."""
+        start = time.monotonic()
+        ticket = _Ticket()
+        with self._lock:
+            self._waiting[kind].setdefault(client_id, deque()).append(ticket)
+            self._dispatch()
+            if not ticket.granted:
+                self.stats["waited"] += 1
+                waiting = sum(len(tickets) for level in self._waiting.values() for tickets in level.values())
+                self.stats["max_waiting"] = max(self.stats["max_waiting"], waiting)
+        if not ticket.granted:
+            if cancel is not None:
+                cancel.on_cancel(ticket.event.set)
+            ticket.event.wait(timeout)
+            with self._lock:
+                if not ticket.granted:
+                    self._withdraw(kind, client_id, ticket)
+                    cancelled = cancel is not None and cancel.cancelled
+                    self.stats["cancelled" if cancelled else "timeouts"] += 1
+                    raise EngineBusy("cancelled while waiting" if cancelled
+                                     else f"no model slot free after {time.monotonic() - start:.0f}s")
+        try:
+            yield time.monotonic() - start
+        finally:
+            with self._lock:
+                self._running[client_id] -= 1
+                if not self._running[client_id]:
+                    del self._running[client_id]
+                self._free += 1
+                self._dispatch()
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.stats, slots=self.slots, in_flight=self.slots - self._free,
+                        clients_in_flight=len(self._running),
+                        waiting={kind: sum(len(tickets) for tickets in level.values())
+                                 for kind, level in self._waiting.items()})
+
+    def _dispatch(self):
+        """Hand free slots to waiters; caller holds the lock."""
+        while self._free:
+            picked = self._next()
+            if picked is None:
+                return
+            client_id, ticket = picked
+            ticket.granted = True
+            self._running[client_id] = self._running.get(client_id, 0) + 1
+            self._free -= 1
+            self.stats["granted"] += 1
+            ticket.event.set()
+
+    def _next(self):
+        for kind in self.KINDS:
+            level = self._waiting[kind]
+            for client_id in list(level):
+                if self._running.get(client_id, 0) >= self.per_client:
+                    continue
+                tickets = level.pop(client_id)  # re-queued at the back: round-robin
+                ticket = tickets.popleft()
+                if tickets:
+                    level[client_id] = tickets
+                return client_id, ticket
+        return None
+
+    def _withdraw(self, kind, client_id, ticket):
+        tickets = self._waiting[kind].get(client_id)
+        if tickets is not None:
+            tickets.remove(ticket)
+            if not tickets:
+                del self._waiting[kind][client_id]
+
+
+# ---------- Engine ---------- #
+class Engine:
+    """Model-side pipeline shared by one or many overlay clients (see the module docstring)."""
+
+    def __init__(self, api_key, settings=None, tracer=None):
+        unknown = set(settings or {}) - set(DEFAULT_SETTINGS)
+        if unknown:
+            raise ValueError(f"unknown engine settings: {', '.join(sorted(unknown))}")
+        if not api_key:
+            raise ValueError("⚠️ No OpenAI API key found. Use: setx OPENAI_API_KEY \"your-key\"")
+        self.api_key = api_key
+        self.settings = s = dict(DEFAULT_SETTINGS, **(settings or {}))
+        self.tracer = tracer or Tracer()
+        self.observation_cache = ObservationCache(s["CACHE_PATH"], max_entries=s["CACHE_MAX_ENTRIES"],
+                                                  ttl_seconds=s["CACHE_TTL"])
+        self.gate = FairGate(slots=s["ENGINE_MODEL_SLOTS"], per_client=s["ENGINE_SLOTS_PER_CLIENT"])
+        self.stats = {"observations": 0, "observations_cached": 0, "observations_coalesced": 0, "chats": 0,
+                      "answers_cached": 0, "answers_local": 0, "busy": 0}
+        self.gateway = None
+        self.http_transport = None
+        self.image_encoder = None
+        self.image_store = None
+        self.answer_cache = None
+        self.kb_router = None
+        self._sessions = OrderedDict()  # client ID -> ChatSession, least recently used first
+        self._flights = {}  # observation cache key -> Event set when its model call finishes
+        self._stats_lock = threading.Lock()
+        self._lock = threading.RLock()
+
+    # ---------- Lazily created services ---------- #
+    def get_gateway(self):
+        """OpenAI client (pooled, retrying, circuit-broken transport) + model gateway, built on first use."""
+        s = self.settings
+        with self._lock:
+            if self.gateway is None:
+                with self.tracer.span("startup.openai"):
+                    from openai import OpenAI
+                    from transport import ResilientTransport, CircuitBreaker, RetryBudget, create_http_client
+                    self.http_transport = ResilientTransport(
+                        max_connections=s["HTTP_MAX_CONNECTIONS"], max_keepalive=s["HTTP_MAX_KEEPALIVE"],
+                        retries=s["HTTP_RETRIES"],
+                        breaker=CircuitBreaker(failure_threshold=s["BREAKER_FAILURES"],
+                                               open_seconds=s["BREAKER_OPEN_SECONDS"], on_change=log_breaker_change),
+                        budget=RetryBudget(ratio=s["RETRY_BUDGET_RATIO"]))
+                    http_client = create_http_client(self.http_transport, s["HTTP_CONNECT_TIMEOUT"],
+                                                     s["HTTP_READ_TIMEOUT"])
+                    # Retries live in the transport (shared budget + breaker), not in the SDK
+                    client = OpenAI(api_key=self.api_key, base_url=s["OPENAI_BASE_URL"], http_client=http_client,
+                                    max_retries=0)
+                    self.gateway = ModelGateway(client, s["PRIMARY_MODEL"], s["FALLBACK_MODEL"],
+                                                mode=s["GATEWAY_MODE"], hedge_delay=s["HEDGE_DELAY"])
+            return self.gateway
+
+    def get_image_encoder(self):
+        s = self.settings
+        with self._lock:
+            if self.image_encoder is None:
+                from image_encoder import AdaptiveEncoder
+                self.image_encoder = AdaptiveEncoder(max_bytes=s["UPLOAD_MAX_BYTES"], max_tokens=s["UPLOAD_MAX_TOKENS"],
+                                                     detail=s["UPLOAD_DETAIL"])
+            return self.image_encoder
+
+    def get_image_store(self):
+        """Encode-once / upload-once frame store shared by observations and chat."""
+        s = self.settings
+        with self._lock:
+            if self.image_store is None:
+                from image_store import ImageStore, OpenAIFileUploader
+                uploader = OpenAIFileUploader(self.get_gateway().client, expires_after=2 * s["IMAGE_FILE_TTL"]) \
+                    if s["IMAGE_FILE_UPLOADS"] else None
+                self.image_store = ImageStore(self.prepare_image_for_upload, uploader=uploader,
+                                              max_entries=s["IMAGE_STORE_MAX_ENTRIES"], ttl=s["IMAGE_FILE_TTL"],
+                                              upload_after=s["IMAGE_UPLOAD_AFTER_USES"])
+            return self.image_store
+
+    def get_answer_cache(self):
+        """Semantic cache for chat answers (question embedding + screen)."""
+        s = self.settings
+        with self._lock:
+            if self.answer_cache is None:
+                from answer_cache import SemanticAnswerCache, create_embedder
+                self.answer_cache = SemanticAnswerCache(
+                    create_embedder(s["CHAT_CACHE_EMBEDDINGS"]), threshold=s["CHAT_CACHE_SIMILARITY"],
+                    max_entries=s["CHAT_CACHE_MAX_ENTRIES"], ttl=s["CHAT_CACHE_TTL"])
+            return self.answer_cache
+
+    def get_kb_router(self):
+        """Knowledge-base router for chat, or None if the knowledge base cannot be opened."""
+        s = self.settings
+        with self._lock:
+            if self.kb_router is None:
+                from knowledge_manager import create_retriever
+                from kb_router import KnowledgeRouter
+                try:
+                    retriever = create_retriever(s["KB_FOLDER"], backend=s["KB_BACKEND"])
+                except Exception as e:
+                    print(f"[ROUTER] knowledge base unavailable, chat goes straight to the model: {e}")
+                    retriever = None
+                self.kb_router = KnowledgeRouter(retriever, top_k=s["KB_TOP_K"], context_budget=s["KB_CONTEXT_BUDGET"],
+                                                 direct_threshold=s["KB_DIRECT_THRESHOLD"]) if retriever else False
+            return self.kb_router or None
+
+    def session(self, client_id):
+        """The client's chat session (created on first use)."""
+        s = self.settings
+        with self._lock:
+            session = self._sessions.pop(client_id, None)
+            if session is None:
+                session = ChatSession(context_budget=s["CHAT_CONTEXT_BUDGET"], summary_budget=s["CHAT_SUMMARY_BUDGET"],
+                                      screen_change=s["CHAT_SCREEN_CHANGE"], idle_reset=s["CHAT_SESSION_IDLE_RESET"])
+            self._sessions[client_id] = session
+            while len(self._sessions) > s["ENGINE_MAX_SESSIONS"]:
+                self._sessions.popitem(last=False)
+            return session
+
+    def end_session(self, client_id):
+        with self._lock:
+            self._sessions.pop(client_id, None)
+
+    # ---------- Warm-up and health ---------- #
+    def warm_up(self):
+        """Builds the encoder, caches, router and client, and opens the pooled HTTPS connection (no tokens)."""
+        s = self.settings
+        self.get_image_encoder()
+        self.get_image_store()
+        if s["CHAT_ANSWER_CACHE"]:
+            self.get_answer_cache()
+        if s["KB_ROUTING"]:
+            self.get_kb_router()
+        self.get_gateway().client.models.retrieve(s["PRIMARY_MODEL"])
+        if s["DEBUG_MODEL_IO"]:
+            reply = self.get_gateway().call("What is 1+1?", mode="sequential")
+            if reply.text:
+                print(f"[SMOKE TEST] Model: {reply.model}, Output: {reply.text}")
+            else:
+                print(f"[SMOKE TEST] Failed: {reply.errors or 'empty output from both models'}")
+
+    def available(self):
+        """False while the circuit breaker is open: observations pause and chat fails fast."""
+        return self.http_transport is None or self.http_transport.breaker.state != "open"
+
+    def retry_in(self):
+        return self.http_transport.breaker.retry_in() if self.http_transport else 0.0
+
+    def http_stats(self):
+        return self.http_transport.stats() if self.http_transport else None
+
+    # ---------- Requests ---------- #
+    def prepare_image_for_upload(self, img, detail=None):
+        """
+        Optimize screenshot for upload within UPLOAD_MAX_BYTES / UPLOAD_MAX_TOKENS.
+        - Text-heavy UI frames go out as a PNG palette, everything else as WebP/JPEG
+        - Quality, then resolution, is lowered until the frame fits the budget
+
+        Returns: EncodedImage (use .data_url() and .detail in the input_image part)
+        """
+        with self.tracer.span("encode") as span:
+            encoded = self.get_image_encoder().encode(img, detail)
+            span.update(format=encoded.format, bytes=len(encoded.data))
+        if self.settings["DEBUG_MODEL_IO"]:
+            print(f"[ENCODE] {encoded!r}")
+        return encoded
+
+    def build_image_request(self, image, text, system_prompt=None, context=None):
+        """image_request() with the base64 step traced (a no-op once the frame is referenced by file ID)."""
+        with self.tracer.span("base64"):
+            return image_request(image, text, system_prompt, context)
+
+    def trace_reply(self, reply):
+        """Record the gateway's send / time-to-first-byte / parse milestones for the winning model."""
+        timings = reply.timings
+        model = reply.model or (reply.attempts[-1] if reply.attempts else None)
+        if "headers" in timings:
+            self.tracer.record("send", timings["headers"], model=model)
+        if "first_delta" in timings:
+            self.tracer.record("ttfb", timings["first_delta"], model=model)
+            if "done" in timings:
+                self.tracer.record("parse", timings["done"] - timings["first_delta"], model=model)
+        self.tracer.record("model", reply.latency, model=model, ok=bool(reply.text))
+
+    def _call(self, client_id, kind, request_input, timeout=None, cancel=None, **kwargs):
+        """One gateway call inside a fair slot; the time spent waiting for it is traced as "queue"."""
+        with self.gate.slot(client_id, kind, timeout=timeout, cancel=cancel) as waited:
+            self.tracer.record("queue", waited, kind=kind)
+            reply = self.get_gateway().call(request_input, cancel=cancel, **kwargs)
+        self.trace_reply(reply)
+        return reply
+
+    def observe(self, img, window_title, detail=None, client_id="local"):
+        """
+        One concise, screen-based observation.
+
+        Returns {"text", "cached", "latency", "ok", "tokens"}: text is None after
+        an error (logged, not shown) and a ⚠️ message when both models came back
+        empty; latency is None when no model call was made.
+        """
+        s = self.settings
+        self._count("observations")
+        prompt = observation_prompt(s["ASSISTANT_NAME"], window_title)
+        result = {"text": None, "cached": False, "latency": None, "ok": False, "tokens": 0}
+
+        cache_key = make_cache_key(img, window_title, prompt, s["PRIMARY_MODEL"])
+        cached = self.observation_cache.get(cache_key)
+        if cached:
+            if s["DEBUG_MODEL_IO"]:
+                print(f"[CACHE] analyze_screen hit {self.observation_cache.stats()}")
+            self._count("observations_cached")
+            return dict(result, text=cached, cached=True, ok=True)
+
+        # Single flight: seats looking at the same screen wait for the first one's call
+        with self._lock:
+            flight = self._flights.get(cache_key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[cache_key] = threading.Event()
+        if not leader:
+            flight.wait(s["ENGINE_OBSERVE_WAIT"] + s["OBSERVATION_DEADLINE"])
+            self._count("observations_coalesced")
+            cached = self.observation_cache.get(cache_key)
+            return dict(result, text=cached, cached=True, ok=True) if cached else result
+        try:
+            return self._observe_model(img, prompt, cache_key, detail, client_id, result)
+        finally:
+            with self._lock:
+                del self._flights[cache_key]
+            flight.set()
+
+    def _observe_model(self, img, prompt, cache_key, detail, client_id, result):
+        s = self.settings
+        image = self.get_image_store().get(img, detail=detail)
+        try:
+            reply = self._call(client_id, "observe", self.build_image_request(image, prompt),
+                               timeout=s["ENGINE_OBSERVE_WAIT"], max_output_tokens=50,
+                               deadline=s["OBSERVATION_DEADLINE"])
+        except EngineBusy as e:
+            self._count("busy")
+            print(f"analyze_screen skipped: {e}")
+            return result
+        result.update(latency=reply.latency, ok=bool(reply.text), tokens=billed_tokens(reply, image, prompt))
+
+        if s["DEBUG_MODEL_IO"]:
+            print(f"[DEBUG analyze_screen] {reply!r} errors={reply.errors}")
+        if reply.text and reply.model != s["PRIMARY_MODEL"]:
+            print(f"[FALLBACK] analyze_screen succeeded with {reply.model}")
+
+        if not reply.text:
+            if reply.errors or reply.timed_out:
+                # Log the error, but don't spam the UI
+                print(f"analyze_screen error: {reply.errors or 'deadline exceeded'}")
+                return result
+            print("analyze_screen: empty content from model (both primary and fallback)")
+            return dict(result, text="⚠️ Unable to analyze screen — model returned empty response")
+
+        self.observation_cache.put(cache_key, reply.text)
+        return dict(result, text=reply.text)
+
+    def chat(self, question, img, window_title, on_delta=None, cancel=None, client_id="local"):
+        """
+        Answer a chat question about the screen.
+
+        Returns {"reply", "label", "latency", "ok"}: reply is None if `cancel`
+        fired (a newer question superseded this one); label is a status line for
+        replies that did not come from the model; latency and ok describe the
+        model call (latency None when there was none).
+        """
+        s = self.settings
+        name = s["ASSISTANT_NAME"]
+        start = time.perf_counter()
+        self._count("chats")
+        session = self.session(client_id) if s["CHAT_SESSIONS"] else None
+        system_prompt = chat_system_prompt(name)
+        plan = session.plan(img) if session else None
+
+        # Any question may be answered from the cache, but only standalone answers are
+        # stored: a follow-up's answer depends on the conversation
+        standalone = plan is None or (plan["previous_response_id"] is None and not plan["summary"])
+        hit = probe = None
+        if s["CHAT_ANSWER_CACHE"]:
+            with self.tracer.span("answer_cache") as span:
+                hit, probe = self.get_answer_cache().lookup(question, img, window_title, client_id,
+                                                          scope=client_id.partition("/")[0])
+                span.update(hit=hit is not None)
+
+        decision = None
+        kb_router = self.get_kb_router() if s["KB_ROUTING"] and not hit else None
+        if kb_router is not None:
+            with self.tracer.span("route") as span:
+                decision = kb_router.route(question)
+                span.update(route=decision["route"])
+            print(f"[ROUTER] {decision['route']}: {decision['reason']} (confidence {decision['confidence']}, "
+                  f"{len(decision['hits'])} chunk(s), {decision['ms']} ms)")
+
+        done = {"reply": None, "label": None, "latency": None, "ok": False}
+        if hit:
+            reply = hit["answer"]
+            done["label"] = "⚡ Cached answer — same screen, similar question"
+            self._count("answers_cached")
+            print(f"[ANSWERS] cached answer (similarity {hit['similarity']:.2f} to {hit['question']!r}) "
+                  f"{self.answer_cache.stats}")
+            if plan is not None:
+                session.record_local(question, reply)
+        elif decision and decision["route"] == "local":
+            reply = decision["answer"]
+            done["label"] = "📚 Answered from the knowledge base"
+            self._count("answers_local")
+            if plan is not None:
+                session.record_local(question, reply)
+        elif not self.available():
+            reply = (f"⚠️ The AI service is not responding (several requests failed in a row). "
+                     f"{name} will try again in {self.retry_in():.0f}s.")
+        else:
+            context = decision["context"] if decision else None
+            text_only = decision is not None and decision["route"] == "text"
+
+            def ask(plan):
+                if text_only:
+                    # Helpdesk question: the knowledge base answers it, the screenshot would not help
+                    first_turn = plan is None or plan["previous_response_id"] is None
+                    knowledge_prompt = knowledge_system_prompt(name)
+                    if plan is not None:
+                        plan["attach_image"] = False
+                        knowledge_prompt = session.system_prompt(knowledge_prompt, plan)
+                    request_input = text_request(question, knowledge_prompt if first_turn else None, context)
+                elif plan is None:
+                    request_input = self.build_image_request(self.get_image_store().get(img), question,
+                                                             system_prompt, context)
+                elif plan["attach_image"]:
+                    first_turn = plan["previous_response_id"] is None
+                    request_input = self.build_image_request(
+                        self.get_image_store().get(img), question,
+                        session.system_prompt(system_prompt, plan) if first_turn else None, context)
+                else:
+                    # same screen: the chain already has it
+                    request_input = text_request(question, context=context)
+                return self._call(client_id, "chat", request_input, timeout=s["CHAT_DEADLINE"], cancel=cancel,
+                                  max_output_tokens=250, on_delta=on_delta, deadline=s["CHAT_DEADLINE"],
+                                  previous_response_id=plan and plan["previous_response_id"])
+
+            try:
+                result = ask(plan)
+                if plan and plan["previous_response_id"] and not result.text and result.errors \
+                        and not result.cancelled:
+                    # The chained response may have expired server-side: start a new chain from the summary
+                    print(f"[SESSION] chained turn failed ({result.errors}); starting a new conversation chain")
+                    session.break_chain()
+                    plan = session.plan(img)
+                    result = ask(plan)
+            except EngineBusy as e:
+                if cancel is not None and cancel.cancelled:
+                    return done
+                self._count("busy")
+                return dict(done, reply=f"⚠️ {name} is busy right now ({e}). Please try again.")
+            if plan is not None and not result.cancelled:
+                session.record(plan, question, result)
+                if s["DEBUG_MODEL_IO"]:
+                    print(f"[SESSION] {session.stats} chain_tokens={session.chain_tokens} usage={result.usage}")
+            if result.cancelled:
+                print(f"send_chat_message: {self.tracer.request_id or 'request'} superseded by a newer question")
+                return done
+            reply = result.text
+            done.update(latency=result.latency, ok=bool(result.text))
+
+            if s["DEBUG_MODEL_IO"]:
+                print(f"[DEBUG send_chat_message] {result!r} errors={result.errors}")
+            if reply and result.model != s["PRIMARY_MODEL"]:
+                print(f"[FALLBACK] send_chat_message succeeded with {result.model}")
+
+            # If still empty, return clear error message
+            if not reply:
+                print(f"send_chat_message: no reply from either model {result.errors or ''}")
+                reply = "⚠️ Unable to process request — model returned empty response. Please try again."
+            elif standalone and probe is not None:
+                self.answer_cache.put(probe, reply)
+
+        if decision and not reply.startswith("⚠️"):
+            elapsed = time.perf_counter() - start
+            saved = kb_router.note_answer(decision, elapsed)
+            print(f"[ROUTER] {decision['route']} answered in {elapsed:.2f}s, ~{saved:.1f}s saved vs the "
+                  f"screenshot path ({kb_router.stats})")
+        return dict(done, reply=reply)
+
+    # ---------- Metrics and shutdown ---------- #
+    def _count(self, name):
+        with self._stats_lock:
+            self.stats[name] += 1
+
+    def snapshot(self):
+        """Engine, fair-gate, cache and HTTP pool counters as one dict."""
+        with self._stats_lock:
+            snapshot = dict(self.stats)
+        with self._lock:
+            snapshot["sessions"] = len(self._sessions)
+        snapshot["gate"] = self.gate.snapshot()
+        snapshot["observation_cache"] = self.observation_cache.stats()
+        if self.answer_cache is not None:
+            snapshot["answer_cache"] = dict(self.answer_cache.stats)
+        if self.image_store is not None:
+            snapshot["image_store"] = dict(self.image_store.stats)
+        if self.kb_router:
+            snapshot["router"] = dict(self.kb_router.stats)
+        snapshot["http"] = self.http_stats()
+        return snapshot
+
+    def prometheus(self, prefix="odoo_ai_engine"):
+        """Engine and fair-gate counters (plus the HTTP transport's) in Prometheus text format."""
+        with self._stats_lock:
+            stats = dict(self.stats)
+        gate = self.gate.snapshot()
+        lines = [f"# TYPE {prefix}_requests_total counter"]
+        for name, value in sorted(stats.items()):
+            lines.append(f'{prefix}_requests_total{{kind="{name}"}} {value}')
+        lines.append(f"# TYPE {prefix}_gate_total counter")
+        for name in ("granted", "waited", "timeouts", "cancelled"):
+            lines.append(f'{prefix}_gate_total{{event="{name}"}} {gate[name]}')
+        lines.append(f"# TYPE {prefix}_gate gauge")
+        lines.append(f'{prefix}_gate{{kind="in_flight"}} {gate["in_flight"]}')
+        for kind, waiting in gate["waiting"].items():
+            lines.append(f'{prefix}_gate{{kind="waiting_{kind}"}} {waiting}')
+        with self._lock:
+            lines.append(f"# TYPE {prefix}_sessions gauge")
+            lines.append(f"{prefix}_sessions {len(self._sessions)}")
+        text = "\n".join(lines) + "\n"
+        if self.http_transport is not None:
+            text += self.http_transport.prometheus()
+        return text
+
+    def close(self):
+        if self.image_store is not None:
+            self.image_store.close()
+        self.observation_cache.close()
+        if self.http_transport is not None:
+            self.http_transport.close()
+
+
+def log_breaker_change(old, new, breaker):
+    if new == "open":
+        print(f"[BREAKER] {old} -> open: model API failing, background observations paused "
+              f"for {breaker.open_seconds:.0f}s")
+    else:
+        print(f"[BREAKER] {old} -> {new}")
+
+
+def billed_tokens(reply, image, prompt):
+    """Tokens a call counts against the seat budget: reported usage, else an estimate."""
+    usage = reply.usage
+    if usage.get("input_tokens"):
+        return usage["input_tokens"] + usage.get("output_tokens", 0)
+    from image_encoder import estimate_image_tokens
+    return estimate_image_tokens(image.encoded.size, image.detail) + (len(prompt) + len(reply.text)) // 4
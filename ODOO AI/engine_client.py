@@ -0,0 +1,197 @@
+"""
+Thin client for engine_daemon.py: the same observe / chat / warm_up / health
+methods as engine.Engine, sent over a Unix socket or localhost HTTP.
+
+Addresses: "unix:/run/odoo-ai/engine.sock" or "http://127.0.0.1:8765".
+
+Frames travel as raw pixels, zlib-compressed (level 1, a few ms for a
+1024 px frame); the engine encodes and uploads them, so identical frames
+from different clients share one encode, one upload and one cache entry.
+Chat replies stream back as newline-delimited JSON.
+
+Over HTTP the daemon needs a per-user token (`token`, default: the
+ODOO_AI_ENGINE_TOKEN environment variable); over the Unix socket it
+identifies the user by uid.
+"""
+import os
+import json
+import zlib
+import time
+import base64
+import socket
+import getpass
+import http.client
+from urllib.parse import urlsplit
+
+
+def pack_image(img):
+    return {"mode": img.mode, "size": list(img.size),
+            "data": base64.b64encode(zlib.compress(img.tobytes(), 1)).decode("ascii")}
+
+
+def unpack_image(packed):
+    from PIL import Image
+    return Image.frombytes(packed["mode"], tuple(packed["size"]), zlib.decompress(base64.b64decode(packed["data"])))
+
+
+def parse_address(address):
+    """("unix", path) or ("tcp", (host, port))."""
+    if address.startswith("unix:"):
+        return "unix", address[len("unix:"):]
+    parts = urlsplit(address if "://" in address else f"http://{address}")
+    return "tcp", (parts.hostname or "127.0.0.1", 8765 if parts.port is None else parts.port)
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, socket_path, timeout=None):
+        super().__init__("localhost", timeout=timeout)
+        self.socket_path = socket_path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.socket_path)
+
+
+class EngineError(Exception):
+    """The daemon could not be reached or reported an error."""
+
+
+class EngineClient:
+    """
+    One overlay's connection to the shared engine. `client_id` identifies the
+    seat for chat sessions and fair scheduling (default: user@host:pid); the
+    daemon scopes it to the authenticated user.
+    Health (`available()`) is polled at most every `health_ttl` seconds, with a
+    `health_timeout`; `http_stats()` only reads the last poll, so it is safe on the Tk thread.
+    """
+
+    def __init__(self, address, client_id=None, token=None, timeout=120.0, health_ttl=5.0, health_timeout=2.0):
+        self.address = address
+        self.kind, self.target = parse_address(address)
+        self.client_id = client_id or f"{getpass.getuser()}@{socket.gethostname()}:{os.getpid()}"
+        self.token = token or os.getenv("ODOO_AI_ENGINE_TOKEN")
+        self.timeout = timeout
+        self.health_ttl = health_ttl
+        self.health_timeout = health_timeout
+        self._health = None
+        self._health_at = 0.0
+
+    def _connection(self, timeout):
+        if self.kind == "unix":
+            return UnixHTTPConnection(self.target, timeout=timeout)
+        return http.client.HTTPConnection(*self.target, timeout=timeout)
+
+    def _request(self, method, path, payload=None, timeout=None):
+        """Opens the request and returns (connection, response, socket); raises EngineError unless 200."""
+        connection = self._connection(timeout or self.timeout)
+        body = json.dumps(payload).encode("utf-8") if payload is not None else None
+        headers = {"Content-Type": "application/json"}
+        if self.token:
+            headers["Authorization"] = f"Bearer {self.token}"
+        try:
+            connection.request(method, path, body=body, headers=headers)
+            sock = connection.sock  # getresponse() hands it to the response for a read-until-close body
+            response = connection.getresponse()
+        except OSError as e:
+            connection.close()
+            raise EngineError(f"engine daemon unreachable at {self.address}: {e}") from e
+        if response.status != 200:
+            detail = response.read().decode("utf-8", "replace")
+            connection.close()
+            raise EngineError(f"engine daemon error {response.status}: {detail}")
+        return connection, response, sock
+
+    def _call(self, method, path, payload=None, timeout=None):
+        connection, response, _ = self._request(method, path, payload, timeout)
+        try:
+            return json.loads(response.read())
+        finally:
+            response.close()
+            connection.close()
+
+    # ---------- Engine methods ---------- #
+    def observe(self, img, window_title, detail=None):
+        return self._call("POST", "/v1/observe", {"client": self.client_id, "image": pack_image(img),
+                                                  "window_title": window_title, "detail": detail})
+
+    def chat(self, question, img, window_title, on_delta=None, cancel=None):
+        """
+        Streams the reply (on_delta(None): discard the text so far, as with ModelGateway);
+        a fired `cancel` closes the connection, which cancels the call in the daemon.
+        """
+        payload = {"client": self.client_id, "question": question, "image": pack_image(img),
+                   "window_title": window_title, "stream": on_delta is not None}
+        connection, response, sock = self._request("POST", "/v1/chat", payload)
+        if cancel is not None:
+            cancel.on_cancel(lambda: _shutdown(sock))
+        try:
+            while True:
+                try:
+                    line = response.readline()
+                except OSError:
+                    line = b""
+                if not line:
+                    if cancel is not None and cancel.cancelled:
+                        return {"reply": None, "label": None, "latency": None, "ok": False}
+                    raise EngineError("engine daemon closed the connection before the reply")
+                message = json.loads(line)
+                if "delta" in message:
+                    on_delta(message["delta"])
+                elif "error" in message:
+                    raise EngineError(message["error"])
+                else:
+                    return message
+        finally:
+            response.close()
+            connection.close()
+
+    def end_session(self):
+        self._call("POST", "/v1/end_session", {"client": self.client_id})
+
+    def warm_up(self):
+        """Checks the daemon is up; its own warm-up happens once, at daemon start."""
+        self._health_at = 0.0
+        health = self.health()
+        if health is None:
+            raise EngineError(f"engine daemon unreachable at {self.address}")
+        print(f"[ENGINE] connected to {self.address} as {self.client_id} "
+              f"({health['clients']} client(s), breaker {health['breaker']})")
+
+    def health(self):
+        """Daemon health ({"available", "retry_in", "breaker", "clients", "http"}), or None if unreachable."""
+        now = time.monotonic()
+        if now - self._health_at > self.health_ttl:
+            self._health_at = now
+            try:
+                self._health = self._call("GET", "/v1/health", timeout=self.health_timeout)
+            except (EngineError, ValueError) as e:
+                if self._health is not None:
+                    print(f"[ENGINE] {e}")
+                self._health = None
+        return self._health
+
+    def available(self):
+        health = self.health()
+        return bool(health and health["available"])
+
+    def retry_in(self):
+        health = self.health()
+        return health["retry_in"] if health else 0.0
+
+    def http_stats(self):
+        health = self._health
+        return health["http"] if health else None
+
+    def prometheus(self):
+        return ""  # the daemon serves the shared metrics at /metrics
+
+    def close(self):
+        pass
+
+
+def _shutdown(sock):
+    try:
+        sock.shutdown(socket.SHUT_RDWR)
+    except OSError:
+        pass
@@ -0,0 +1,312 @@
+"""
+Shared engine for many overlays on one machine (e.g. a terminal server): one
+process holds the OpenAI key, the HTTP connection pool, the observation and
+answer caches and the knowledge index, and serves thin overlay clients
+(ODOO_AI.py with ENGINE_ADDRESS set, see engine_client.py).
+
+    OPENAI_API_KEY=... python engine_daemon.py --socket /run/odoo-ai/engine.sock
+    OPENAI_API_KEY=... python engine_daemon.py --port 8765 --tokens tokens.json
+    python engine_daemon.py --socket ... --settings engine.json   # JSON object overriding engine.DEFAULT_SETTINGS
+
+Seats are identified by the "client" string in each request, scoped to the
+caller's authenticated user, so one user cannot reach another user's chat
+session whatever ID they send:
+    Unix socket   the peer's uid, from SO_PEERCRED
+    TCP           a bearer token (Authorization header) from --tokens, a JSON
+                  object {"user": "token"}; --port requires it
+Requests without an identity get 401.
+
+Endpoints (JSON bodies):
+    POST /v1/observe      {"client", "image", "window_title", "detail"} -> Engine.observe result
+    POST /v1/chat         {"client", "question", "image", "window_title", "stream"}
+                          -> newline-delimited JSON: {"delta": ...} lines, then the Engine.chat result
+                          ({"delta": null}: discard the text so far, see ModelGateway)
+    POST /v1/end_session  {"client"}
+    GET  /v1/health       breaker state, connected clients, HTTP pool stats, engine counters
+    GET  /metrics         Prometheus text (stages, engine, fair gate, HTTP transport)
+
+A client that disconnects cancels its chat call, also while it waits for a slot.
+The Unix socket is created with --socket-mode (default 0660: owner and group).
+"""
+import os
+import sys
+import json
+import hmac
+import time
+import select
+import socket
+import struct
+import argparse
+import threading
+import socketserver
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from engine import Engine
+from engine_client import parse_address, unpack_image
+from model_gateway import CancelToken
+
+CLIENT_ACTIVE_SECONDS = 300  # a client counts as connected this long after its last request
+LISTEN_BACKLOG = 256  # pending connections (socketserver's default of 5 refuses bursts from many seats)
+
+
+def peer_uid(sock):
+    """Uid of the process at the other end of a Unix socket, or None where SO_PEERCRED is unavailable."""
+    if not hasattr(socket, "SO_PEERCRED"):
+        return None
+    try:
+        creds = sock.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize("3i"))
+    except OSError:
+        return None
+    return struct.unpack("3i", creds)[1]  # (pid, uid, gid)
+
+
+class _UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+    request_queue_size = LISTEN_BACKLOG
+
+
+class _TCPHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = LISTEN_BACKLOG
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server_version = "OdooAIEngine/1"
+    engine_server = None  # EngineServer, set on the subclass
+
+    def address_string(self):
+        return self.client_address[0] if self.client_address else "unix"
+
+    def log_message(self, format, *args):
+        if self.engine_server.verbose:
+            super().log_message(format, *args)
+
+    def do_GET(self):
+        if self.path == "/v1/health":
+            self._send_json(200, self.engine_server.health())
+        elif self.path == "/metrics":
+            self._send(200, self.engine_server.metrics().encode("utf-8"), "text/plain; version=0.0.4")
+        else:
+            self._send_json(404, {"error": f"unknown path {self.path}"})
+
+    def do_POST(self):
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+            body = json.loads(self.rfile.read(length)) if length else {}
+            client_id = self.engine_server.identify(self.connection, self.headers.get("Authorization"),
+                                                    str(body["client"]))
+        except (ValueError, KeyError) as e:
+            self._send_json(400, {"error": f"bad request: {e}"})
+            return
+        if client_id is None:
+            self._send_json(401, {"error": "unauthenticated: connect over the Unix socket or send a valid token"})
+            return
+        self.engine_server.seen(client_id)
+        engine = self.engine_server.engine
+        try:
+            if self.path == "/v1/observe":
+                with engine.tracer.request("observe"):
+                    result = engine.observe(unpack_image(body["image"]), body.get("window_title") or "Unknown window",
+                                            detail=body.get("detail"), client_id=client_id)
+                self._send_json(200, result)
+            elif self.path == "/v1/chat":
+                self._chat(client_id, body)
+            elif self.path == "/v1/end_session":
+                engine.end_session(client_id)
+                self._send_json(200, {"ok": True})
+            else:
+                self._send_json(404, {"error": f"unknown path {self.path}"})
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # client went away
+        except Exception as e:
+            print(f"[DAEMON] {self.path} failed for {client_id}: {e}")
+            self._send_json(500, {"error": str(e)})
+
+    def _chat(self, client_id, body):
+        img = unpack_image(body["image"])
+        cancel = CancelToken()
+        finished = threading.Event()
+        write_lock = threading.Lock()
+        threading.Thread(target=self._watch_disconnect, args=(cancel, finished), daemon=True).start()
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.end_headers()
+
+        def write_line(message):
+            with write_lock:
+                try:
+                    self.wfile.write(json.dumps(message).encode("utf-8") + b"\n")
+                    self.wfile.flush()
+                except OSError:
+                    cancel.cancel()  # client disconnected: stop the model call
+
+        try:
+            with self.engine_server.engine.tracer.request("chat"):
+                result = self.engine_server.engine.chat(
+                    body["question"], img, body.get("window_title") or "Unknown window",
+                    on_delta=(lambda delta: write_line({"delta": delta})) if body.get("stream") else None,
+                    cancel=cancel, client_id=client_id)
+        except Exception as e:
+            print(f"[DAEMON] chat failed for {client_id}: {e}")
+            result = {"error": str(e)}
+        finally:
+            finished.set()
+        if not cancel.cancelled:
+            write_line(result)
+
+    def _watch_disconnect(self, cancel, finished):
+        """Cancel the chat call when the client closes its end (it sends nothing after the request)."""
+        connection = self.connection
+        while not finished.is_set():
+            try:
+                readable, _, _ = select.select([connection], [], [], 0.25)
+                if readable and not connection.recv(1, socket.MSG_PEEK):
+                    cancel.cancel()
+                    return
+            except (OSError, ValueError):
+                cancel.cancel()
+                return
+
+    def _send_json(self, status, payload):
+        self._send(status, json.dumps(payload).encode("utf-8"), "application/json")
+
+    def _send(self, status, data, content_type):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+class EngineServer:
+    """Serves one Engine on a Unix socket ("unix:/path") or localhost HTTP ("http://127.0.0.1:8765")."""
+
+    def __init__(self, engine, address, socket_mode=0o660, tokens=None, verbose=False):
+        self.engine = engine
+        self.address = address
+        self.unix = parse_address(address)[0] == "unix"
+        self.tokens = {token: user for user, token in (tokens or {}).items()}  # token -> user
+        self.socket_mode = socket_mode
+        self.verbose = verbose
+        self._clients = {}  # client ID -> monotonic time of the last request
+        self._clients_lock = threading.Lock()
+        self._httpd = None
+        self._thread = None
+
+    def _bind(self):
+        server = self
+
+        class Handler(_Handler):
+            engine_server = server
+
+        kind, target = parse_address(self.address)
+        if kind == "unix":
+            if os.path.exists(target):
+                os.unlink(target)  # stale socket from an earlier run
+            self._httpd = _UnixHTTPServer(target, Handler)
+            os.chmod(target, self.socket_mode)
+        else:
+            self._httpd = _TCPHTTPServer(target, Handler)
+            self.address = f"http://{target[0]}:{self._httpd.server_address[1]}"
+        return self.address
+
+    def start(self):
+        """Serve on a background thread; returns the address (with the real port for port 0)."""
+        address = self._bind()
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True, name="engine-daemon")
+        self._thread.start()
+        return address
+
+    def serve_forever(self):
+        self._bind()
+        print(f"[DAEMON] serving on {self.address}")
+        self._httpd.serve_forever()
+
+    def stop(self):
+        if self._httpd:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+            kind, target = parse_address(self.address)
+            if kind == "unix" and os.path.exists(target):
+                os.unlink(target)
+            self._httpd = None
+
+    def identify(self, connection, authorization, client):
+        """Seat ID scoped to the authenticated user ("uid1000/..." or "alice/..."), or None."""
+        if self.unix:
+            uid = peer_uid(connection)
+            if uid is not None:
+                return f"uid{uid}/{client}"
+        scheme, _, token = (authorization or "").partition(" ")
+        if scheme.lower() == "bearer" and token:
+            for known, user in self.tokens.items():
+                if hmac.compare_digest(known.encode("utf-8"), token.strip().encode("utf-8")):
+                    return f"{user}/{client}"
+        return None
+
+    def seen(self, client_id):
+        with self._clients_lock:
+            self._clients[client_id] = time.monotonic()
+
+    def active_clients(self):
+        now = time.monotonic()
+        with self._clients_lock:
+            for client_id in [c for c, seen in self._clients.items() if now - seen > CLIENT_ACTIVE_SECONDS]:
+                del self._clients[client_id]
+            return len(self._clients)
+
+    def health(self):
+        http = self.engine.http_stats()
+        return {"available": self.engine.available(), "retry_in": self.engine.retry_in(),
+                "breaker": http["breaker"] if http else "closed", "clients": self.active_clients(),
+                "http": http, "engine": self.engine.snapshot()}
+
+    def metrics(self):
+        return self.engine.tracer.prometheus() + self.engine.prometheus()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    where = parser.add_mutually_exclusive_group(required=True)
+    where.add_argument("--socket", help="Unix socket path")
+    where.add_argument("--port", type=int, help="localhost TCP port")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--socket-mode", type=lambda text: int(text, 8), default=0o660)
+    parser.add_argument("--tokens", help='JSON file {"user": "token"} of bearer tokens (required with --port)')
+    parser.add_argument("--settings", help="JSON file with engine.DEFAULT_SETTINGS overrides")
+    parser.add_argument("--verbose", action="store_true", help="log every HTTP request")
+    args = parser.parse_args()
+    if args.port is not None and not args.tokens:
+        parser.error("--port needs --tokens: TCP has no other way to tell users apart")
+
+    tokens = None
+    if args.tokens:
+        with open(args.tokens, "r", encoding="utf-8") as f:
+            tokens = json.load(f)
+    settings = {}
+    if args.settings:
+        with open(args.settings, "r", encoding="utf-8") as f:
+            settings = json.load(f)
+    engine = Engine(os.getenv("OPENAI_API_KEY"), settings)
+    start = time.perf_counter()
+    try:
+        engine.warm_up()
+        print(f"[DAEMON] engine warm in {time.perf_counter() - start:.2f}s")
+    except Exception as e:
+        print(f"[DAEMON] warm-up failed, serving anyway: {e}")
+
+    address = f"unix:{args.socket}" if args.socket else f"http://{args.host}:{args.port}"
+    server = EngineServer(engine, address, socket_mode=args.socket_mode, tokens=tokens, verbose=args.verbose)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+        engine.close()
+        engine.tracer.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,309 @@
+"""
+Local stand-in for the OpenAI Responses API (POST /v1/responses), for offline testing
+and latency measurements.
+
+Point a real OpenAI client at it:
+    server = FakeResponsesServer(profiles={"gpt-5-mini": {"latency": 0.2, "empty_rate": 0.1}})
+    base_url = server.start()
+    client = OpenAI(api_key="fake", base_url=base_url, max_retries=0)
+
+Per-model profile keys (all optional, "*" is the default profile):
+    latency       seconds before the first byte / token
+    slow_rate     probability a request is slow instead
+    slow_latency  seconds before the first byte for slow requests
+    token_delay   seconds between streamed text deltas
+    empty_rate    probability the reply has no text
+    error_rate    probability the request fails with `error_status`
+    error_status  HTTP status for injected errors (default 500)
+    retry_after   Retry-After seconds sent with injected errors
+    reset_rate    probability the connection is closed without any response
+    cut_after     streamed replies: drop the connection after this many text deltas
+    text          reply text (default: a short canned observation)
+
+Responses are remembered, so `previous_response_id` works: an unknown ID is a
+400 error, and a chained request is billed the chain's tokens plus its own
+(usage.input_tokens is estimated: ~4 characters per token, 765 per image).
+
+GET /v1/models/{id} answers any model (the warm-up check).
+POST /v1/files and DELETE /v1/files/{id} stand in for the Files API, so images
+can be referenced by `file_id`; an unknown file ID is a 400 error.
+`bytes_received` counts /responses request bodies, to compare inline and file uploads.
+"""
+import json
+import time
+import itertools
+import random
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_TEXT = "The screen shows an Odoo invoice list with three draft vendor bills."
+
+
+class FakeResponsesServer:
+    def __init__(self, host="127.0.0.1", port=0, profiles=None, seed=None):
+        self.host = host
+        self.port = port
+        self.profiles = profiles or {}
+        self.random = random.Random(seed)
+        self.requests = 0
+        self.requests_by_model = {}
+        self.chain_tokens = {}  # response ID -> input + output tokens of the whole chain so far
+        self.files = {}  # file ID -> uploaded bytes
+        self.bytes_received = 0
+        self._file_ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._httpd = None
+        self._thread = None
+
+    @property
+    def base_url(self):
+        return f"http://{self.host}:{self.port}/v1"
+
+    def start(self):
+        server = self
+
+        class Handler(_Handler):
+            fake = server
+
+        self._httpd = ThreadingHTTPServer((self.host, self.port), Handler)
+        self._httpd.daemon_threads = True
+        self.port = self._httpd.server_address[1]
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self.base_url
+
+    def stop(self):
+        if self._httpd:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+            self._httpd = None
+
+    def profile_for(self, model):
+        profile = dict(self.profiles.get("*", {}))
+        profile.update(self.profiles.get(model, {}))
+        return profile
+
+    def roll(self, probability):
+        with self._lock:
+            return self.random.random() < probability
+
+    def remember(self, response_id, tokens):
+        with self._lock:
+            self.chain_tokens[response_id] = tokens
+
+    def chain(self, response_id):
+        with self._lock:
+            return self.chain_tokens.get(response_id)
+
+    def add_file(self, size):
+        with self._lock:
+            file_id = f"file-fake{next(self._file_ids)}"
+            self.files[file_id] = size
+            return file_id
+
+    def delete_file(self, file_id):
+        with self._lock:
+            return self.files.pop(file_id, None) is not None
+
+    def missing_files(self, request_input):
+        with self._lock:
+            return [file_id for file_id in _file_ids(request_input) if file_id not in self.files]
+
+    def count(self, model):
+        with self._lock:
+            self.requests += 1
+            self.requests_by_model[model] = self.requests_by_model.get(model, 0) + 1
+
+
+def estimate_input_tokens(request_input):
+    if isinstance(request_input, str):
+        return len(request_input) // 4
+    tokens = 0
+    for message in request_input or []:
+        content = message.get("content", "") if isinstance(message, dict) else ""
+        if isinstance(content, str):
+            tokens += len(content) // 4
+            continue
+        for part in content:
+            if part.get("type") == "input_image":
+                tokens += 765
+            else:
+                tokens += len(part.get("text", "")) // 4
+    return tokens
+
+
+def _file_ids(request_input):
+    if isinstance(request_input, str):
+        return []
+    return [part["file_id"] for message in request_input or [] if isinstance(message, dict)
+            for part in (message.get("content") if isinstance(message.get("content"), list) else [])
+            if part.get("type") == "input_image" and part.get("file_id")]
+
+
+def _response_body(response_id, model, text, created, input_tokens=0):
+    content = [{"type": "output_text", "text": text, "annotations": []}] if text else []
+    return {
+        "id": response_id,
+        "object": "response",
+        "created_at": created,
+        "status": "completed",
+        "model": model,
+        "output": [{
+            "type": "message",
+            "id": f"msg_{response_id}",
+            "status": "completed",
+            "role": "assistant",
+            "content": content,
+        }],
+        "parallel_tool_calls": True,
+        "tool_choice": "auto",
+        "tools": [],
+        "usage": {
+            "input_tokens": input_tokens,
+            "output_tokens": len(text.split()),
+            "total_tokens": input_tokens + len(text.split()),
+            "input_tokens_details": {"cached_tokens": 0},
+            "output_tokens_details": {"reasoning_tokens": 0},
+        },
+    }
+
+
+class _Handler(BaseHTTPRequestHandler):
+    fake = None  # FakeResponsesServer, set by FakeResponsesServer.start
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length)
+        fake = self.fake
+
+        if self.path.rstrip("/").endswith("/files"):
+            # Multipart upload; only the size matters here
+            file_id = fake.add_file(length)
+            self._send_json(200, {"id": file_id, "object": "file", "bytes": length, "created_at": int(time.time()),
+                                  "filename": "upload", "purpose": "vision", "status": "processed"})
+            return
+        if not self.path.rstrip("/").endswith("/responses"):
+            self._send_json(404, {"error": {"message": f"unknown path {self.path}", "type": "not_found"}})
+            return
+
+        try:
+            body = json.loads(raw or b"{}")
+        except ValueError:
+            body = {}
+        with fake._lock:
+            fake.bytes_received += length
+        model = body.get("model", "unknown")
+        profile = fake.profile_for(model)
+        fake.count(model)
+
+        missing = fake.missing_files(body.get("input"))
+        if missing:
+            self._send_json(400, {"error": {"message": f"File '{missing[0]}' not found.",
+                                            "type": "invalid_request_error", "param": "input"}})
+            return
+
+        input_tokens = estimate_input_tokens(body.get("input"))
+        previous = body.get("previous_response_id")
+        if previous:
+            chained = fake.chain(previous)
+            if chained is None:
+                self._send_json(400, {"error": {"message": f"Previous response with id '{previous}' not found.",
+                                                "type": "invalid_request_error", "param": "previous_response_id"}})
+                return
+            input_tokens += chained
+
+        latency = profile.get("latency", 0.0)
+        if fake.roll(profile.get("slow_rate", 0.0)):
+            latency = profile.get("slow_latency", latency * 10)
+        time.sleep(latency)
+
+        if fake.roll(profile.get("reset_rate", 0.0)):
+            self.close_connection = True
+            self.connection.shutdown(2)  # socket.SHUT_RDWR: the client sees a dropped connection
+            return
+        if fake.roll(profile.get("error_rate", 0.0)):
+            status = profile.get("error_status", 500)
+            headers = {"Retry-After": str(profile["retry_after"])} if "retry_after" in profile else None
+            self._send_json(status, {"error": {"message": "injected failure", "type": "server_error"}}, headers)
+            return
+
+        text = "" if fake.roll(profile.get("empty_rate", 0.0)) else profile.get("text", DEFAULT_TEXT)
+        response_id = f"resp_{fake.requests}_{int(time.time() * 1000)}"
+        created = int(time.time())
+        fake.remember(response_id, input_tokens + len(text.split()))
+
+        if body.get("stream"):
+            self._stream(response_id, model, text, created, profile.get("token_delay", 0.0), input_tokens,
+                         profile.get("cut_after"))
+        else:
+            self._send_json(200, _response_body(response_id, model, text, created, input_tokens))
+
+    def do_GET(self):
+        model = self.path.rstrip("/").rsplit("/", 1)[-1]
+        if "/models/" not in self.path:
+            self._send_json(404, {"error": {"message": f"unknown path {self.path}", "type": "not_found"}})
+            return
+        self._send_json(200, {"id": model, "object": "model", "created": 0, "owned_by": "fake"})
+
+    def do_DELETE(self):
+        file_id = self.path.rstrip("/").rsplit("/", 1)[-1]
+        if "/files/" not in self.path or not self.fake.delete_file(file_id):
+            self._send_json(404, {"error": {"message": f"No such file: {file_id}", "type": "invalid_request_error"}})
+            return
+        self._send_json(200, {"id": file_id, "object": "file", "deleted": True})
+
+    def _send_json(self, status, payload, headers=None):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _stream(self, response_id, model, text, created, token_delay, input_tokens=0, cut_after=None):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+
+        sequence = 0
+
+        def emit(payload):
+            nonlocal sequence
+            payload["sequence_number"] = sequence
+            sequence += 1
+            chunk = f"event: {payload['type']}\ndata: {json.dumps(payload)}\n\n".encode("utf-8")
+            self.wfile.write(chunk)
+            self.wfile.flush()
+
+        try:
+            in_progress = _response_body(response_id, model, "", created)
+            in_progress["status"] = "in_progress"
+            emit({"type": "response.created", "response": in_progress})
+            words = text.split(" ") if text else []
+            for i, word in enumerate(words):
+                if i == cut_after:
+                    self.connection.shutdown(2)  # mid-reply: no response.completed
+                    return
+                if i and token_delay:
+                    time.sleep(token_delay)
+                emit({
+                    "type": "response.output_text.delta",
+                    "item_id": f"msg_{response_id}",
+                    "output_index": 0,
+                    "content_index": 0,
+                    "delta": word if i == 0 else " " + word,
+                    "logprobs": [],
+                })
+            emit({"type": "response.completed",
+                  "response": _response_body(response_id, model, text, created, input_tokens)})
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # client cancelled the stream
@@ -0,0 +1,190 @@
+import time
+import math
+import base64
+from io import BytesIO
+
+from PIL import Image, features
+
+MIME_TYPES = {"jpeg": "image/jpeg", "webp": "image/webp", "png": "image/png"}
+
+
+def estimate_image_tokens(size, detail="high"):
+    """
+    Approximate input tokens for an image (OpenAI tile accounting):
+    "low" is a flat 85; "high" fits the image in 2048x2048, scales the short side
+    down to 768, then charges 170 per 512px tile plus 85.
+    """
+    if detail == "low":
+        return 85
+    width, height = size
+    scale = min(1.0, 2048 / max(width, height))
+    width, height = width * scale, height * scale
+    scale = min(1.0, 768 / min(width, height))
+    width, height = width * scale, height * scale
+    return 85 + 170 * math.ceil(width / 512) * math.ceil(height / 512)
+
+
+def is_flat_ui(img, sample_width=256, top_colors=64, coverage=0.9):
+    """
+    True for text/UI-like frames: a handful of flat colors cover almost every
+    pixel. Those compress far better as a PNG palette than as JPEG/WebP.
+    """
+    if img.width > sample_width:
+        img = img.resize((sample_width, max(1, img.height * sample_width // img.width)), Image.NEAREST)
+    colors = img.getcolors(4096)
+    if colors is None:
+        return False
+    colors.sort(reverse=True)
+    return sum(count for count, _ in colors[:top_colors]) >= coverage * img.width * img.height
+
+
+class EncodedImage:
+    """Result of one encode: payload plus what was chosen and what it cost."""
+
+    __slots__ = ("data", "format", "quality", "size", "detail", "encode_ms", "attempts")
+
+    def __init__(self, data, format, quality, size, detail, encode_ms=0.0, attempts=0):
+        self.data = data
+        self.format = format
+        self.quality = quality
+        self.size = size
+        self.detail = detail
+        self.encode_ms = encode_ms
+        self.attempts = attempts
+
+    @property
+    def mime(self):
+        return MIME_TYPES[self.format]
+
+    def data_url(self):
+        return f"data:{self.mime};base64,{base64.b64encode(self.data).decode('utf-8')}"
+
+    def input_part(self):
+        """Responses API input_image part with the image inlined as a data URL."""
+        return {"type": "input_image", "image_url": self.data_url(), "detail": self.detail}
+
+    def __repr__(self):
+        quality = f" q={self.quality}" if self.quality else ""
+        return (f"{self.size[0]}x{self.size[1]} {self.format}{quality} {len(self.data) / 1024:.1f} KB "
+                f"detail={self.detail} {self.encode_ms:.1f} ms ({self.attempts} encodes)")
+
+
+class AdaptiveEncoder:
+    """
+    Encodes screenshots to fit a byte budget (and optionally a token budget).
+
+    For each candidate width (max_width, then 80% steps down to min_width):
+    - flat UI frames first try a 256-color PNG palette (lossless-looking text)
+    - then the lossy format (WebP if Pillow has it, else JPEG) with a binary
+      search for the highest quality in [min_quality, max_quality] that fits
+    The first fit wins; if nothing fits, the smallest attempt is returned.
+
+    detail: "low" caps the width at 512 px (the model only sees 512x512 then),
+    "high" keeps full resolution, "auto" picks low when the result is that small anyway.
+    """
+
+    def __init__(self, max_bytes=120_000, max_tokens=None, max_width=1024, min_width=512, detail="auto",
+                 min_quality=35, max_quality=85, lossy_format=None):
+        self.max_bytes = max_bytes
+        self.max_tokens = max_tokens
+        self.max_width = max_width
+        self.min_width = min_width
+        self.detail = detail
+        self.min_quality = min_quality
+        self.max_quality = max_quality
+        self.lossy_format = lossy_format or ("webp" if features.check("webp") else "jpeg")
+        self.stats = {"frames": 0, "bytes": 0, "encode_ms": 0.0, "over_budget": 0}
+
+    def encode(self, img, detail=None) -> EncodedImage:
+        """Encode one frame; `detail` overrides the encoder's default for this frame."""
+        start = time.perf_counter()
+        detail = detail or self.detail
+        img = _to_rgb(img)
+        attempts = []
+
+        flat_ui = is_flat_ui(img)  # judged on the original: resampling blurs flat colors
+        result = None
+        for width in self._candidate_widths(img.width, detail):
+            frame = img if width == img.width else img.resize(
+                (width, max(1, int(img.height * width / img.width))), Image.LANCZOS)
+            if flat_ui:
+                data = _save(frame.quantize(256, method=Image.Quantize.FASTOCTREE, dither=Image.Dither.NONE), "png")
+                attempts.append(("png", None, frame.size, data))
+                if len(data) <= self.max_bytes:
+                    result = attempts[-1]
+                    break
+            fit = self._search_quality(frame, attempts)
+            if fit:
+                result = fit
+                break
+
+        if result is None:
+            result = min(attempts, key=lambda attempt: len(attempt[3]))
+            self.stats["over_budget"] += 1
+        format, quality, size, data = result
+        if detail == "auto":
+            detail = "low" if max(size) <= 512 else "high"
+        encoded = EncodedImage(data, format, quality, size, detail,
+                               (time.perf_counter() - start) * 1000, len(attempts))
+        self.stats["frames"] += 1
+        self.stats["bytes"] += len(data)
+        self.stats["encode_ms"] += encoded.encode_ms
+        return encoded
+
+    def _candidate_widths(self, width, detail):
+        top = min(width, self.max_width)
+        if detail == "low":
+            top = min(top, 512)
+        if self.max_tokens:
+            while top > self.min_width and estimate_image_tokens((top, top * 9 // 16)) > self.max_tokens:
+                top = int(top * 0.8)
+        widths = [top]
+        while int(widths[-1] * 0.8) >= min(self.min_width, top):
+            widths.append(int(widths[-1] * 0.8))
+        return widths
+
+    def _search_quality(self, frame, attempts):
+        """
+        Highest quality that fits max_bytes: max_quality first (most frames fit),
+        then a binary search in 5-point steps. None if even min_quality is too big.
+        """
+        data = _save(frame, self.lossy_format, self.max_quality)
+        attempts.append((self.lossy_format, self.max_quality, frame.size, data))
+        if len(data) <= self.max_bytes:
+            return attempts[-1]
+        low, high = self.min_quality, self.max_quality - 5
+        best = None
+        while low <= high:
+            quality = (low + high) // 2
+            data = _save(frame, self.lossy_format, quality)
+            attempts.append((self.lossy_format, quality, frame.size, data))
+            if len(data) <= self.max_bytes:
+                best = attempts[-1]
+                low = quality + 5
+            else:
+                high = quality - 5
+        return best
+
+
+def _to_rgb(img):
+    """JPEG/WebP have no use for transparency: flatten onto white."""
+    if img.mode in ("RGBA", "LA", "P"):
+        rgb_img = Image.new("RGB", img.size, (255, 255, 255))
+        if img.mode == "P":
+            img = img.convert("RGBA")
+        rgb_img.paste(img, mask=img.split()[-1])
+        return rgb_img
+    if img.mode != "RGB":
+        return img.convert("RGB")
+    return img
+
+
+def _save(img, format, quality=None):
+    buffered = BytesIO()
+    if format == "png":
+        img.save(buffered, format="PNG", compress_level=6)
+    elif format == "webp":
+        img.save(buffered, format="WEBP", quality=quality, method=2)
+    else:
+        img.save(buffered, format="JPEG", quality=quality, optimize=True)
+    return buffered.getvalue()
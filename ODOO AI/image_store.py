@@ -0,0 +1,170 @@
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+
+def frame_digest(img):
+    """Exact identity of a frame: hash of its mode, size and pixels (~2 ms for a 1024 px frame)."""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(f"{img.mode}{img.size}".encode("ascii"))
+    digest.update(img.tobytes())
+    return digest.hexdigest()
+
+
+class ImageRef:
+    """One stored frame: its encoding and, once uploaded, the provider's file ID."""
+
+    __slots__ = ("digest", "encoded", "file_id", "uses", "uploading", "_inline_part")
+
+    def __init__(self, digest, encoded):
+        self.digest = digest
+        self.encoded = encoded
+        self.file_id = None
+        self.uses = 0
+        self.uploading = False
+        self._inline_part = None
+
+    @property
+    def detail(self):
+        return self.encoded.detail
+
+    def input_part(self):
+        """input_image part: the file reference once uploaded, else the (memoized) inline data URL."""
+        file_id = self.file_id
+        if file_id:
+            return {"type": "input_image", "file_id": file_id, "detail": self.encoded.detail}
+        if self._inline_part is None:
+            self._inline_part = self.encoded.input_part()
+        return self._inline_part
+
+    def __repr__(self):
+        return f"<ImageRef {self.digest[:8]} {self.file_id or 'inline'} uses={self.uses} {self.encoded!r}>"
+
+
+class OpenAIFileUploader:
+    """Uploads encoded frames with the Files API (purpose "vision"); files expire server-side after `expires_after`."""
+
+    def __init__(self, client, purpose="vision", expires_after=3600):
+        self.client = client
+        self.purpose = purpose
+        self.expires_after = expires_after
+
+    def upload(self, encoded, name):
+        kwargs = {}
+        if self.expires_after:
+            kwargs["expires_after"] = {"anchor": "created_at", "seconds": int(self.expires_after)}
+        uploaded = self.client.files.create(file=(name, encoded.data, encoded.mime), purpose=self.purpose, **kwargs)
+        return uploaded.id
+
+    def delete(self, file_id):
+        self.client.files.delete(file_id)
+
+
+class ImageStore:
+    """
+    Encodes each unique frame once and uploads it once.
+
+    - Frames are keyed by an exact pixel digest, so the observation loop and the
+      chat worker share one encode (and one base64 pass) for the same screen
+    - The first request for a frame goes out inline (no extra round trip); with an
+      `uploader`, the frame is uploaded in the background once it has been used
+      `upload_after` times, and later requests send only the file ID (the default
+      of 2 leaves frames that are never reused inline-only)
+    - Bounded LRU of `max_entries` frames, each kept for at most `ttl` seconds;
+      uploaded files are deleted when their entry is evicted
+    - Upload failures are logged and the frame simply stays inline
+
+    `encode(img, detail)` returns an image_encoder.EncodedImage (detail None = encoder default).
+    """
+
+    def __init__(self, encode, uploader=None, max_entries=32, ttl=1800, upload_after=2):
+        self.encode = encode
+        self.uploader = uploader
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.upload_after = upload_after
+        self.stats = {"hits": 0, "misses": 0, "uploads": 0, "upload_failures": 0, "file_refs": 0,
+                      "inline_bytes": 0, "evictions": 0}
+        self._entries = OrderedDict()  # digest -> (created, ImageRef)
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="image-upload") if uploader else None
+
+    def get(self, img, detail=None):
+        """ImageRef for this frame (at this detail level), encoding it only if it is not stored yet."""
+        digest = frame_digest(img) + (f":{detail}" if detail else "")
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is not None and now - entry[0] > self.ttl:
+                self._evict(digest)
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(digest)
+                self.stats["hits"] += 1
+                ref = entry[1]
+        if entry is None:
+            encoded = self.encode(img, detail)  # outside the lock: encodes take tens of ms
+            with self._lock:
+                entry = self._entries.get(digest)
+                if entry is None:
+                    entry = self._entries[digest] = (now, ImageRef(digest, encoded))
+                    self.stats["misses"] += 1
+                    while len(self._entries) > self.max_entries:
+                        self._evict(next(iter(self._entries)))
+                ref = entry[1]
+
+        with self._lock:
+            ref.uses += 1
+            if ref.file_id:
+                self.stats["file_refs"] += 1
+            else:
+                self.stats["inline_bytes"] += len(ref.encoded.data)
+            if self._pool and not ref.file_id and not ref.uploading and ref.uses >= self.upload_after:
+                ref.uploading = True
+                self._pool.submit(self._upload, ref)
+        return ref
+
+    def _upload(self, ref):
+        start = time.perf_counter()
+        try:
+            name = f"frame-{ref.digest.replace(':', '-')}.{ref.encoded.format.lower()}"
+            file_id = self.uploader.upload(ref.encoded, name)
+        except Exception as e:
+            with self._lock:
+                self.stats["upload_failures"] += 1
+            print(f"[IMAGES] upload failed, frame stays inline: {e}")
+            return  # `uploading` stays set: one attempt per frame
+        with self._lock:
+            self.stats["uploads"] += 1
+            if ref.digest in self._entries:
+                ref.file_id = file_id
+                file_id = None
+        if file_id:  # evicted while uploading
+            self._delete(file_id)
+        print(f"[IMAGES] uploaded {ref.digest[:8]} ({len(ref.encoded.data) / 1024:.1f} KB) "
+              f"in {time.perf_counter() - start:.2f}s")
+
+    def _evict(self, digest):
+        """Drop one entry; caller holds the lock."""
+        _, ref = self._entries.pop(digest)
+        self.stats["evictions"] += 1
+        if ref.file_id and self._pool:
+            self._pool.submit(self._delete, ref.file_id)
+
+    def _delete(self, file_id):
+        try:
+            self.uploader.delete(file_id)
+        except Exception as e:
+            print(f"[IMAGES] could not delete {file_id}: {e}")
+
+    def close(self):
+        """Delete uploaded files (best effort) and stop the upload threads."""
+        with self._lock:
+            file_ids = [ref.file_id for _, ref in self._entries.values() if ref.file_id]
+            self._entries.clear()
+        if self._pool:
+            self._pool.shutdown(wait=True)
+            for file_id in file_ids:
+                self._delete(file_id)
@@ -0,0 +1,118 @@
+import re
+import time
+import threading
+
+from lexical_index import tokenize
+from answer_cache import STOPWORDS
+
+# Words that point at the screen: the question cannot be answered without the screenshot
+SCREEN_CUES = frozenset(
+    "this these here screen visible see seeing shown showing displayed open opened current selected highlighted "
+    "line row field column button above below left right dit deze hier scherm zie zichtbaar "
+    "geopend huidige regel veld knop".split()
+)
+# Question openers asking for a fact, which a knowledge-base line can answer verbatim
+LOOKUP_RE = re.compile(
+    r"^\s*(what(?:'s| is| are)?|which|how much|how many|wat(?: is| zijn)?|welke?|hoeveel)\b|"
+    r"\b(rate|rates|percentage|cost|costs|price|prices|tarief|tarieven|kosten|prijs|account|rekening)\b",
+    re.IGNORECASE
+)
+
+
+def content_terms(text):
+    return [term for term in tokenize(text) if term not in STOPWORDS]
+
+
+class KnowledgeRouter:
+    """
+    Routing stage in front of chat: decides per question whether it needs the
+    screenshot, the model, or neither.
+
+    - "local":  a fact lookup with no reference to the screen, where one or two
+      knowledge-base lines cover at least `direct_threshold` of the question's
+      content words; answered from those lines, no model call
+    - "text":   no reference to the screen but relevant knowledge-base chunks
+      (coverage >= `relevance_threshold`); text-only model call with the chunks
+    - "screen": everything else; the usual image request, plus any relevant chunks
+
+    Chunks are injected best-first until `context_budget` tokens (~4 characters
+    per token). Routing itself is one lexical search (sub-millisecond on the BM25 index).
+    """
+
+    def __init__(self, retriever, top_k=3, context_budget=600, direct_threshold=0.8, relevance_threshold=0.5):
+        self.retriever = retriever
+        self.top_k = top_k
+        self.context_budget = context_budget
+        self.direct_threshold = direct_threshold
+        self.relevance_threshold = relevance_threshold
+        self.stats = {"local": 0, "text": 0, "screen": 0, "saved_seconds": 0.0}
+        self._latency = {}  # route -> EWMA of answer latency, seconds
+        self._lock = threading.Lock()
+
+    def route(self, question):
+        start = time.perf_counter()
+        terms = set(content_terms(question))
+        hits = []
+        for hit in self.retriever.search(question, self.top_k) if terms else []:
+            coverage = len(terms & set(tokenize(hit["text"]))) / len(terms)
+            if coverage >= self.relevance_threshold:
+                hits.append(dict(hit, coverage=round(coverage, 2)))
+        # A cue word the knowledge base itself uses ("laptop screen replacement") is a topic, not a pointer
+        cues = set(tokenize(question)) & SCREEN_CUES
+        topical = set(tokenize(hits[0]["text"])) & terms if hits else set()
+        if topical - SCREEN_CUES:
+            cues -= topical
+        needs_screen = bool(cues)
+
+        decision = {"route": "screen", "hits": hits, "context": self._context(hits), "answer": None,
+                    "confidence": hits[0]["coverage"] if hits else 0.0}
+        if needs_screen:
+            decision["reason"] = "refers to the screen"
+        elif not hits:
+            decision["reason"] = "no relevant knowledge"
+        else:
+            decision["route"], decision["reason"] = "text", "knowledge question"
+            if LOOKUP_RE.search(question) and len(terms) >= 2:
+                answer, confidence = self._extract(terms, hits[0])
+                if confidence >= self.direct_threshold:
+                    decision.update(route="local", reason="direct lookup", answer=answer, confidence=confidence)
+        decision["ms"] = round((time.perf_counter() - start) * 1000, 2)
+        with self._lock:
+            self.stats[decision["route"]] += 1
+        return decision
+
+    def _extract(self, terms, hit):
+        """Best line (or pair of consecutive lines) of the chunk and the share of question terms it covers."""
+        lines = [line.strip() for line in re.split(r"\n+|(?<=[.!?])\s+(?=[A-Z])", hit["text"]) if line.strip()]
+        best, best_coverage = "", 0.0
+        for size in (1, 2):  # a pair only wins if it covers more than any single line
+            for i in range(len(lines) - size + 1):
+                coverage = len(terms & set(tokenize(" ".join(lines[i:i + size])))) / len(terms)
+                if coverage > best_coverage + 1e-9:
+                    best, best_coverage = "\n".join(lines[i:i + size]), coverage
+        return f"{best}\n(Source: {hit['source']})", round(best_coverage, 2)
+
+    def _context(self, hits):
+        budget = self.context_budget * 4
+        parts = []
+        for hit in hits:
+            text = hit["text"].strip()
+            block = f"[{hit['source']}]\n{text}"
+            if len(block) > budget:
+                if budget < 200:
+                    break
+                block = block[:budget - 1] + "…"
+            parts.append(block)
+            budget -= len(block)
+        return "\n\n".join(parts)
+
+    def note_answer(self, decision, seconds):
+        """Record how long the routed answer took; returns the estimated seconds saved vs. the screen path."""
+        route = decision["route"]
+        with self._lock:
+            previous = self._latency.get(route)
+            self._latency[route] = seconds if previous is None else 0.8 * previous + 0.2 * seconds
+            baseline = self._latency.get("screen")
+            saved = max(0.0, baseline - seconds) if baseline is not None and route != "screen" else 0.0
+            self.stats["saved_seconds"] += saved
+            return saved
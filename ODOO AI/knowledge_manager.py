@@ -1,24 +1,257 @@
 import os
-import chromadb
-from openai import OpenAI
+import json
+import time
+import hashlib
 
-def initialize_knowledge_base(folder_path="knowledge_base", collection_name="michael_docs"):
-    client = chromadb.Client()
-    collection = client.get_or_create_collection(collection_name)
+from lexical_index import LexicalIndex, build_index
 
-    # Index all text files
-    for filename in os.listdir(folder_path):
-        if filename.endswith(".txt") or filename.endswith(".md"):
-            path = os.path.join(folder_path, filename)
-            with open(path, "r", encoding="utf-8") as f:
-                text = f.read()
+HERE = os.path.dirname(os.path.abspath(__file__))
+KB_FOLDER = os.path.join(HERE, "knowledge_base")
+INDEX_DIR = os.path.join(HERE, "cache", "knowledge_index")
+LEXICAL_INDEX_PATH = os.path.join(HERE, "cache", "knowledge_lexical.idx")
+CHUNK_SIZE = 1000  # characters per chunk
+CHUNK_OVERLAP = 200  # characters shared between neighbouring chunks
+ADD_BATCH_SIZE = 64  # chunks per collection.add call
+
+def chunk_text(text, chunk_size=CHUNK_SIZE, overlap=CHUNK_OVERLAP):
+    """
+    Split a document into overlapping chunks of about `chunk_size` characters.
+    Cuts prefer a paragraph break, then a line break, then a space, so rows of
+    VAT/cost tables and procedure steps are not split mid-word.
+    """
+    text = text.strip()
+    chunks = []
+    start = 0
+    while start < len(text):
+        end = min(len(text), start + chunk_size)
+        if end < len(text):
+            window_start = start + chunk_size // 2
+            for sep in ("\n\n", "\n", " "):
+                cut = text.rfind(sep, window_start, end)
+                if cut > start:
+                    end = cut
+                    break
+        chunk = text[start:end].strip()
+        if chunk:
+            chunks.append(chunk)
+        if end >= len(text):
+            break
+        start = max(end - overlap, start + 1)
+    return chunks
+
+def _load_manifest(path):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def _save_manifest(path, manifest):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, path)
+
+def default_embedding_function():
+    """chromadb's default sentence embedder (all-MiniLM-L6-v2, ONNX): what the vector index uses unless told otherwise."""
+    from chromadb.utils import embedding_functions
+    return embedding_functions.DefaultEmbeddingFunction()
+
+def initialize_knowledge_base(folder_path=KB_FOLDER, collection_name="michael_docs", index_dir=INDEX_DIR,
+                              chunk_size=CHUNK_SIZE, overlap=CHUNK_OVERLAP, batch_size=ADD_BATCH_SIZE,
+                              embedding_function=None):
+    """
+    Open (or build) the persistent knowledge-base index and bring it up to date.
+    Only files whose size/mtime changed are re-read, and only files whose content
+    hash changed are re-chunked and re-embedded. Deleted files are removed.
+    """
+    import chromadb  # heavy (embedding model); only needed for the vector index
+
+    start = time.perf_counter()
+    os.makedirs(index_dir, exist_ok=True)
+    client = chromadb.PersistentClient(path=index_dir)
+
+    def open_collection():
+        if embedding_function is not None:
+            return client.get_or_create_collection(collection_name, embedding_function=embedding_function)
+        return client.get_or_create_collection(collection_name)
+
+    collection = open_collection()
+    manifest_path = os.path.join(index_dir, f"{collection_name}.manifest.json")
+    manifest = _load_manifest(manifest_path)
+    params = {"chunk_size": chunk_size, "overlap": overlap}
+    if manifest.get("params") != params:
+        # First run, lost manifest or new chunking: rebuild from an empty collection
+        if collection.count():
+            client.delete_collection(collection_name)
+            collection = open_collection()
+        manifest = {"params": params, "files": {}}
+    files = manifest["files"]
+
+    indexed = skipped = chunk_count = 0
+    seen = set()
+    for filename in sorted(os.listdir(folder_path)):
+        if not (filename.endswith(".txt") or filename.endswith(".md")):
+            continue
+        seen.add(filename)
+        path = os.path.join(folder_path, filename)
+        stat = os.stat(path)
+        entry = files.get(filename)
+        if entry and entry["mtime"] == stat.st_mtime and entry["size"] == stat.st_size:
+            skipped += 1
+            continue
+
+        with open(path, "r", encoding="utf-8") as f:
+            text = f.read()
+        digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        if entry and entry["sha256"] == digest:
+            entry.update(mtime=stat.st_mtime, size=stat.st_size)  # touched, not changed
+            skipped += 1
+            continue
+
+        if entry:
+            collection.delete(where={"source": filename})
+        chunks = chunk_text(text, chunk_size, overlap)
+        for i in range(0, len(chunks), batch_size):
+            batch = chunks[i:i + batch_size]
             collection.add(
-                documents=[text],
-                ids=[filename]
+                documents=batch,
+                ids=[f"{filename}::{i + j}" for j in range(len(batch))],
+                metadatas=[{"source": filename, "chunk": i + j} for j in range(len(batch))]
             )
+        files[filename] = {"mtime": stat.st_mtime, "size": stat.st_size, "sha256": digest, "chunks": len(chunks)}
+        indexed += 1
+        chunk_count += len(chunks)
+
+    for filename in list(files):
+        if filename not in seen:
+            collection.delete(where={"source": filename})
+            del files[filename]
+
+    _save_manifest(manifest_path, manifest)
+    elapsed = time.perf_counter() - start
+    print(f"[KB] {indexed} file(s) indexed ({chunk_count} chunks), {skipped} unchanged, "
+          f"{collection.count()} chunks total in {elapsed:.2f}s")
     return collection
 
+def load_lexical_index(folder_path=KB_FOLDER, index_path=LEXICAL_INDEX_PATH,
+                       chunk_size=CHUNK_SIZE, overlap=CHUNK_OVERLAP):
+    """
+    Open the memory-mapped BM25 index for `folder_path`, rebuilding it first if any
+    file was added, removed or modified (BM25 statistics are corpus-wide, and a
+    rebuild is only tokenizing, no embedding model).
+    """
+    files = {}
+    for filename in sorted(os.listdir(folder_path)):
+        if filename.endswith(".txt") or filename.endswith(".md"):
+            stat = os.stat(os.path.join(folder_path, filename))
+            files[filename] = [stat.st_size, stat.st_mtime]
+    params = {"chunk_size": chunk_size, "overlap": overlap}
+
+    if os.path.exists(index_path):
+        try:
+            index = LexicalIndex(index_path)
+            if index.files == files and index.params == params:
+                return LexicalRetriever(index)
+            index.close()
+        except (OSError, ValueError) as e:
+            print(f"[KB] lexical index unreadable, rebuilding: {e}")
+
+    start = time.perf_counter()
+    chunks, ids, sources = [], [], []
+    for filename in files:
+        with open(os.path.join(folder_path, filename), "r", encoding="utf-8") as f:
+            for i, chunk in enumerate(chunk_text(f.read(), chunk_size, overlap)):
+                chunks.append(chunk)
+                ids.append(f"{filename}::{i}")
+                sources.append(filename)
+    build_index(index_path, chunks, ids, sources, files=files, params=params)
+    print(f"[KB] lexical index built: {len(files)} file(s), {len(chunks)} chunks in {time.perf_counter() - start:.2f}s")
+    return LexicalRetriever(LexicalIndex(index_path))
+
+# ---------- Retrievers ---------- #
+class Retriever:
+    """
+    Pluggable knowledge-base lookup. search() returns hits best-first:
+    [{"id": "vat_rules.txt::3", "text": "...", "source": "vat_rules.txt", "score": 1.7}, ...]
+    """
+
+    def search(self, query_text, top_k=3):
+        raise NotImplementedError
+
+class LexicalRetriever(Retriever):
+    """BM25 over the memory-mapped lexical index: no model load, sub-millisecond lookups."""
+
+    def __init__(self, index):
+        self.index = index
+
+    def search(self, query_text, top_k=3):
+        return [
+            {"id": self.index.ids[doc], "text": self.index.text(doc), "source": self.index.sources[doc], "score": score}
+            for doc, score in self.index.search(query_text, top_k)
+        ]
+
+class ChromaRetriever(Retriever):
+    """Embedding search through a chromadb collection (see initialize_knowledge_base)."""
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    def search(self, query_text, top_k=3):
+        results = self.collection.query(query_texts=[query_text], n_results=top_k)
+        if not results or not results["ids"]:
+            return []
+        ids = results["ids"][0]
+        documents = results["documents"][0]
+        metadatas = (results.get("metadatas") or [[{}] * len(ids)])[0]
+        distances = (results.get("distances") or [[0.0] * len(ids)])[0]
+        return [
+            {"id": id_, "text": doc, "source": (meta or {}).get("source", id_.split("::")[0]),
+             "score": 1.0 / (1.0 + distance)}
+            for id_, doc, meta, distance in zip(ids, documents, metadatas, distances)
+        ]
+
+class HybridRetriever(Retriever):
+    """Reciprocal-rank fusion of a lexical and a vector retriever (chunk IDs are shared)."""
+
+    def __init__(self, lexical, vector, candidates=10, rrf_k=60):
+        self.lexical = lexical
+        self.vector = vector
+        self.candidates = candidates
+        self.rrf_k = rrf_k
+
+    def search(self, query_text, top_k=3):
+        fused = {}
+        for retriever in (self.lexical, self.vector):
+            for rank, hit in enumerate(retriever.search(query_text, max(top_k, self.candidates))):
+                entry = fused.setdefault(hit["id"], dict(hit, score=0.0))
+                entry["score"] += 1.0 / (self.rrf_k + rank + 1)
+        return sorted(fused.values(), key=lambda hit: hit["score"], reverse=True)[:top_k]
+
+def create_retriever(folder_path=KB_FOLDER, backend="lexical", **kwargs):
+    """
+    backend:
+      "lexical" - BM25 only (default; no chromadb import)
+      "chroma"  - embedding search only
+      "hybrid"  - BM25 + embeddings fused, falls back to lexical if chromadb is unavailable
+    """
+    if backend == "lexical":
+        return load_lexical_index(folder_path)
+    if backend == "chroma":
+        return ChromaRetriever(initialize_knowledge_base(folder_path, **kwargs))
+    if backend == "hybrid":
+        lexical = load_lexical_index(folder_path)
+        try:
+            return HybridRetriever(lexical, ChromaRetriever(initialize_knowledge_base(folder_path, **kwargs)))
+        except Exception as e:
+            print(f"[KB] vector index unavailable ({e}); using lexical retrieval only")
+            return lexical
+    raise ValueError(f"unknown retriever backend {backend!r}")
+
 def query_knowledge(collection, query_text, top_k=3):
+    """`collection` may be a Retriever or a raw chromadb collection."""
+    if isinstance(collection, Retriever):
+        return [hit["text"] for hit in collection.search(query_text, top_k)]
     results = collection.query(
         query_texts=[query_text],
         n_results=top_k
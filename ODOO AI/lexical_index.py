@@ -0,0 +1,156 @@
+import os
+import re
+import json
+import math
+import mmap
+import heapq
+import struct
+from array import array
+from collections import Counter, defaultdict
+
+# On-disk layout (little-endian), designed to be memory-mapped:
+#   b"KBLX1\0" | uint32 header length | JSON header | 4 x (uint64 offset, uint64 length)
+#   then 8-byte aligned sections, located by that table:
+#     doc_ids    uint32 per posting  (postings grouped by term; the header maps term -> [start, count])
+#     weights    float32 per posting (precomputed BM25 term-frequency part)
+#     text_offs  uint32 per chunk + 1 (byte offsets into the text blob)
+#     text       utf-8 chunk texts
+MAGIC = b"KBLX1\0"
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def tokenize(text):
+    return TOKEN_RE.findall(text.lower())
+
+
+def build_index(path, chunks, ids, sources, files=None, params=None, k1=1.2, b=0.75):
+    """Write a BM25 index for `chunks` (parallel lists `ids`/`sources`) to `path`."""
+    term_freqs = [Counter(tokenize(chunk)) for chunk in chunks]
+    lengths = [sum(tf.values()) for tf in term_freqs]
+    avgdl = (sum(lengths) / len(lengths)) if lengths else 0.0
+
+    postings = defaultdict(list)
+    for doc, tf in enumerate(term_freqs):
+        norm = k1 * (1 - b + b * (lengths[doc] / avgdl if avgdl else 0.0))
+        for term, freq in tf.items():
+            postings[term].append((doc, freq * (k1 + 1) / (freq + norm)))
+
+    doc_ids = array("I")
+    weights = array("f")
+    terms = {}
+    for term in sorted(postings):
+        entries = postings[term]
+        terms[term] = [len(doc_ids), len(entries)]
+        for doc, weight in entries:
+            doc_ids.append(doc)
+            weights.append(weight)
+
+    blob = bytearray()
+    text_offs = array("I", [0])
+    for chunk in chunks:
+        blob += chunk.encode("utf-8")
+        text_offs.append(len(blob))
+
+    header = {
+        "n_docs": len(chunks),
+        "avgdl": avgdl,
+        "k1": k1,
+        "b": b,
+        "ids": list(ids),
+        "sources": list(sources),
+        "terms": terms,
+        "files": files or {},
+        "params": params or {},
+    }
+    header_bytes = json.dumps(header, separators=(",", ":")).encode("utf-8")
+    sections = [doc_ids.tobytes(), weights.tobytes(), text_offs.tobytes(), bytes(blob)]
+
+    prefix = len(MAGIC) + 4 + len(header_bytes)
+    # Section table: 4 x (offset, length) uint64 right after the header, then aligned data
+    table_size = 4 * 16
+    offset = _align(prefix + table_size)
+    table = []
+    for data in sections:
+        table.append((offset, len(data)))
+        offset = _align(offset + len(data))
+
+    tmp_path = path + ".tmp"
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(tmp_path, "wb") as f:
+        f.write(MAGIC)
+        f.write(struct.pack("<I", len(header_bytes)))
+        f.write(header_bytes)
+        for section_offset, length in table:
+            f.write(struct.pack("<QQ", section_offset, length))
+        for (section_offset, _), data in zip(table, sections):
+            f.write(b"\0" * (section_offset - f.tell()))
+            f.write(data)
+    os.replace(tmp_path, path)
+
+
+def _align(offset, to=8):
+    return (offset + to - 1) // to * to
+
+
+class LexicalIndex:
+    """
+    Read-only BM25 index over a memory-mapped file written by `build_index`.
+    Postings and chunk texts stay in the page cache; only the term dictionary
+    is parsed into memory.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, "rb")
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mmap[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} is not a lexical index")
+        (header_len,) = struct.unpack_from("<I", self._mmap, len(MAGIC))
+        header_start = len(MAGIC) + 4
+        header = json.loads(self._mmap[header_start:header_start + header_len])
+        self.n_docs = header["n_docs"]
+        self.ids = header["ids"]
+        self.sources = header["sources"]
+        self.terms = header["terms"]
+        self.files = header["files"]
+        self.params = header["params"]
+
+        table_start = header_start + header_len
+        view = memoryview(self._mmap)
+        sections = []
+        for i in range(4):
+            offset, length = struct.unpack_from("<QQ", self._mmap, table_start + i * 16)
+            sections.append(view[offset:offset + length])
+        self._doc_ids = sections[0].cast("I")
+        self._weights = sections[1].cast("f")
+        self._text_offs = sections[2].cast("I")
+        self._text = sections[3]
+        self._views = [self._doc_ids, self._weights, self._text_offs] + sections + [view]
+
+        self._idf = {}
+        for term, (_, count) in self.terms.items():
+            self._idf[term] = math.log(1 + (self.n_docs - count + 0.5) / (count + 0.5))
+
+    def text(self, doc):
+        return bytes(self._text[self._text_offs[doc]:self._text_offs[doc + 1]]).decode("utf-8")
+
+    def search(self, query_text, top_k=3):
+        """Returns [(doc, score), ...] best first."""
+        scores = defaultdict(float)
+        for term in set(tokenize(query_text)):
+            entry = self.terms.get(term)
+            if entry is None:
+                continue
+            start, count = entry
+            idf = self._idf[term]
+            doc_ids = self._doc_ids[start:start + count]
+            weights = self._weights[start:start + count]
+            for doc, weight in zip(doc_ids, weights):
+                scores[doc] += idf * weight
+        return heapq.nlargest(top_k, scores.items(), key=lambda item: item[1])
+
+    def close(self):
+        for view in self._views:
+            view.release()
+        self._mmap.close()
+        self._file.close()
@@ -0,0 +1,317 @@
+import time
+import threading
+
+# Gateway modes:
+#   "sequential" - primary first, fallback only after the primary fails or comes back empty
+#   "hedged"     - fallback also starts if the primary has produced no text after `hedge_delay` seconds
+#   "parallel"   - primary and fallback start together
+# In every mode the first attempt to produce text wins and the other one is cancelled.
+# A winner whose stream fails mid-reply is dropped with its partial text, and the
+# other model is requested (again).
+MODES = ("sequential", "hedged", "parallel")
+
+
+class CancelToken:
+    """Lets another thread abandon an in-flight gateway call (e.g. a superseded chat request)."""
+
+    def __init__(self):
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._callbacks = []
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def cancel(self):
+        with self._lock:
+            if self._event.is_set():
+                return
+            self._event.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            callback()
+
+    def on_cancel(self, callback):
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+                return
+        callback()
+
+
+class ModelReply:
+    """Outcome of one gateway call."""
+
+    def __init__(self, text, model, latency, attempts, errors, timed_out=False, cancelled=False, timings=None,
+                 response_id=None, usage=None):
+        self.text = text
+        self.model = model  # model that produced `text` (None if nothing did)
+        self.latency = latency  # seconds from call start to return
+        self.attempts = attempts  # models that were actually requested, in launch order
+        self.errors = errors  # {model: exception}
+        self.timed_out = timed_out
+        self.cancelled = cancelled
+        # Winner's milestones in seconds from call start: "headers" (response
+        # headers received), "first_delta" (first text) and "done" (stream finished)
+        self.timings = timings or {}
+        self.response_id = response_id  # winner's response ID, for previous_response_id chaining
+        self.usage = usage or {}  # winner's {"input_tokens": n, "output_tokens": n} when reported
+
+    def __bool__(self):
+        return bool(self.text)
+
+    def __repr__(self):
+        return f"ModelReply(model={self.model!r}, latency={self.latency:.3f}, attempts={self.attempts}, text={self.text[:40]!r})"
+
+
+class _Race:
+    """Shared state between one call and its attempt threads."""
+
+    def __init__(self, on_delta):
+        self.cond = threading.Condition()
+        self.on_delta = on_delta
+        self.start = time.monotonic()
+        self.timings = {}  # model -> {"headers": s, "first_delta": s, "done": s}
+        self.response_ids = {}  # model -> response ID
+        self.usage = {}  # model -> {"input_tokens": n, "output_tokens": n}
+        self.winner = None
+        self.finished = {}  # model -> text ("" if the attempt failed)
+        self.errors = {}
+        self.launched = []
+        self.streams = {}
+        self.cancelled = set()
+
+    def claim(self, model) -> bool:
+        """First attempt to produce text becomes the winner; everyone else is cancelled."""
+        with self.cond:
+            if self.winner is None:
+                self.winner = model
+                for other in list(self.streams):
+                    if other != model:
+                        self._cancel(other)
+            return self.winner == model
+
+    def fail_winner(self):
+        """The winner's stream broke after its first delta: drop it and its partial text."""
+        self.winner = None
+
+    def reset(self, model):
+        """Forget a cancelled attempt so the model can be requested again."""
+        for state in (self.finished, self.timings, self.response_ids, self.usage, self.errors):
+            state.pop(model, None)
+        self.cancelled.discard(model)
+        self.launched.remove(model)
+
+    def cancel_all(self):
+        """Cancel every attempt that is still running (used once the call has returned)."""
+        with self.cond:
+            for model in self.launched:
+                if model not in self.finished:
+                    self._cancel(model)
+
+    def _cancel(self, model):
+        self.cancelled.add(model)
+        stream = self.streams.pop(model, None)
+        if stream is not None:
+            try:
+                stream.close()  # aborts the HTTP response; the attempt thread unblocks
+            except Exception:
+                pass
+
+
+class ModelGateway:
+    """
+    Single entry point for Responses API calls: primary/fallback selection,
+    hedging and per-call deadlines.
+
+    Every attempt is streamed internally so a losing attempt can be cancelled by
+    closing its HTTP response. Pass `on_delta` to also receive the winner's text
+    deltas as they arrive; `on_delta(None)` means the winner's stream failed and
+    the text received so far must be discarded (the next model's deltas follow).
+    """
+
+    def __init__(self, client, primary_model, fallback_model=None, mode="hedged", hedge_delay=2.5, deadline=None):
+        if mode not in MODES:
+            raise ValueError(f"unknown gateway mode {mode!r}, expected one of {MODES}")
+        self.client = client
+        self.primary_model = primary_model
+        self.fallback_model = fallback_model
+        self.mode = mode
+        self.hedge_delay = hedge_delay
+        self.deadline = deadline
+        self._stats_lock = threading.Lock()
+        self.stats = {"calls": 0, "primary_wins": 0, "fallback_wins": 0, "empty": 0, "hedges": 0, "timeouts": 0,
+                      "cancelled": 0}
+
+    def call(self, request_input, max_output_tokens=None, on_delta=None, mode=None, hedge_delay=None,
+             deadline=None, primary_model=None, fallback_model=None, cancel=None,
+             previous_response_id=None) -> ModelReply:
+        mode = mode or self.mode
+        if mode not in MODES:
+            raise ValueError(f"unknown gateway mode {mode!r}, expected one of {MODES}")
+        hedge_delay = self.hedge_delay if hedge_delay is None else hedge_delay
+        deadline = self.deadline if deadline is None else deadline
+        primary = primary_model or self.primary_model
+        fallback = fallback_model or self.fallback_model
+        if fallback == primary:
+            fallback = None
+
+        race = _Race(on_delta)
+        start = race.start
+        deadline_at = start + deadline if deadline else None
+        if mode == "parallel":
+            hedge_at = start
+        elif mode == "hedged":
+            hedge_at = start + hedge_delay
+        else:
+            hedge_at = None
+
+        launched = race.launched
+
+        def launch(model):
+            launched.append(model)
+            timeout = max(0.001, deadline_at - time.monotonic()) if deadline_at else None
+            threading.Thread(
+                target=self._attempt,
+                args=(race, model, request_input, max_output_tokens, timeout, previous_response_id),
+                daemon=True
+            ).start()
+
+        if cancel is not None:
+            def wake():
+                with race.cond:
+                    race.cond.notify_all()
+            cancel.on_cancel(wake)
+
+        launch(primary)
+        timed_out = False
+        with race.cond:
+            while True:
+                if cancel is not None and cancel.cancelled:
+                    break
+                if race.winner is not None and race.winner in race.finished:
+                    if race.winner not in race.errors:
+                        break
+                    race.fail_winner()
+                if race.winner is None:
+                    # Attempts cancelled by a winner that then failed get another chance
+                    for model in [m for m in launched if m in race.cancelled and m in race.finished]:
+                        race.reset(model)
+                        launch(model)
+                primary_done = primary in race.finished
+                if fallback and fallback not in launched and race.winner is None:
+                    if primary_done or (hedge_at is not None and time.monotonic() >= hedge_at):
+                        launch(fallback)
+                        continue
+                if race.winner is None and all(m in race.finished for m in launched) \
+                        and (not fallback or fallback in launched):
+                    break
+
+                now = time.monotonic()
+                if deadline_at is not None and now >= deadline_at:
+                    timed_out = True
+                    break
+                wake_at = [t for t in (deadline_at,) if t is not None]
+                if fallback and fallback not in launched and hedge_at is not None:
+                    wake_at.append(hedge_at)
+                race.cond.wait(timeout=(min(wake_at) - now) if wake_at else None)
+
+            winner = race.winner
+            text = race.finished.get(winner, "") if winner else ""
+            if winner and winner not in race.finished:
+                text = ""  # winner started streaming but did not finish (deadline or cancel)
+            errors = dict(race.errors)
+
+        race.cancel_all()
+        cancelled = cancel is not None and cancel.cancelled
+        if cancelled:
+            text = ""
+        if text:
+            reply = ModelReply(text, winner, time.monotonic() - start, launched, errors, timed_out, cancelled,
+                               dict(race.timings.get(winner, {})), race.response_ids.get(winner),
+                               race.usage.get(winner))
+        else:
+            reply = ModelReply(text, None, time.monotonic() - start, launched, errors, timed_out, cancelled)
+        self._record(reply, primary)
+        return reply
+
+    def _attempt(self, race, model, request_input, max_output_tokens, timeout, previous_response_id=None):
+        parts = []
+        error = None
+        ended = False  # saw response.completed / response.incomplete
+        try:
+            kwargs = {"model": model, "input": request_input, "stream": True}
+            if previous_response_id:
+                kwargs["previous_response_id"] = previous_response_id
+            if max_output_tokens:
+                kwargs["max_output_tokens"] = max_output_tokens
+            if timeout is not None:
+                kwargs["timeout"] = timeout
+            stream = self.client.responses.create(**kwargs)
+            timings = race.timings.setdefault(model, {})
+            timings["headers"] = time.monotonic() - race.start
+            with race.cond:
+                lost = model in race.cancelled or (race.winner is not None and race.winner != model)
+                if lost:
+                    race.cancelled.add(model)
+                else:
+                    race.streams[model] = stream
+            try:
+                for event in (() if lost else stream):
+                    event_type = getattr(event, "type", "")
+                    if event_type == "response.output_text.delta":
+                        delta = getattr(event, "delta", "")
+                        if not delta:
+                            continue
+                        if not race.claim(model):
+                            break
+                        if not parts:
+                            timings["first_delta"] = time.monotonic() - race.start
+                        parts.append(delta)
+                        if race.on_delta:
+                            race.on_delta(delta)
+                    elif event_type in ("response.created", "response.completed", "response.incomplete"):
+                        ended = ended or event_type != "response.created"
+                        response = getattr(event, "response", None)
+                        if response is not None:
+                            race.response_ids[model] = getattr(response, "id", None)
+                            usage = getattr(response, "usage", None)
+                            if usage is not None:
+                                race.usage[model] = {"input_tokens": getattr(usage, "input_tokens", 0),
+                                                     "output_tokens": getattr(usage, "output_tokens", 0)}
+                    elif event_type in ("response.failed", "error"):
+                        raise RuntimeError(f"stream {event_type} from {model}")
+                if parts and not ended and race.winner == model and model not in race.cancelled:
+                    raise ConnectionError(f"stream from {model} ended mid-reply")
+            finally:
+                with race.cond:
+                    race.streams.pop(model, None)
+                stream.close()
+        except Exception as e:
+            if model not in race.cancelled:
+                error = e
+        if error is not None and parts and race.on_delta:
+            race.on_delta(None)  # before finished is set, so it precedes the next model's deltas
+        with race.cond:
+            race.timings.setdefault(model, {})["done"] = time.monotonic() - race.start
+            race.finished[model] = "" if error is not None else "".join(parts).strip()
+            if error is not None:
+                race.errors[model] = error
+            race.cond.notify_all()
+
+    def _record(self, reply, primary):
+        with self._stats_lock:
+            self.stats["calls"] += 1
+            if len(reply.attempts) > 1:
+                self.stats["hedges"] += 1
+            if reply.timed_out:
+                self.stats["timeouts"] += 1
+            if reply.cancelled:
+                self.stats["cancelled"] += 1
+            elif not reply.text:
+                self.stats["empty"] += 1
+            elif reply.model == primary:
+                self.stats["primary_wins"] += 1
+            else:
+                self.stats["fallback_wins"] += 1
@@ -0,0 +1,110 @@
+import os
+import time
+import json
+import hashlib
+import sqlite3
+import threading
+from collections import OrderedDict
+
+from image_store import frame_digest
+
+
+def make_cache_key(img, window_title, prompt, model) -> str:
+    """
+    Key = exact pixel digest of the frame + active window title + prompt text + model name.
+    Not the perceptual dHash: two records with the same layout but different
+    figures hash alike, and would be served each other's observation.
+    """
+    raw = json.dumps([frame_digest(img), window_title, prompt, model], ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class ObservationCache:
+    """
+    Two-level cache for model replies.
+    - Memory: bounded LRU (OrderedDict), entries expire after `ttl_seconds`
+    - Disk: sqlite file next to the app, so revisited screens survive restarts
+
+    Every put is written through to disk; a disk hit is promoted back into memory.
+    """
+
+    def __init__(self, path, max_entries=256, ttl_seconds=24 * 3600, max_disk_entries=5000):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.max_disk_entries = max_disk_entries
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._memory = OrderedDict()  # key -> (created, value)
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, value TEXT NOT NULL, created REAL NOT NULL)"
+        )
+        self._db.execute("DELETE FROM entries WHERE created < ?", (time.time() - ttl_seconds,))
+        self._db.commit()
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                created, value = entry
+                if now - created <= self.ttl_seconds:
+                    self._memory.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._memory[key]
+
+            row = self._db.execute("SELECT value, created FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is not None and now - row[1] <= self.ttl_seconds:
+                self._remember(key, row[1], row[0])
+                self.hits += 1
+                self.disk_hits += 1
+                return row[0]
+
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        if not value:
+            return
+        now = time.time()
+        with self._lock:
+            self._remember(key, now, value)
+            try:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO entries (key, value, created) VALUES (?, ?, ?)", (key, value, now)
+                )
+                self._db.execute(
+                    "DELETE FROM entries WHERE key NOT IN "
+                    "(SELECT key FROM entries ORDER BY created DESC LIMIT ?)",
+                    (self.max_disk_entries,)
+                )
+                self._db.commit()
+            except sqlite3.Error as e:
+                print(f"[CACHE] disk write failed: {e}")
+
+    def _remember(self, key, created, value):
+        self._memory[key] = (created, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits / total) if total else 0.0,
+                "memory_entries": len(self._memory),
+            }
+
+    def close(self):
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,209 @@
+import sys
+import time
+import ctypes
+import ctypes.util
+import threading
+from collections import deque
+
+
+# ---------- Keyboard / mouse idle time ---------- #
+class InputIdleMonitor:
+    """
+    Seconds since the last keyboard or mouse input anywhere on the desktop.
+    Windows: GetLastInputInfo; X11: the MIT-SCREEN-SAVER extension (libXss).
+    `seconds()` returns None when neither is available.
+    """
+
+    def __init__(self):
+        self._query = None
+        self._ready = False
+
+    def seconds(self):
+        if not self._ready:
+            self._ready = True
+            try:
+                self._query = self._windows() if sys.platform == "win32" else self._x11()
+            except Exception as e:
+                print(f"[CADENCE] input idle time unavailable: {e}")
+        if self._query is None:
+            return None
+        try:
+            return self._query()
+        except Exception:
+            return None
+
+    @staticmethod
+    def _windows():
+        class LASTINPUTINFO(ctypes.Structure):
+            _fields_ = [("cbSize", ctypes.c_uint), ("dwTime", ctypes.c_uint)]
+
+        user32, kernel32 = ctypes.windll.user32, ctypes.windll.kernel32
+        kernel32.GetTickCount.restype = ctypes.c_uint
+        info = LASTINPUTINFO(cbSize=ctypes.sizeof(LASTINPUTINFO))
+
+        def query():
+            if not user32.GetLastInputInfo(ctypes.byref(info)):
+                return None
+            return ((kernel32.GetTickCount() - info.dwTime) & 0xFFFFFFFF) / 1000.0
+        return query
+
+    @staticmethod
+    def _x11():
+        class XScreenSaverInfo(ctypes.Structure):
+            _fields_ = [("window", ctypes.c_ulong), ("state", ctypes.c_int), ("kind", ctypes.c_int),
+                        ("til_or_since", ctypes.c_ulong), ("idle", ctypes.c_ulong),
+                        ("eventMask", ctypes.c_ulong)]
+
+        xlib_path, xss_path = ctypes.util.find_library("X11"), ctypes.util.find_library("Xss")
+        if not xlib_path or not xss_path:
+            return None
+        xlib, xss = ctypes.CDLL(xlib_path), ctypes.CDLL(xss_path)
+        xlib.XOpenDisplay.restype = ctypes.c_void_p
+        xlib.XDefaultRootWindow.argtypes = [ctypes.c_void_p]
+        xlib.XDefaultRootWindow.restype = ctypes.c_ulong
+        xss.XScreenSaverAllocInfo.restype = ctypes.POINTER(XScreenSaverInfo)
+        xss.XScreenSaverQueryInfo.argtypes = [ctypes.c_void_p, ctypes.c_ulong, ctypes.POINTER(XScreenSaverInfo)]
+        display = xlib.XOpenDisplay(None)
+        if not display:
+            return None
+        root = xlib.XDefaultRootWindow(display)
+        info = xss.XScreenSaverAllocInfo()
+        lock = threading.Lock()  # one Xlib display connection, queried from several threads
+
+        def query():
+            with lock:
+                if not xss.XScreenSaverQueryInfo(display, root, info):
+                    return None
+                return info.contents.idle / 1000.0
+        return query
+
+
+# ---------- Cadence ---------- #
+class AdaptiveCadence:
+    """
+    Picks the delay before the next background observation, and its image detail.
+
+    Signals (a missing one counts as neutral):
+    - screen activity: `note_frame(changed)` after every capture check
+    - keyboard/mouse idle time: the `idle_seconds()` callable (e.g. InputIdleMonitor().seconds)
+    - model health: `note_reply(latency, ok, tokens)` after every model call
+
+    Starting from base_interval:
+    - active editing (input within `active_within` s, screen changing) shortens it towards min_interval
+    - it doubles for every `idle_after` seconds without input, for every unchanged
+      check in a row (while not active) and for every failed call in a row;
+      replies slower than `slow_latency` stretch it proportionally
+    - the result is clamped to [min_interval, max_interval]
+
+    Per-seat budget: at most `calls_per_hour` model calls and `tokens_per_hour`
+    tokens in any rolling hour (chat replies report health but are not billed
+    here). Past half the budget, calls are spread evenly over the hour; once it
+    is spent, the next observation waits until the oldest call ages out.
+    Frames go out at low detail while backing off or past 75% of the budget.
+    """
+
+    def __init__(self, base_interval=30, min_interval=10, max_interval=600, idle_seconds=None, idle_after=120,
+                 active_within=30, slow_latency=8.0, calls_per_hour=None, tokens_per_hour=None):
+        self.base_interval = base_interval
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.idle_seconds = idle_seconds
+        self.idle_after = idle_after
+        self.active_within = active_within
+        self.slow_latency = slow_latency
+        self.calls_per_hour = calls_per_hour
+        self.tokens_per_hour = tokens_per_hour
+        self.change_rate = 0.5  # EWMA of "frame changed" per check
+        self.unchanged_streak = 0
+        self.error_streak = 0
+        self.latency = None  # EWMA of model latency, seconds
+        self.stats = {"frames": 0, "calls": 0, "failures": 0}
+        self._calls = deque()  # (monotonic time, tokens) of billed calls in the last hour
+        self._lock = threading.Lock()
+
+    def note_frame(self, changed):
+        with self._lock:
+            self.stats["frames"] += 1
+            self.change_rate = 0.7 * self.change_rate + 0.3 * (1.0 if changed else 0.0)
+            self.unchanged_streak = 0 if changed else self.unchanged_streak + 1
+
+    def note_reply(self, latency, ok, tokens=0, billable=True):
+        with self._lock:
+            self.latency = latency if self.latency is None else 0.7 * self.latency + 0.3 * latency
+            self.error_streak = 0 if ok else self.error_streak + 1
+            self.stats["failures"] += not ok
+            if billable:
+                self.stats["calls"] += 1
+                self._calls.append((time.monotonic(), tokens))
+
+    def next_interval(self):
+        """Seconds until the next observation should run."""
+        idle = self._input_idle()
+        now = time.monotonic()
+        with self._lock:
+            interval = self.base_interval
+            active = idle is not None and idle < self.active_within
+            if active:
+                interval /= 1 + 3 * self.change_rate
+            interval *= 2 ** min(10, self._backoff_steps(idle, active))
+            if self.latency and self.latency > self.slow_latency:
+                interval *= self.latency / self.slow_latency
+            interval = min(self.max_interval, max(self.min_interval, interval))
+            return max(interval, self._budget_wait(now))
+
+    def detail(self):
+        """Image detail for the next observation: "low" while backing off or near the budget, else None (default)."""
+        idle = self._input_idle()
+        now = time.monotonic()
+        with self._lock:
+            active = idle is not None and idle < self.active_within
+            if self._backoff_steps(idle, active) or self._budget_used(now) > 0.75:
+                return "low"
+            return None
+
+    def describe(self):
+        idle = self._input_idle()
+        with self._lock:
+            used = self._budget_used(time.monotonic())
+            latency = f"{self.latency:.1f}s" if self.latency is not None else "-"
+            return (f"idle={'-' if idle is None else f'{idle:.0f}s'} change={self.change_rate:.2f} "
+                    f"unchanged={self.unchanged_streak} errors={self.error_streak} latency={latency} "
+                    f"budget={used:.0%}")
+
+    def _input_idle(self):
+        return self.idle_seconds() if self.idle_seconds else None
+
+    def _backoff_steps(self, idle, active):
+        """Number of interval doublings; caller holds the lock."""
+        steps = self.error_streak
+        if idle is not None and idle >= self.idle_after:
+            steps += int(idle // self.idle_after)
+        if not active:
+            steps += min(4, self.unchanged_streak)
+        return steps
+
+    def _budget_used(self, now):
+        """Largest used fraction of the hourly call / token budgets; caller holds the lock."""
+        while self._calls and now - self._calls[0][0] > 3600:
+            self._calls.popleft()
+        used = 0.0
+        if self.calls_per_hour:
+            used = len(self._calls) / self.calls_per_hour
+        if self.tokens_per_hour:
+            used = max(used, sum(tokens for _, tokens in self._calls) / self.tokens_per_hour)
+        return used
+
+    def _budget_wait(self, now):
+        """Minimum delay the hourly budget imposes; caller holds the lock."""
+        used = self._budget_used(now)
+        if used >= 1.0:
+            return self._calls[0][0] + 3600 - now
+        if used <= 0.5:
+            return 0.0
+        pace = 0.0
+        if self.calls_per_hour:
+            pace = 3600 / self.calls_per_hour
+        if self.tokens_per_hour and self._calls:
+            average = sum(tokens for _, tokens in self._calls) / len(self._calls)
+            pace = max(pace, 3600 * average / self.tokens_per_hour)
+        return pace
@@ -0,0 +1,158 @@
+import time
+import queue
+import threading
+
+
+class ObservationScheduler:
+    """
+    Owns all capture + model work for background observations on ONE worker thread.
+
+    - Timers (`every`) and manual `trigger` calls only *request* an observation
+    - Requests that arrive while one is pending or in flight are coalesced into it
+      (single-flight: never two captures/model calls for the same moment)
+    - Results go into `results` (a bounded, thread-safe queue); `notify` is called
+      after each put so the UI thread can drain it
+    - Backpressure: if the UI has not drained the previous result yet, new
+      requests are dropped instead of piling up model calls
+    - A timer interval may be a callable (e.g. AdaptiveCadence.next_interval); it is
+      re-evaluated at least every `recheck` seconds, so a shorter interval (the user
+      came back) takes effect without waiting out a long back-off
+    """
+
+    def __init__(self, job, notify=None, max_pending_results=1, recheck=5.0):
+        self.job = job  # job(reason) -> result, runs on the worker thread
+        self.notify = notify
+        self.results = queue.Queue(maxsize=max_pending_results)
+        self.stats = {"runs": 0, "coalesced": 0, "dropped": 0, "errors": 0}
+        self._cond = threading.Condition()
+        self.recheck = recheck
+        self._timers = []  # [reason, interval, predicate, next_due, last_fired]
+        self._pending = None
+        self._running = False
+        self._last_finished = float("-inf")
+        self._stopped = False
+        self._thread = None
+
+    def every(self, reason, interval, predicate=None, first_delay=None):
+        """
+        Request an observation every `interval` seconds (only when `predicate()` is true, if given).
+        `interval` may be a callable returning seconds.
+        """
+        if first_delay is None:
+            first_delay = interval() if callable(interval) else interval
+        with self._cond:
+            self._timers.append([reason, interval, predicate, time.monotonic() + first_delay, None])
+            self._cond.notify_all()
+
+    def trigger(self, reason) -> bool:
+        """Request an observation now. Returns False if it was coalesced or dropped."""
+        with self._cond:
+            accepted = self._request(reason)
+            self._cond.notify_all()
+            return accepted
+
+    def _request(self, reason) -> bool:
+        if self._pending is not None or self._running:
+            self.stats["coalesced"] += 1
+            return False
+        if self.results.full():
+            self.stats["dropped"] += 1
+            return False
+        self._pending = reason
+        return True
+
+    def cancel_pending(self):
+        """Drop a requested-but-not-started observation (e.g. because the user just asked something)."""
+        with self._cond:
+            if self._pending is not None:
+                self._pending = None
+                self.stats["dropped"] += 1
+
+    @property
+    def busy(self) -> bool:
+        with self._cond:
+            return self._running or self._pending is not None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._loop, name="observation-scheduler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+
+    def _next_reason(self):
+        """Block until there is a request to run (or the scheduler stops)."""
+        with self._cond:
+            while not self._stopped:
+                now = time.monotonic()
+                adaptive = False
+                for timer in self._timers:
+                    reason, interval, predicate, next_due, last_fired = timer
+                    if callable(interval):
+                        adaptive = True
+                        if last_fired is not None:
+                            next_due = timer[3] = min(next_due, last_fired + self._interval(timer))
+                    if next_due <= now:
+                        timer[3] = now + self._interval(timer)
+                        timer[4] = now
+                        if next_due <= self._last_finished:
+                            # Came due while an observation was in flight; that result is fresh enough
+                            self.stats["coalesced"] += 1
+                            continue
+                        try:
+                            wanted = predicate is None or predicate()
+                        except Exception as e:
+                            print(f"[SCHEDULER] predicate for {reason} failed: {e}")
+                            wanted = False
+                        if wanted:
+                            self._request(reason)
+                if self._pending is not None:
+                    reason, self._pending = self._pending, None
+                    self._running = True
+                    return reason
+                wake_at = min((t[3] for t in self._timers), default=None)
+                timeout = max(0.0, wake_at - now) if wake_at is not None else None
+                if adaptive:
+                    timeout = min(timeout, self.recheck)
+                self._cond.wait(timeout=timeout)
+            return None
+
+    @staticmethod
+    def _interval(timer):
+        interval = timer[1]
+        if not callable(interval):
+            return interval
+        try:
+            return interval()
+        except Exception as e:
+            print(f"[SCHEDULER] interval for {timer[0]} failed: {e}")
+            return 30.0
+
+    def _loop(self):
+        while True:
+            reason = self._next_reason()
+            if reason is None:
+                return
+            try:
+                result = self.job(reason)
+            except Exception as e:
+                self.stats["errors"] += 1
+                result = e
+            try:
+                self.results.put_nowait((reason, result))
+                delivered = True
+            except queue.Full:
+                delivered = False
+            with self._cond:
+                self._running = False
+                self._last_finished = time.monotonic()
+                self.stats["runs"] += 1
+                if not delivered:
+                    self.stats["dropped"] += 1
+            if delivered and self.notify:
+                try:
+                    self.notify()
+                except Exception as e:
+                    print(f"[SCHEDULER] notify failed: {e}")
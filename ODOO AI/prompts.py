@@ -0,0 +1,60 @@
+# Prompts shared by the live overlay (ODOO_AI.py) and headless batch runs (batch_analyze.py)
+
+def observation_prompt(assistant_name, window_title):
+    """One-sentence observation about a screenshot."""
+    return (
+        f"You are {assistant_name}, an accounting/Odoo assistant. You can SEE the screenshot. "
+        f"Write ONE short, concrete sentence about what is visible on the screen. "
+        f"It must be based on visible UI elements only (e.g. Odoo views, invoices, lists, code editors, filenames, buttons). "
+        f"Avoid generic advice or productivity tips. Be specific and refer to what you see. "
+        f"Active window title: '{window_title}'."
+    )
+
+def chat_system_prompt(assistant_name):
+    """System prompt for questions about the current screen image."""
+    return (
+        f"You are {assistant_name}, an intelligent on-screen assistant. "
+        f"You can SEE the user's current screen image; base your responses on what is visibly present "
+        f"(Odoo windows, invoices, code editors, filenames, UI elements, etc.) plus the user's question. "
+        f"Avoid generic coaching or vague advice like 'stay focused' or 'double-check everything' "
+        f"unless the screen truly provides no useful cues. "
+        f"Keep replies focused and concise: ideally 1–3 short sentences directly about what is on screen "
+        f"and how it relates to the user's request."
+    )
+
+def knowledge_system_prompt(assistant_name):
+    """System prompt for questions answered from knowledge-base excerpts, without a screenshot."""
+    return (
+        f"You are {assistant_name}, an accounting/Odoo helpdesk assistant. "
+        f"Answer from the company knowledge-base excerpts in the user's message. "
+        f"If they do not cover the question, say so briefly instead of guessing. "
+        f"Keep replies to 1–3 short sentences and mention the source file when you quote a rule, rate or cost."
+    )
+
+def knowledge_context(context):
+    """User-message part carrying retrieved knowledge-base chunks (see kb_router.KnowledgeRouter)."""
+    return {"type": "input_text", "text": f"Company knowledge base excerpts:\n{context}"}
+
+def text_request(text, system_prompt=None, context=None):
+    """Responses API input for a text-only turn, optionally with a system prompt and knowledge-base context."""
+    messages = []
+    if system_prompt is not None:
+        messages.append({"role": "system", "content": [{"type": "input_text", "text": system_prompt}]})
+    content = [knowledge_context(context)] if context else []
+    content.append({"type": "input_text", "text": text})
+    messages.append({"role": "user", "content": content})
+    return messages
+
+def image_request(image, text, system_prompt=None, context=None):
+    """
+    Responses API input: `text` plus one image, optionally after a system prompt.
+    `image` is an image_encoder.EncodedImage (inlined) or an image_store.ImageRef (file ID once uploaded).
+    `context` (knowledge-base excerpts) goes into the user message ahead of the question.
+    """
+    messages = []
+    if system_prompt is not None:
+        messages.append({"role": "system", "content": [{"type": "input_text", "text": system_prompt}]})
+    content = [knowledge_context(context)] if context else []
+    content += [{"type": "input_text", "text": text}, image.input_part()]
+    messages.append({"role": "user", "content": content})
+    return messages
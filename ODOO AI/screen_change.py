@@ -0,0 +1,59 @@
+import threading
+from PIL import Image, ImageChops
+
+
+def frame_fingerprint(img, size=(64, 36)):
+    """
+    Cheap downsampled fingerprint of a frame: a small grayscale thumbnail.
+    BOX filtering averages every source pixel, so a changed number in a table
+    still moves its cell even though the thumbnail is tiny.
+    """
+    return img.convert("L").resize(size, Image.BOX)
+
+
+def changed_fraction(a, b, tolerance=8) -> float:
+    """Fraction of fingerprint cells whose brightness differs by more than `tolerance`."""
+    diff = ImageChops.difference(a, b).point(lambda v: 255 if v > tolerance else 0)
+    changed = diff.histogram()[255]
+    return changed / (a.size[0] * a.size[1])
+
+
+class FrameChangeDetector:
+    """
+    Decides whether a captured frame differs enough from the last *analyzed*
+    frame to be worth a model call. The last frame is kept per `key` (e.g. the
+    monitor a frame came from), so alternating sources do not look like changes.
+
+    Usage:
+        changed, fingerprint = detector.check(img, key=monitor)
+        if changed:
+            obs = analyze_screen(img)
+            if obs:
+                detector.mark_analyzed(fingerprint, key=monitor)
+    """
+
+    def __init__(self, threshold=0.001, tolerance=8, size=(64, 36)):
+        self.threshold = threshold  # fraction of cells that may change while still "the same screen"
+        self.tolerance = tolerance  # per-cell brightness noise to ignore (0-255)
+        self.size = size
+        self.last_fingerprints = {}  # key -> fingerprint of the last analyzed frame
+        self.skipped = 0
+        self._lock = threading.Lock()
+
+    def check(self, img, key=None):
+        fingerprint = frame_fingerprint(img, self.size)
+        with self._lock:
+            last = self.last_fingerprints.get(key)
+            if last is not None and changed_fraction(fingerprint, last, self.tolerance) <= self.threshold:
+                self.skipped += 1
+                return False, fingerprint
+        return True, fingerprint
+
+    def mark_analyzed(self, fingerprint, key=None):
+        with self._lock:
+            self.last_fingerprints[key] = fingerprint
+
+    def reset(self):
+        """Forget the last analyzed frames so the next check always reports a change."""
+        with self._lock:
+            self.last_fingerprints.clear()
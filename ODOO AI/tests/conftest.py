@@ -0,0 +1,69 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_responses_api import FakeResponsesServer  # noqa: E402
+
+
+@pytest.fixture
+def fake_api():
+    """Starts fake_responses_api servers: fake_api(profiles) -> (server, base_url)."""
+    servers = []
+
+    def start(profiles=None, **kwargs):
+        server = FakeResponsesServer(seed=1, profiles=profiles or {}, **kwargs)
+        servers.append(server)
+        return server, server.start()
+
+    yield start
+    for server in servers:
+        server.stop()
+
+
+class FakeScreen:
+    """
+    Stand-in for an mss handle over a fixed monitor layout. Each monitor is a
+    BGRA NumPy buffer the test can draw into; grab() counts calls per monitor.
+    """
+
+    def __init__(self, *sizes):
+        self.monitors, left = [None], 0
+        for width, height in sizes:
+            self.monitors.append({"left": left, "top": 0, "width": width, "height": height})
+            left += width
+        self.monitors[0] = {"left": 0, "top": 0, "width": left, "height": max(h for _, h in sizes)}
+        self.pixels = [None] + [np.full((h, w, 4), 255, dtype=np.uint8) for w, h in sizes]
+        self.grabs = [0] * len(self.monitors)
+
+    def grab(self, region):
+        index = next(i for i, m in enumerate(self.monitors) if i and m["left"] <= region["left"] < m["left"] + m["width"])
+        self.grabs[index] += 1
+        monitor = self.monitors[index]
+        x, y = region["left"] - monitor["left"], region["top"] - monitor["top"]
+        pixels = self.pixels[index][y:y + region["height"], x:x + region["width"]]
+        return _Shot(pixels.tobytes(), (pixels.shape[1], pixels.shape[0]), region["left"], region["top"])
+
+    def close(self):
+        pass
+
+
+class _Shot:
+    def __init__(self, raw, size, left, top):
+        self.raw, self.size, self.left, self.top = raw, size, left, top
+
+
+@pytest.fixture
+def fake_screen(monkeypatch):
+    """fake_screen((w, h), ...) -> FakeScreen that every CaptureService thread grabs from."""
+    import capture_service
+
+    def install(*sizes):
+        screen = FakeScreen(*sizes)
+        monkeypatch.setattr(capture_service.mss, "mss", lambda: screen)
+        return screen
+
+    return install
@@ -0,0 +1,75 @@
+from PIL import Image, ImageDraw
+
+from answer_cache import SemanticAnswerCache, create_embedder
+
+TITLE = "Odoo - Customer Invoices"
+
+
+def invoice(total):
+    img = Image.new("RGB", (1024, 576), (248, 249, 250))
+    draw = ImageDraw.Draw(img)
+    draw.rectangle([0, 0, 1024, 40], fill=(113, 75, 103))
+    draw.text((40, 80), "INV/2024/00042   Acme NV", fill=(33, 37, 41))
+    draw.text((800, 500), f"Total: EUR {total}", fill=(33, 37, 41))
+    return img
+
+
+def make_cache():
+    return SemanticAnswerCache(create_embedder("hashing"))
+
+
+def test_same_screen_similar_question_hits():
+    cache = make_cache()
+    hit, probe = cache.lookup("What is the total of this invoice?", invoice("1,234.00"), TITLE)
+    assert hit is None
+    cache.put(probe, "The total is EUR 1,234.00.")
+
+    hit, _ = cache.lookup("what's the total of this invoice", invoice("1,234.00"), TITLE)
+    assert hit["answer"] == "The total is EUR 1,234.00."
+
+
+def test_one_changed_digit_misses():
+    cache = make_cache()
+    _, probe = cache.lookup("What is the total of this invoice?", invoice("1,234.00"), TITLE)
+    cache.put(probe, "The total is EUR 1,234.00.")
+
+    hit, _ = cache.lookup("What is the total of this invoice?", invoice("1,284.00"), TITLE)
+    assert hit is None
+
+
+def test_clients_on_the_same_window_keep_their_answers():
+    cache = make_cache()
+    question = "What is the total of this invoice?"
+    for client, total in (("seat-1", "1,234.00"), ("seat-2", "5,678.00")):
+        _, probe = cache.lookup(question, invoice(total), TITLE, client)
+        cache.put(probe, f"The total is EUR {total}.")
+
+    for _ in range(3):
+        for client, total in (("seat-1", "1,234.00"), ("seat-2", "5,678.00")):
+            hit, _ = cache.lookup(question, invoice(total), TITLE, client)
+            assert hit["answer"] == f"The total is EUR {total}."
+    assert cache.stats["invalidated"] == 0
+
+
+def test_client_moving_on_drops_its_old_answers():
+    cache = make_cache()
+    question = "What is the total of this invoice?"
+    _, probe = cache.lookup(question, invoice("1,234.00"), TITLE, "seat-1")
+    cache.put(probe, "The total is EUR 1,234.00.")
+
+    cache.lookup(question, invoice("1,284.00"), TITLE, "seat-1")
+    assert cache.stats["invalidated"] == 1
+    hit, _ = cache.lookup(question, invoice("1,234.00"), TITLE, "seat-1")
+    assert hit is None
+
+
+def test_answers_stay_within_their_scope():
+    cache = make_cache()
+    question = "What is the total of this invoice?"
+    _, probe = cache.lookup(question, invoice("1,234.00"), TITLE, "alice/seat", scope="alice")
+    cache.put(probe, "The total is EUR 1,234.00.")
+
+    hit, _ = cache.lookup(question, invoice("1,234.00"), TITLE, "bob/seat", scope="bob")
+    assert hit is None
+    hit, _ = cache.lookup(question, invoice("1,234.00"), TITLE, "alice/seat", scope="alice")
+    assert hit is not None
@@ -0,0 +1,49 @@
+from PIL import Image
+
+from capture_regions import MultiMonitorCapture
+from capture_service import CaptureService
+from screen_change import FrameChangeDetector
+
+
+def make_capture(fake_screen):
+    screen = fake_screen((640, 360), (640, 360))
+    service = CaptureService()
+    return screen, service, MultiMonitorCapture(service, stride=4)
+
+
+def test_focused_monitor_is_the_only_one_grabbed(fake_screen):
+    screen, service, multi = make_capture(fake_screen)
+    focused = {"left": 700, "top": 100, "width": 300, "height": 200}  # on monitor 2
+    for _ in range(3):
+        frame = multi.capture(focused)
+
+    assert frame.monitor == 2
+    assert screen.grabs[1:] == [0, 3]
+    multi.close()
+    service.close()
+
+
+def test_incidental_change_does_not_steal_the_selection(fake_screen):
+    screen, service, multi = make_capture(fake_screen)
+    assert multi.capture().monitor == 1
+
+    screen.pixels[2][0:8, 600:640, :3] = 0  # a clock ticking in a corner of monitor 2
+    assert multi.capture().monitor == 1
+
+    screen.pixels[2][:180, :, :3] = 0  # half of monitor 2 redrawn
+    assert multi.capture().monitor == 2
+    multi.close()
+    service.close()
+
+
+def test_change_detector_keeps_state_per_monitor():
+    detector = FrameChangeDetector()
+    left, right = Image.new("RGB", (640, 360), "white"), Image.new("RGB", (640, 360), "black")
+    for img, monitor in ((left, 1), (right, 2)):
+        changed, fingerprint = detector.check(img, key=monitor)
+        assert changed
+        detector.mark_analyzed(fingerprint, key=monitor)
+
+    assert detector.check(left, key=1)[0] is False
+    assert detector.check(right, key=2)[0] is False
+    assert detector.check(right, key=1)[0] is True
@@ -0,0 +1,28 @@
+from capture_service import CaptureService, central_region
+
+
+def test_ring_buffer_keeps_the_latest_frames(fake_screen):
+    fake_screen((320, 200))
+    service = CaptureService(ring_size=3)
+    frames = [service.grab() for _ in range(5)]
+
+    assert [f.seq for f in service.recent()] == [3, 4, 5]
+    assert service.latest() is frames[-1]
+    assert service.recent(seconds=-1) == []
+    service.close()
+
+
+def test_frames_convert_bgra_and_crop_without_copying(fake_screen):
+    screen = fake_screen((320, 200))
+    screen.pixels[1][:, :, :3] = (255, 0, 0)  # BGR blue
+    service = CaptureService()
+    frame = service.grab(region=central_region)
+
+    assert (frame.left, frame.top, frame.size) == (80, 50, (160, 100))
+    assert frame.to_image().getpixel((0, 0)) == (0, 0, 255)
+    assert frame.to_image(max_width=50).width == 50
+
+    crop = frame.crop(10, 20, 30, 40)
+    assert (crop.left, crop.top, crop.size) == (90, 70, (30, 40))
+    assert crop.pixels.base is frame.pixels.base
+    service.close()
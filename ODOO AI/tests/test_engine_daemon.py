@@ -0,0 +1,67 @@
+import os
+import socket
+
+import pytest
+from PIL import Image
+
+from engine import Engine
+from engine_client import EngineClient, EngineError
+from engine_daemon import EngineServer
+
+SCREEN = Image.new("RGB", (400, 300), "white")
+QUESTION = "What is on this screen?"
+
+
+@pytest.fixture
+def engine(fake_api, tmp_path):
+    _, base_url = fake_api({"*": {"latency": 0.0}})
+    engine = Engine("offline", {"OPENAI_BASE_URL": base_url, "CACHE_PATH": str(tmp_path / "cache.sqlite3"),
+                                "PRIMARY_MODEL": "primary", "FALLBACK_MODEL": "fallback",
+                                "GATEWAY_MODE": "sequential", "KB_ROUTING": False})
+    yield engine
+    engine.close()
+
+
+@pytest.fixture
+def serve(engine):
+    """serve(address, **kwargs) -> address of a running EngineServer over `engine`."""
+    servers = []
+
+    def start(address, **kwargs):
+        server = EngineServer(engine, address, **kwargs)
+        servers.append(server)
+        return server.start()
+
+    yield start
+    for server in servers:
+        server.stop()
+
+
+@pytest.mark.skipif(not hasattr(socket, "AF_UNIX"), reason="needs Unix sockets")
+def test_unix_sessions_are_scoped_to_the_peer_uid(engine, serve, tmp_path):
+    address = serve(f"unix:{tmp_path / 'engine.sock'}")
+    EngineClient(address, client_id="seat").chat(QUESTION, SCREEN, "Odoo")
+
+    assert list(engine._sessions) == [f"uid{os.getuid()}/seat"]
+
+
+@pytest.mark.parametrize("token", [None, "wrong"])
+def test_tcp_requires_a_known_token(serve, token):
+    address = serve("http://127.0.0.1:0", tokens={"alice": "token-a"})
+    with pytest.raises(EngineError, match="401"):
+        EngineClient(address, client_id="seat", token=token).observe(SCREEN, "Odoo")
+
+
+def test_users_do_not_share_sessions_or_answers(engine, serve, fake_api):
+    address = serve("http://127.0.0.1:0", tokens={"alice": "token-a", "bob": "token-b"})
+    alice = EngineClient(address, client_id="seat", token="token-a")
+    bob = EngineClient(address, client_id="seat", token="token-b")
+
+    alice.chat(QUESTION, SCREEN, "Odoo")
+    bob.end_session()  # same seat name, other user: must not end alice's session
+    assert "alice/seat" in engine._sessions
+
+    bob.chat(QUESTION, SCREEN, "Odoo")  # same screen and question as alice
+    assert engine.answer_cache.stats["hits"] == 0
+    alice.chat(QUESTION, SCREEN, "Odoo")
+    assert engine.answer_cache.stats["hits"] == 1
@@ -0,0 +1,35 @@
+import os
+
+import knowledge_manager
+from knowledge_manager import load_lexical_index
+
+
+def write(folder, name, text):
+    with open(os.path.join(folder, name), "w", encoding="utf-8") as f:
+        f.write(text)
+
+
+def test_lexical_index_finds_chunk_and_rebuilds_on_change(tmp_path):
+    folder = tmp_path / "kb"
+    folder.mkdir()
+    write(folder, "vat_rules.txt", "Intra-community supplies are exempt from VAT with reverse charge.")
+    write(folder, "payments.txt", "Register a payment from the invoice with the Register Payment button.")
+    index_path = str(tmp_path / "lexical.idx")
+
+    retriever = load_lexical_index(str(folder), index_path)
+    hits = retriever.search("reverse charge VAT", top_k=1)
+    assert hits[0]["source"] == "vat_rules.txt"
+    retriever.index.close()
+
+    write(folder, "payments.txt", "Partial payments leave the invoice In Payment until it is fully reconciled.")
+    retriever = load_lexical_index(str(folder), index_path)
+    assert retriever.search("fully reconciled", top_k=1)[0]["source"] == "payments.txt"
+    assert all("button" not in hit["text"] for hit in retriever.search("Register Payment button"))
+    retriever.index.close()
+
+
+def test_default_paths_do_not_depend_on_working_directory(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    here = os.path.dirname(os.path.abspath(knowledge_manager.__file__))
+    for path in (knowledge_manager.KB_FOLDER, knowledge_manager.INDEX_DIR, knowledge_manager.LEXICAL_INDEX_PATH):
+        assert os.path.isabs(path) and path.startswith(here)
@@ -0,0 +1,46 @@
+import pytest
+from openai import OpenAI
+
+from fake_responses_api import DEFAULT_TEXT
+from model_gateway import ModelGateway
+
+
+def make_gateway(base_url, mode):
+    client = OpenAI(api_key="fake", base_url=base_url, max_retries=0)
+    return ModelGateway(client, "primary", "fallback", mode=mode, hedge_delay=0.05, deadline=10)
+
+
+@pytest.mark.parametrize("mode", ["sequential", "hedged", "parallel"])
+def test_winner_cut_mid_reply_falls_back(fake_api, mode):
+    _, base_url = fake_api({
+        "primary": {"latency": 0.0, "token_delay": 0.02, "cut_after": 3},
+        "fallback": {"latency": 0.2, "token_delay": 0.01},
+    })
+    deltas = []
+    reply = make_gateway(base_url, mode).call("What is on screen?", on_delta=deltas.append)
+
+    assert reply.text == DEFAULT_TEXT
+    assert reply.model == "fallback"
+    assert "primary" in reply.errors
+    # The primary's partial text is retracted before the fallback's deltas arrive
+    assert None in deltas
+    last_reset = len(deltas) - 1 - deltas[::-1].index(None)
+    assert "".join(deltas[last_reset + 1:]) == DEFAULT_TEXT
+
+
+def test_cut_reply_without_fallback_is_empty(fake_api):
+    _, base_url = fake_api({"primary": {"cut_after": 3}})
+    client = OpenAI(api_key="fake", base_url=base_url, max_retries=0)
+    reply = ModelGateway(client, "primary", None, mode="sequential", deadline=10).call("What is on screen?")
+
+    assert reply.text == ""
+    assert "primary" in reply.errors
+
+
+def test_complete_reply_is_not_retracted(fake_api):
+    _, base_url = fake_api({"*": {"token_delay": 0.0}})
+    deltas = []
+    reply = make_gateway(base_url, "hedged").call("What is on screen?", on_delta=deltas.append)
+
+    assert reply.text == DEFAULT_TEXT and reply.model == "primary"
+    assert None not in deltas and reply.errors == {}
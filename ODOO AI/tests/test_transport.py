@@ -0,0 +1,82 @@
+import time
+
+import pytest
+
+from transport import CircuitBreaker, CircuitOpenError, ResilientTransport, create_http_client
+
+
+def make_breaker(changes=None, **kwargs):
+    on_change = (lambda old, new, breaker: changes.append((old, new))) if changes is not None else None
+    return CircuitBreaker(failure_threshold=3, open_seconds=0.05, max_open_seconds=0.15, on_change=on_change,
+                          **kwargs)
+
+
+def test_consecutive_failures_trip_the_breaker():
+    breaker = make_breaker()
+    for _ in range(2):
+        breaker.record(False)
+    assert breaker.state == "closed"
+    breaker.record(False)
+
+    assert breaker.state == "open"
+    assert not breaker.allow()
+    assert breaker.stats == {"trips": 1, "rejected": 1}
+    assert breaker.retry_in() > 0
+
+
+def test_successes_in_between_keep_it_closed():
+    breaker = make_breaker()
+    for _ in range(4):
+        breaker.record(False)
+        breaker.record(True)
+        breaker.record(True)
+    assert breaker.state == "closed"
+
+
+def test_half_open_lets_one_probe_through_and_closes_on_success():
+    changes = []
+    breaker = make_breaker(changes)
+    for _ in range(3):
+        breaker.record(False)
+    time.sleep(0.06)
+
+    assert breaker.allow()  # the probe
+    assert not breaker.allow()  # nothing else while it is in flight
+    breaker.record(True)
+    assert breaker.state == "closed"
+    assert breaker.allow()
+    assert changes == [("closed", "open"), ("open", "half_open"), ("half_open", "closed")]
+
+
+def test_failed_probe_reopens_with_a_longer_wait():
+    breaker = make_breaker()
+    for _ in range(3):
+        breaker.record(False)
+    for expected in (0.1, 0.15, 0.15):  # doubled, capped at max_open_seconds
+        time.sleep(breaker.open_seconds + 0.01)
+        assert breaker.allow()
+        breaker.record(False)
+        assert breaker.state == "open"
+        assert breaker.open_seconds == pytest.approx(expected)
+
+    time.sleep(breaker.open_seconds + 0.01)
+    assert breaker.allow()
+    breaker.record(True)
+    assert breaker.open_seconds == 0.05
+
+
+def test_open_breaker_stops_requests_reaching_the_api(fake_api):
+    server, base_url = fake_api({"*": {"error_rate": 1.0, "error_status": 503}})
+    transport = ResilientTransport(retries=0, breaker=CircuitBreaker(failure_threshold=2, open_seconds=60))
+    client = create_http_client(transport)
+    try:
+        for _ in range(2):
+            assert client.post(f"{base_url}/responses", json={"model": "primary"}).status_code == 503
+        with pytest.raises(CircuitOpenError):
+            client.post(f"{base_url}/responses", json={"model": "primary"})
+    finally:
+        client.close()
+
+    assert server.requests == 2
+    assert transport.stats()["breaker"] == "open"
+    assert transport.counters["rejected_open"] == 1
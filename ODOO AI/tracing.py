@@ -0,0 +1,146 @@
+import os
+import json
+import time
+import itertools
+import threading
+from collections import deque
+from contextlib import contextmanager
+
+
+def percentile(values, p):
+    """p-th percentile (0-100) of `values`, nearest rank; 0.0 when there are none. Shared by the bench scripts."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))]
+
+
+class Tracer:
+    """
+    Per-stage latency spans with rolling histograms.
+
+    - `request(kind)` opens a request context on the current thread; spans inside
+      it carry the request ID (e.g. "chat-7", "observation-12")
+    - `span(name, **attrs)` times a block, `record(name, seconds, ...)` adds a
+      duration measured elsewhere (e.g. time-to-first-byte from the gateway)
+    - Each (stage, model) keeps the last `window` durations for p50/p95/p99 plus
+      lifetime count/sum; `prometheus()` renders them as summaries
+    - With `jsonl_path`, every span is also appended there as one JSON line
+    """
+
+    def __init__(self, window=512, jsonl_path=None):
+        self.window = window
+        self.jsonl_path = jsonl_path
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._ids = itertools.count(1)
+        self._series = {}  # (stage, model) -> [deque of seconds, count, sum]
+        self._jsonl = None
+
+    @contextmanager
+    def request(self, kind, request_id=None):
+        previous = getattr(self._local, "request_id", None)
+        self._local.request_id = f"{kind}-{request_id if request_id is not None else next(self._ids)}"
+        try:
+            yield self._local.request_id
+        finally:
+            self._local.request_id = previous
+
+    @property
+    def request_id(self):
+        return getattr(self._local, "request_id", None)
+
+    @contextmanager
+    def span(self, name, **attrs):
+        start = time.perf_counter()
+        try:
+            yield attrs  # callers may add attributes (e.g. the model) inside the block
+        finally:
+            self.record(name, time.perf_counter() - start, **attrs)
+
+    def record(self, name, seconds, request_id=None, model=None, **attrs):
+        request_id = request_id or self.request_id
+        with self._lock:
+            series = self._series.get((name, model))
+            if series is None:
+                series = self._series[(name, model)] = [deque(maxlen=self.window), 0, 0.0]
+            series[0].append(seconds)
+            series[1] += 1
+            series[2] += seconds
+            if self.jsonl_path:
+                line = {"ts": round(time.time(), 3), "span": name, "ms": round(seconds * 1000, 3),
+                        "request_id": request_id}
+                if model:
+                    line["model"] = model
+                line.update(attrs)
+                self._write_jsonl(json.dumps(line, ensure_ascii=False))
+
+    def _write_jsonl(self, line):
+        if self._jsonl is None:
+            os.makedirs(os.path.dirname(self.jsonl_path) or ".", exist_ok=True)
+            self._jsonl = open(self.jsonl_path, "a", encoding="utf-8", buffering=1)
+        self._jsonl.write(line + "\n")
+
+    def snapshot(self, by_model=False):
+        """{stage: {count, p50_ms, p95_ms, p99_ms, last_ms}} over the rolling window (keys are (stage, model) if by_model)."""
+        with self._lock:
+            series = {key: (list(values), count) for key, (values, count, _) in self._series.items()}
+        merged = {}
+        for (name, model), (values, count) in series.items():
+            key = (name, model) if by_model else name
+            entry = merged.setdefault(key, [[], 0])
+            entry[0].extend(values)
+            entry[1] += count
+        result = {}
+        for key, (values, count) in merged.items():
+            ordered = sorted(values)
+            result[key] = {
+                "count": count,
+                "p50_ms": round(percentile(ordered, 50) * 1000, 1),
+                "p95_ms": round(percentile(ordered, 95) * 1000, 1),
+                "p99_ms": round(percentile(ordered, 99) * 1000, 1),
+                "last_ms": round(values[-1] * 1000, 1),
+            }
+        return result
+
+    def prometheus(self, prefix="odoo_ai_stage"):
+        """Prometheus text exposition: one summary per stage (and model), quantiles over the rolling window."""
+        with self._lock:
+            series = {key: (sorted(values), count, total) for key, (values, count, total) in self._series.items()}
+        lines = [f"# HELP {prefix}_seconds Latency per pipeline stage.", f"# TYPE {prefix}_seconds summary"]
+        for (name, model), (ordered, count, total) in sorted(series.items(), key=lambda item: (item[0][0], item[0][1] or "")):
+            labels = f'stage="{name}"' + (f',model="{model}"' if model else "")
+            for quantile in (0.5, 0.95, 0.99):
+                lines.append(f'{prefix}_seconds{{{labels},quantile="{quantile}"}} '
+                             f"{percentile(ordered, quantile * 100):.6f}")
+            lines.append(f"{prefix}_seconds_sum{{{labels}}} {total:.6f}")
+            lines.append(f"{prefix}_seconds_count{{{labels}}} {count}")
+        return "\n".join(lines) + "\n"
+
+    def export_prometheus(self, path, extra=""):
+        """Write prometheus() (plus `extra` exposition text, e.g. transport metrics) atomically to `path`."""
+        tmp_path = path + ".tmp"
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(self.prometheus() + extra)
+        os.replace(tmp_path, path)
+
+    def summary_line(self, stages):
+        """Compact 'stage p50/p95' text for the overlay HUD."""
+        snapshot = self.snapshot()
+        parts = []
+        for stage in stages:
+            stats = snapshot.get(stage)
+            if stats:
+                parts.append(f"{stage} {_format_ms(stats['p50_ms'])}/{_format_ms(stats['p95_ms'])}")
+        return "  ·  ".join(parts) if parts else "no timings yet"
+
+    def close(self):
+        with self._lock:
+            if self._jsonl is not None:
+                self._jsonl.close()
+                self._jsonl = None
+
+
+def _format_ms(ms):
+    return f"{ms / 1000:.1f}s" if ms >= 1000 else f"{ms:.0f}ms"
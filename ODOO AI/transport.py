@@ -0,0 +1,280 @@
+import time
+import random
+import threading
+from collections import deque
+
+import httpx
+
+RETRYABLE_STATUS = frozenset({408, 429, 500, 502, 503, 504})
+
+
+class CircuitOpenError(httpx.TransportError):
+    """Raised instead of sending a request while the circuit breaker is open."""
+
+
+class CircuitBreaker:
+    """
+    closed -> open after `failure_threshold` failures in a row, or when at least
+    that many of the requests in the last `window` seconds failed and they are
+    at least half of all requests there.
+    open -> half_open after `open_seconds`; one probe request is let through.
+    half_open -> closed on success, back to open on failure with the open time
+    doubled (up to `max_open_seconds`).
+
+    A failure is a transport error, a timeout or a retryable status (429/5xx);
+    other 4xx mean the service is up and count as successes.
+    """
+
+    def __init__(self, failure_threshold=5, window=30.0, open_seconds=30.0, max_open_seconds=300.0,
+                 on_change=None):
+        self.failure_threshold = failure_threshold
+        self.window = window
+        self.base_open_seconds = open_seconds
+        self.max_open_seconds = max_open_seconds
+        self.on_change = on_change  # on_change(old_state, new_state, breaker), called outside the lock
+        self.open_seconds = open_seconds
+        self.stats = {"trips": 0, "rejected": 0}
+        self._state = "closed"
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._consecutive_failures = 0
+        self._results = deque()  # (monotonic time, ok)
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            changes = self._advance(time.monotonic())
+            state = self._state
+        self._notify(changes)
+        return state
+
+    def retry_in(self):
+        """Seconds until an open breaker lets a probe through (0 when not open)."""
+        with self._lock:
+            if self._state != "open":
+                return 0.0
+            return max(0.0, self._opened_at + self.open_seconds - time.monotonic())
+
+    def allow(self):
+        """Whether a request may be sent now; in half_open only one probe at a time."""
+        with self._lock:
+            changes = self._advance(time.monotonic())
+            if self._state == "closed":
+                allowed = True
+            elif self._state == "half_open" and not self._probe_in_flight:
+                self._probe_in_flight = allowed = True
+            else:
+                allowed = False
+                self.stats["rejected"] += 1
+        self._notify(changes)
+        return allowed
+
+    def record(self, ok):
+        now = time.monotonic()
+        changes = []
+        with self._lock:
+            if self._state == "half_open":
+                self._probe_in_flight = False
+                if ok:
+                    self.open_seconds = self.base_open_seconds
+                    self._results.clear()
+                    changes.append(self._set("closed"))
+                else:
+                    self.open_seconds = min(self.max_open_seconds, self.open_seconds * 2)
+                    changes.append(self._trip(now))
+            elif self._state == "closed":
+                self._consecutive_failures = 0 if ok else self._consecutive_failures + 1
+                self._results.append((now, ok))
+                while self._results and now - self._results[0][0] > self.window:
+                    self._results.popleft()
+                failures = sum(1 for _, result in self._results if not result)
+                if self._consecutive_failures >= self.failure_threshold \
+                        or (failures >= self.failure_threshold and failures * 2 >= len(self._results)):
+                    changes.append(self._trip(now))
+        self._notify(changes)
+
+    def _trip(self, now):
+        self._opened_at = now
+        self._consecutive_failures = 0
+        self._results.clear()
+        self.stats["trips"] += 1
+        return self._set("open")
+
+    def _set(self, state):
+        old, self._state = self._state, state
+        return old, state
+
+    def _advance(self, now):
+        if self._state == "open" and now - self._opened_at >= self.open_seconds:
+            self._probe_in_flight = False
+            return [self._set("half_open")]
+        return []
+
+    def _notify(self, changes):
+        if self.on_change:
+            for old, new in changes:
+                self.on_change(old, new, self)
+
+
+class RetryBudget:
+    """
+    Process-wide cap on retries: over the last `window` seconds, retries may add
+    at most `ratio` of the first attempts, plus `min_retries` so a quiet client
+    can still retry. Keeps a degraded API from seeing every seat multiply its load.
+    """
+
+    def __init__(self, ratio=0.2, min_retries=3, window=10.0):
+        self.ratio = ratio
+        self.min_retries = min_retries
+        self.window = window
+        self._requests = deque()
+        self._retries = deque()
+        self._lock = threading.Lock()
+
+    def note_request(self):
+        with self._lock:
+            self._requests.append(time.monotonic())
+
+    def try_spend(self):
+        now = time.monotonic()
+        with self._lock:
+            for times in (self._requests, self._retries):
+                while times and now - times[0] > self.window:
+                    times.popleft()
+            if len(self._retries) >= self.min_retries + self.ratio * len(self._requests):
+                return False
+            self._retries.append(now)
+            return True
+
+
+class ResilientTransport(httpx.BaseTransport):
+    """
+    httpx transport for the OpenAI client: a sized keep-alive pool plus retries
+    with full-jitter exponential backoff (honouring Retry-After), a shared
+    RetryBudget and a CircuitBreaker. Connect/read deadlines come from the
+    client's httpx.Timeout. Only failures before the response headers are
+    retried, so a stream that has started is never replayed.
+
+    `stats()` reports breaker state and pool/request counters.
+    """
+
+    def __init__(self, max_connections=8, max_keepalive=4, keepalive_expiry=60.0, retries=2, backoff_base=0.5,
+                 backoff_cap=8.0, max_retry_wait=20.0, breaker=None, budget=None):
+        self.limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_keepalive,
+                                   keepalive_expiry=keepalive_expiry)
+        self.retries = retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.max_retry_wait = max_retry_wait
+        self.breaker = breaker or CircuitBreaker()
+        self.budget = budget or RetryBudget()
+        self.counters = {"requests": 0, "retries": 0, "retry_budget_exhausted": 0, "timeouts": 0,
+                         "network_errors": 0, "retryable_status": 0, "rejected_open": 0}
+        self._in_flight = 0
+        self._lock = threading.Lock()
+        self._transport = httpx.HTTPTransport(limits=self.limits)
+
+    def handle_request(self, request):
+        start = time.monotonic()
+        attempt = 0
+        self.budget.note_request()
+        self._count("requests")
+        while True:
+            if not self.breaker.allow():
+                self._count("rejected_open")
+                raise CircuitOpenError(f"circuit breaker open after repeated failures; "
+                                       f"retrying in {self.breaker.retry_in():.0f}s", request=request)
+            response = error = None
+            with self._lock:
+                self._in_flight += 1
+            try:
+                response = self._transport.handle_request(request)
+            except httpx.TimeoutException as e:
+                error = e
+                self._count("timeouts")
+            except httpx.TransportError as e:  # connect errors, resets, server closed without a response
+                error = e
+                self._count("network_errors")
+            except Exception:
+                self.breaker.record(False)  # releases a half-open probe
+                raise
+            finally:
+                with self._lock:
+                    self._in_flight -= 1
+
+            if error is None and response.status_code not in RETRYABLE_STATUS:
+                self.breaker.record(True)
+                return response
+            self.breaker.record(False)
+            if error is None:
+                self._count("retryable_status")
+
+            delay = self._delay(attempt, response)
+            if attempt >= self.retries or time.monotonic() - start + delay > self.max_retry_wait:
+                return self._give_up(response, error)
+            if not self.budget.try_spend():
+                self._count("retry_budget_exhausted")
+                return self._give_up(response, error)
+            if response is not None:
+                response.close()
+            self._count("retries")
+            time.sleep(delay)
+            attempt += 1
+
+    def _delay(self, attempt, response):
+        delay = random.uniform(0, min(self.backoff_cap, self.backoff_base * 2 ** attempt))
+        if response is not None:
+            try:
+                delay = max(delay, float(response.headers.get("retry-after", 0)))
+            except ValueError:
+                pass  # HTTP-date form: keep the jittered delay
+        return delay
+
+    @staticmethod
+    def _give_up(response, error):
+        if error is not None:
+            raise error
+        return response
+
+    def _count(self, name):
+        with self._lock:
+            self.counters[name] += 1
+
+    def stats(self):
+        """{"breaker": state, "pool": {...}, plus request counters}."""
+        pool = getattr(self._transport, "_pool", None)  # httpcore.ConnectionPool
+        connections = list(getattr(pool, "connections", None) or [])
+        with self._lock:
+            stats = dict(self.counters)
+            in_flight = self._in_flight
+        stats["breaker"] = self.breaker.state
+        stats["breaker_trips"] = self.breaker.stats["trips"]
+        stats["pool"] = {"connections": len(connections),
+                         "idle": sum(1 for connection in connections if connection.is_idle()),
+                         "in_flight": in_flight,
+                         "max_connections": self.limits.max_connections,
+                         "max_keepalive": self.limits.max_keepalive_connections}
+        return stats
+
+    def prometheus(self, prefix="odoo_ai_http"):
+        """Counters, pool gauges and breaker state in Prometheus text format."""
+        stats = self.stats()
+        lines = [f"# TYPE {prefix}_events_total counter"]
+        for name, value in sorted((name, stats[name]) for name in self.counters):
+            lines.append(f'{prefix}_events_total{{event="{name}"}} {value}')
+        lines.append(f"# TYPE {prefix}_pool gauge")
+        for name, value in stats["pool"].items():
+            lines.append(f'{prefix}_pool{{kind="{name}"}} {value}')
+        lines.append(f"# TYPE {prefix}_breaker_open gauge")
+        lines.append(f"{prefix}_breaker_open {int(stats['breaker'] == 'open')}")
+        return "\n".join(lines) + "\n"
+
+    def close(self):
+        self._transport.close()
+
+
+def create_http_client(transport, connect_timeout=5.0, read_timeout=30.0):
+    """httpx.Client for OpenAI(http_client=...): the resilient transport plus explicit deadlines."""
+    timeout = httpx.Timeout(read_timeout, connect=connect_timeout)
+    return httpx.Client(transport=transport, timeout=timeout)